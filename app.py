@@ -8,8 +8,47 @@ from functools import wraps
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
+# Overridden by DATABASE_URL (see services/db_config.py)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///krishimitra.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Token for batch JSON endpoints (disabled when unset)
+app.config['BATCH_API_TOKEN'] = os.environ.get('BATCH_API_TOKEN')
+# Max SQL statements per request, enforced in testing or when SQL_QUERY_GUARD is set
+app.config['SQL_QUERY_LIMIT'] = int(os.environ.get('SQL_QUERY_LIMIT', 20))
+app.config['SQL_QUERY_GUARD'] = os.environ.get('SQL_QUERY_GUARD') == '1'
+# Rendered PDF reports and background render threads
+app.config['REPORT_DIR'] = os.environ.get('REPORT_DIR')
+app.config['REPORT_WORKERS'] = int(os.environ.get('REPORT_WORKERS', 2))
+app.config['REPORT_CACHE_MAX_BYTES'] = int(os.environ.get('REPORT_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+# Seconds a finished report job's status file is kept
+app.config['REPORT_JOB_TTL'] = int(os.environ.get('REPORT_JOB_TTL', 24 * 60 * 60))
+# Group-commit form and ingest readings on a background writer thread
+app.config['WRITE_BEHIND'] = os.environ.get('WRITE_BEHIND') == '1'
+app.config['WRITE_BEHIND_MAX_ROWS'] = int(os.environ.get('WRITE_BEHIND_MAX_ROWS', 500))
+app.config['WRITE_BEHIND_INTERVAL_MS'] = int(os.environ.get('WRITE_BEHIND_INTERVAL_MS', 50))
+app.config['WRITE_BEHIND_CAPACITY'] = int(os.environ.get('WRITE_BEHIND_CAPACITY', 10000))
+app.config['WRITE_BEHIND_PUT_TIMEOUT'] = float(os.environ.get('WRITE_BEHIND_PUT_TIMEOUT', 1.0))
+app.config['WRITE_BEHIND_WAIT_TIMEOUT'] = float(os.environ.get('WRITE_BEHIND_WAIT_TIMEOUT', 10.0))
+# Extra directory searched for a Devanagari TrueType font for hi/mr reports
+app.config['REPORT_FONT_DIR'] = os.environ.get('REPORT_FONT_DIR')
+# Rolling weather statistics windows (days); the forecast trend uses WEATHER_TREND_WINDOW
+app.config['WEATHER_STATS_WINDOWS'] = [int(days) for days in os.environ.get('WEATHER_STATS_WINDOWS', '1,7,30').split(',')]
+app.config['WEATHER_TREND_WINDOW'] = int(os.environ.get('WEATHER_TREND_WINDOW', 7))
+app.config['WEATHER_TREND_THRESHOLD'] = float(os.environ.get('WEATHER_TREND_THRESHOLD', 0.25))
+# Weather provider (openweather when OPENWEATHER_API_KEY is set, or fake), cached per pincode
+app.config['OPENWEATHER_API_KEY'] = os.environ.get('OPENWEATHER_API_KEY')
+app.config['WEATHER_PROVIDER'] = os.environ.get('WEATHER_PROVIDER')
+app.config['WEATHER_CACHE_TTL'] = int(os.environ.get('WEATHER_CACHE_TTL', 600))
+app.config['WEATHER_CONNECT_TIMEOUT'] = float(os.environ.get('WEATHER_CONNECT_TIMEOUT', 3.05))
+app.config['WEATHER_READ_TIMEOUT'] = float(os.environ.get('WEATHER_READ_TIMEOUT', 5.0))
+app.config['WEATHER_RETRIES'] = int(os.environ.get('WEATHER_RETRIES', 2))
+app.config['WEATHER_FAKE_DELAY_MS'] = int(os.environ.get('WEATHER_FAKE_DELAY_MS', 0))
+# Seconds between checks of the crop/video catalog versions by each worker's catalog cache
+app.config['CATALOG_CHECK_SECONDS'] = float(os.environ.get('CATALOG_CHECK_SECONDS', 1.0))
+# Rendered page/fragment cache: entry lifetime (0 disables), size bound and browser max-age for public pages
+app.config['PAGE_CACHE_TTL'] = float(os.environ.get('PAGE_CACHE_TTL', 300))
+app.config['PAGE_CACHE_MAX_ENTRIES'] = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 1000))
+app.config['PAGE_CACHE_MAX_AGE'] = int(os.environ.get('PAGE_CACHE_MAX_AGE', 60))
 
 # Babel configuration
 app.config['LANGUAGES'] = {
@@ -23,7 +62,36 @@ app.config['BABEL_TRANSLATION_DIRECTORIES'] = 'translations'
 
 # Import models and initialize db
 from models import db, Farmer, SoilData, WeatherData, Crop, Recommendation, Alert, Video, Query, initialize_crops
+# Database URI, read replica and pool sizing from DATABASE_*/DB_*, SQLite pragmas (WAL etc.) from SQLITE_*
+from services.db_config import configure_engine, apply_sqlite_pragmas
+configure_engine(app)
 db.init_app(app)
+apply_sqlite_pragmas(app)
+
+# Fail requests that issue too many SQL statements (N+1 lazy loads)
+from services.query_guard import init_query_guard
+init_query_guard(app)
+
+# Background group commits for sensor readings (when WRITE_BEHIND=1)
+from services.write_behind import init_write_behind
+from services.api_auth import api_token_required
+init_write_behind(app)
+
+# Daily/weekly rollups and rolling weather stats kept current on every reading insert
+from services.rollups import backfill_rollups
+from services.weather_stats import backfill_stats
+
+# Pooled, cached client for the external weather provider
+from services.weather_provider import init_weather_client
+init_weather_client(app)
+
+# Per-process snapshots of the crop and video catalogs, reloaded when their DB version moves
+from services.catalog_cache import init_catalog_cache
+init_catalog_cache(app)
+
+# Rendered pages for anonymous visitors and shared template fragments, per locale
+from services.page_cache import init_page_cache, cache_page
+init_page_cache(app)
 
 # Import blueprints
 from blueprints.auth import auth_bp
@@ -47,6 +115,13 @@ app.register_blueprint(videos_bp)
 app.register_blueprint(support_bp)
 app.register_blueprint(reports_bp)
 
+# Build report fonts and styles once per process instead of per report
+from services.report_layout import init_report_layouts
+init_report_layouts(app)
+# Fail report jobs a previous run left unfinished and drop expired job files
+from services.report_jobs import init_report_jobs
+init_report_jobs(app)
+
 # Locale selector function (moved after app is fully configured)
 def get_locale():
     try:
@@ -69,6 +144,10 @@ def get_locale():
 # Initialize Babel with locale selector
 babel = Babel(app, locale_selector=get_locale)
 
+# Load every language's catalog now (shared by workers forked after import) and translate templates from it
+from services.translations import init_translations
+init_translations(app)
+
 # Make get_locale and other functions available in templates
 @app.context_processor
 def inject_get_locale():
@@ -89,10 +168,12 @@ def login_required(f):
     return decorated_function
 
 @app.route('/')
+@cache_page()
 def index():
     return render_template('index.html')
 
 @app.route('/about')
+@cache_page()
 def about():
     return render_template('about.html')
 
@@ -110,6 +191,20 @@ def debug_language():
     <a href="/">Back to Home</a>
     """
 
+@app.route('/ingest/stats')
+@api_token_required
+def write_behind_stats():
+    buffer = app.extensions.get('write_behind')
+    if buffer is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(buffer.metrics(), enabled=True))
+
+@app.route('/pages/cache/stats')
+@api_token_required
+def page_cache_stats():
+    cache = app.extensions['page_cache']
+    return jsonify(dict(cache.metrics(), enabled=cache.enabled))
+
 @app.route('/test_language')
 def test_language():
     return render_template('test_language.html')
@@ -126,6 +221,16 @@ def set_language(language=None):
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        # Add columns and indexes introduced after the database was first created
+        from models import ensure_columns, ensure_indexes
+        ensure_columns()
+        ensure_indexes()
+        backfill_rollups()
+        backfill_stats()
+        from services.video_search import ensure_video_search
+        ensure_video_search()
+        from services.related_videos import backfill_related
+        backfill_related()
         # Initialize crop knowledge base
         from models import initialize_crops
         initialize_crops()
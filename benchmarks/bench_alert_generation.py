@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark alert generation: per-date existence queries vs. the set-based engine.
+
+Usage: python -m benchmarks.bench_alert_generation
+"""
+
+from datetime import datetime, timedelta
+from benchmarks.common import make_app, create_farmer, measure, print_table
+from models import db, Alert, Crop, Recommendation
+from services.alert_engine import generate_alerts_for_farmer
+
+SIZES = [1, 10, 100]
+
+def legacy_generate_alerts(farmer_id):
+    """The original per-date loop from alerts.generate_alerts"""
+    recommendations = Recommendation.query.filter_by(farmer_id=farmer_id).all()
+    alerts_created = 0
+
+    def add_if_missing(crop, alert_type, alert_date, message):
+        nonlocal alerts_created
+        if alert_date > datetime.now():
+            existing_alert = Alert.query.filter_by(
+                farmer_id=farmer_id, crop_id=crop.id, alert_type=alert_type, alert_date=alert_date
+            ).first()
+            if not existing_alert:
+                db.session.add(Alert(farmer_id=farmer_id, crop_id=crop.id, alert_type=alert_type,
+                                     alert_date=alert_date, message=message))
+                alerts_created += 1
+
+    for rec in recommendations:
+        crop = rec.crop
+        start_date = rec.recommended_date
+        for i in range(1, crop.duration_days // 7 + 1):
+            days = i * 7 if i <= 4 else i * 10
+            add_if_missing(crop, 'irrigation', start_date + timedelta(days=days),
+                           f'Time to irrigate {crop.crop_name} plants')
+        for days, message in [(15, 'Apply nitrogen fertilizer'), (30, 'Apply phosphorus fertilizer'),
+                              (45, 'Apply potassium fertilizer'), (60, 'Apply balanced NPK fertilizer')]:
+            if days < crop.duration_days:
+                add_if_missing(crop, 'fertilizer', start_date + timedelta(days=days),
+                               f'{message} for {crop.crop_name}')
+        for days in [20, 40, 60, 80]:
+            if days < crop.duration_days:
+                add_if_missing(crop, 'spray', start_date + timedelta(days=days),
+                               f'Apply pest/disease control spray for {crop.crop_name}')
+        add_if_missing(crop, 'harvest', start_date + timedelta(days=crop.duration_days),
+                       f'Time to harvest {crop.crop_name}')
+
+    db.session.commit()
+    return alerts_created
+
+def seed_recommendations(farmer_id, count):
+    """Give a farmer `count` recommendations spread over the seeded crops"""
+    crops = Crop.query.all()
+    now = datetime.now()
+    for i in range(count):
+        db.session.add(Recommendation(
+            farmer_id=farmer_id,
+            crop_id=crops[i % len(crops)].id,
+            recommended_date=now - timedelta(days=i % 30, minutes=i)
+        ))
+    db.session.commit()
+
+def run(generate, count):
+    """Time a cold run (all alerts new) and a warm run (all alerts exist)"""
+    app = make_app()
+    with app.app_context():
+        farmer_id = create_farmer()
+        seed_recommendations(farmer_id, count)
+        with measure() as cold:
+            created = generate(farmer_id)
+        with measure() as warm:
+            generate(farmer_id)
+    return created, cold, warm
+
+def main():
+    rows = []
+    for count in SIZES:
+        for name, generate in [('legacy', legacy_generate_alerts), ('set-based', generate_alerts_for_farmer)]:
+            created, cold, warm = run(generate, count)
+            rows.append([count, name, created,
+                         cold['queries'], f"{cold['seconds'] * 1000:.1f}",
+                         warm['queries'], f"{warm['seconds'] * 1000:.1f}"])
+    print_table(['recs', 'impl', 'alerts', 'cold queries', 'cold ms', 'warm queries', 'warm ms'], rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark crop suitability scoring: the per-crop Python loop vs. the NumPy matrix.
+
+Usage: python -m benchmarks.bench_crop_scoring
+"""
+
+import time
+from types import SimpleNamespace
+import numpy as np
+from benchmarks.common import print_table
+from services.crop_scorer import CropMatrix, CROP_COLUMNS, MIN_CONFIDENCE
+
+SIZES = [10, 1000, 100000]
+BATCH_SAMPLES = 100
+SEASONS = ['Kharif', 'Rabi', 'Summer']
+
+def synthetic_crops(count, seed=42):
+    """Random crop requirement rows in CROP_COLUMNS order"""
+    rng = np.random.default_rng(seed)
+    ph_min = rng.uniform(4.5, 7.0, count)
+    temp_min = rng.uniform(10, 28, count)
+    return [
+        (i + 1, SEASONS[i % 3], ph_min[i], ph_min[i] + rng.uniform(0.5, 2.0), temp_min[i],
+         temp_min[i] + rng.uniform(5, 12), rng.uniform(30, 95), rng.uniform(10, 45),
+         rng.uniform(5, 30), rng.uniform(10, 40))
+        for i in range(count)
+    ]
+
+def legacy_score(crops, soil, weather):
+    """The original loop from crops.recommend"""
+    suitable = []
+    for crop in crops:
+        score = 0
+        if crop.ph_min <= soil.ph <= crop.ph_max:
+            score += 1
+        if crop.temp_min <= weather.temperature <= crop.temp_max:
+            score += 1
+        if abs(soil.moisture - crop.moisture_req) <= 20:
+            score += 1
+        if soil.nitrogen >= crop.nitrogen_req * 0.8:
+            score += 0.5
+        if soil.phosphorus >= crop.phosphorus_req * 0.8:
+            score += 0.5
+        if soil.potassium >= crop.potassium_req * 0.8:
+            score += 0.5
+        confidence = (score / 4.5) * 100
+        if confidence >= MIN_CONFIDENCE:
+            suitable.append((crop.id, confidence))
+    suitable.sort(key=lambda x: x[1], reverse=True)
+    return suitable
+
+def matrix_score(matrix, soil, weather):
+    return matrix.rank(matrix.score(soil, weather))
+
+def best_of(func, repeat=5):
+    """Fastest of several runs, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def main():
+    soil = SimpleNamespace(ph=6.5, moisture=60.0, nitrogen=30.0, phosphorus=20.0, potassium=25.0)
+    weather = SimpleNamespace(temperature=27.0)
+    samples = np.random.default_rng(7).uniform([5, 15, 30, 10, 5, 10], [8, 35, 90, 50, 30, 40],
+                                                (BATCH_SAMPLES, 6))
+
+    rows = []
+    for count in SIZES:
+        crop_rows = synthetic_crops(count)
+        crops = [SimpleNamespace(**dict(zip(CROP_COLUMNS, row))) for row in crop_rows]
+        matrix = CropMatrix(crop_rows)
+
+        assert legacy_score(crops, soil, weather) == matrix_score(matrix, soil, weather)
+
+        loop_ms = best_of(lambda: legacy_score(crops, soil, weather))
+        numpy_ms = best_of(lambda: matrix_score(matrix, soil, weather))
+        batch_ms = best_of(lambda: matrix.score_samples(samples))
+        rows.append([count, f'{loop_ms:.3f}', f'{numpy_ms:.3f}', f'{loop_ms / numpy_ms:.1f}x',
+                     f'{batch_ms:.3f}', f'{batch_ms / BATCH_SAMPLES:.4f}'])
+
+    print_table(['crops', 'loop ms', 'numpy ms', 'speedup',
+                 f'batch {BATCH_SAMPLES} ms', 'batch ms/sample'], rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark farmer PDF report generation on a synthetic 10k-row history.
+
+Compares the old approach (load every soil, weather and alert row, render on
+the request thread) with the bounded-query builder, and measures how long the
+request thread is blocked when the report is queued instead. Also compares
+the CPU time per report when styles are rebuilt for every report against the
+shared per-process layout.
+
+Usage: python -m benchmarks.bench_report_generation
+"""
+
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from io import BytesIO
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+from benchmarks.common import make_app, create_farmer, measure, print_table
+from models import db, Alert, Crop, Recommendation, SoilData, WeatherData
+from services.report_builder import build_farmer_report, load_farmer_report, FARMER_REPORT_SECTIONS
+from services.report_layout import ReportLayout, get_layout, render_report
+from services.report_jobs import submit_report, get_job
+
+HISTORY_ROWS = 10000
+CPU_REPORTS = 200
+
+def seed_history(farmer_id, rows):
+    """Give a farmer `rows` soil readings, weather readings and alerts"""
+    start = datetime.now() - timedelta(days=rows)
+    crop_ids = [crop.id for crop in Crop.query.all()]
+    db.session.execute(insert(SoilData), [
+        {'farmer_id': farmer_id, 'ph': 6.5, 'moisture': 55.0, 'nitrogen': 30.0, 'phosphorus': 20.0,
+         'potassium': 25.0, 'temperature': 26.0, 'soil_type': 'Black', 'date': start + timedelta(days=i)}
+        for i in range(rows)
+    ])
+    db.session.execute(insert(WeatherData), [
+        {'farmer_id': farmer_id, 'temperature': 28.0, 'humidity': 60.0, 'rainfall': 2.0,
+         'date': start + timedelta(days=i)}
+        for i in range(rows)
+    ])
+    db.session.execute(insert(Alert), [
+        {'farmer_id': farmer_id, 'crop_id': crop_ids[i % len(crop_ids)], 'alert_type': 'irrigation',
+         'alert_date': start + timedelta(days=i), 'message': 'Time to irrigate', 'status': 'pending'}
+        for i in range(rows)
+    ])
+    for crop_id in crop_ids:
+        db.session.add(Recommendation(farmer_id=farmer_id, crop_id=crop_id, confidence_score=75.0))
+    db.session.commit()
+
+def legacy_report(farmer_id):
+    """The old flow: materialize the whole history, then render into memory"""
+    SoilData.query.filter_by(farmer_id=farmer_id).order_by(SoilData.date.desc()).all()
+    WeatherData.query.filter_by(farmer_id=farmer_id).order_by(WeatherData.date.desc()).all()
+    Recommendation.query.filter_by(farmer_id=farmer_id).order_by(Recommendation.recommended_date.desc()).all()
+    Alert.query.options(joinedload(Alert.crop)).filter_by(farmer_id=farmer_id).order_by(Alert.alert_date.asc()).all()
+    buffer = BytesIO()
+    build_farmer_report(farmer_id, buffer)
+    return buffer.getvalue()
+
+def bounded_report(farmer_id):
+    buffer = BytesIO()
+    build_farmer_report(farmer_id, buffer)
+    return buffer.getvalue()
+
+def profile(func, farmer_id):
+    db.session.expunge_all()
+    tracemalloc.start()
+    with measure() as result:
+        func(farmer_id)
+    result['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return result
+
+def cpu_per_report(data, fresh_layout):
+    """CPU milliseconds per rendered report, with or without the shared layout"""
+    get_layout()
+    start = time.process_time()
+    for _ in range(CPU_REPORTS):
+        layout = ReportLayout() if fresh_layout else None
+        render_report(BytesIO(), FARMER_REPORT_SECTIONS, data, layout=layout)
+    return (time.process_time() - start) * 1000 / CPU_REPORTS
+
+def main():
+    database = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(f'sqlite:///{database}')
+    app.config['REPORT_DIR'] = os.path.join(os.path.dirname(database), 'reports')
+
+    rows = []
+    with app.app_context():
+        farmer_id = create_farmer()
+        seed_history(farmer_id, HISTORY_ROWS)
+
+        for name, func in [('load all + render', legacy_report), ('bounded queries + render', bounded_report)]:
+            result = profile(func, farmer_id)
+            rows.append([name, f"{result['seconds'] * 1000:.1f}", result['queries'], f"{result['peak_mb']:.1f}"])
+
+        with app.test_request_context():
+            start = time.perf_counter()
+            job_id = submit_report(farmer_id)
+            blocked_ms = (time.perf_counter() - start) * 1000
+            while get_job(job_id)['status'] not in ('done', 'failed'):
+                time.sleep(0.01)
+            total_ms = (time.perf_counter() - start) * 1000
+        rows.append(['queued job (request thread)', f'{blocked_ms:.1f}', '-', '-'])
+        rows.append(['queued job (until ready)', f'{total_ms:.1f}', '-', '-'])
+
+        data = load_farmer_report(farmer_id)
+        layout_rows = [
+            ['styles built per report', f'{cpu_per_report(data, fresh_layout=True):.2f}'],
+            ['shared layout', f'{cpu_per_report(data, fresh_layout=False):.2f}'],
+        ]
+
+    print(f'History: {HISTORY_ROWS} soil, weather and alert rows')
+    print_table(['mode', 'ms', 'queries', 'peak MB'], rows)
+    print(f'\nCPU time per report ({CPU_REPORTS} reports)')
+    print_table(['layout', 'cpu ms'], layout_rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark concurrent reads and writes on a SQLite file with 1, 4 and 16 threads.
+
+Compares SQLite's defaults (rollback journal, synchronous=FULL, default
+pool) with the WAL profile from services/db_config.py. Each thread runs a
+mix of 80% dashboard-style reads and 20% single-row inserts, each write in
+its own transaction, for a fixed time.
+
+Usage: python -m benchmarks.bench_sqlite_concurrency
+"""
+
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from benchmarks.common import make_app, create_farmer, print_table
+from models import db, SoilData
+from services.db_config import engine_options, sqlite_pragmas
+
+THREADS = [1, 4, 16]
+DURATION = 2.0
+FARMERS = 100
+ROWS_PER_FARMER = 50
+WRITE_RATIO = 0.2
+
+def seed(farmer_count, rows_per_farmer):
+    farmer_ids = [create_farmer(mobile=f'9{i:09d}') for i in range(farmer_count)]
+    db.session.execute(insert(SoilData), [
+        {'farmer_id': farmer_id, 'ph': 6.5, 'moisture': 55.0, 'nitrogen': 30.0, 'phosphorus': 20.0,
+         'potassium': 25.0, 'temperature': 26.0, 'soil_type': 'Black', 'date': datetime.now()}
+        for farmer_id in farmer_ids for _ in range(rows_per_farmer)
+    ])
+    db.session.commit()
+    return farmer_ids
+
+def worker(app, farmer_ids, deadline, counts, lock):
+    reads = writes = errors = 0
+    rng = random.Random()
+    with app.app_context():
+        while time.perf_counter() < deadline:
+            farmer_id = rng.choice(farmer_ids)
+            try:
+                if rng.random() < WRITE_RATIO:
+                    db.session.add(SoilData(farmer_id=farmer_id, ph=6.5, moisture=55.0, nitrogen=30.0,
+                                            phosphorus=20.0, potassium=25.0, temperature=26.0, soil_type='Black'))
+                    db.session.commit()
+                    writes += 1
+                else:
+                    SoilData.query.filter_by(farmer_id=farmer_id).order_by(SoilData.date.desc()).limit(5).all()
+                    db.session.commit()
+                    reads += 1
+            except OperationalError:
+                # "database is locked" once the busy timeout runs out
+                db.session.rollback()
+                errors += 1
+        db.session.remove()
+    with lock:
+        counts['reads'] += reads
+        counts['writes'] += writes
+        counts['errors'] += errors
+
+def run(app, farmer_ids, threads):
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + DURATION
+    pool = [threading.Thread(target=worker, args=(app, farmer_ids, deadline, counts, lock)) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return counts
+
+def make_profile_app(name, directory):
+    uri = f'sqlite:///{os.path.join(directory, f"{name}.db")}'
+    if name == 'default':
+        return make_app(uri)
+    return make_app(uri, SQLALCHEMY_ENGINE_OPTIONS=engine_options(uri), SQLITE_PRAGMAS=sqlite_pragmas())
+
+def main():
+    directory = tempfile.mkdtemp()
+    rows = []
+    for name in ('default', 'wal'):
+        app = make_profile_app(name, directory)
+        with app.app_context():
+            farmer_ids = seed(FARMERS, ROWS_PER_FARMER)
+        for threads in THREADS:
+            counts = run(app, farmer_ids, threads)
+            rows.append([name, threads, f"{counts['reads'] / DURATION:.0f}",
+                         f"{counts['writes'] / DURATION:.0f}", counts['errors']])
+
+    print(f'{DURATION:.0f}s per run, {int(WRITE_RATIO * 100)}% writes, {FARMERS} farmers')
+    print_table(['profile', 'threads', 'reads/s', 'writes/s', 'lock errors'], rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark video search on 100k videos: LIKE scan vs. the FTS5 index.
+
+The LIKE query is the one videos.search used before: every video whose
+title or description contains the text, newest first. The FTS5 side is what
+videos.search serves now, services/video_search.py with BM25 ranking: the
+first page of results (DEFAULT_PER_PAGE rows) plus the match count. Titles and
+descriptions draw English and Hindi farming words, plus a long tail of
+generated terms, with Zipf frequencies, so queries range from words in most
+videos to words in a handful.
+
+Usage: python -m benchmarks.bench_video_search
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from benchmarks.common import make_app, print_table
+from models import db, Video
+from services.video_search import count_videos, search_videos, fts_available
+
+VIDEOS = 100000
+REPEATS = 20
+
+WORDS = [
+    'soil', 'testing', 'drip', 'irrigation', 'organic', 'fertilizer', 'compost', 'pest', 'control', 'seed',
+    'wheat', 'rice', 'cotton', 'soybean', 'sugarcane', 'harvest', 'storage', 'market', 'weather', 'monsoon',
+    'मिट्टी', 'सिंचाई', 'खेती', 'बीज', 'खाद', 'कीट', 'फसल', 'गेहूँ', 'धान', 'कपास', 'पानी', 'मौसम',
+]
+CATEGORIES = ['Irrigation', 'Soil Management', 'Pest Control', 'Seed Management', 'Weather Management', 'General']
+SYLLABLES = ['ka', 'ri', 'sha', 'mo', 'ten', 'lu', 'vin', 'dra', 'po', 'gar', 'ni', 'bel', 'sto', 'ru', 'pan']
+# Farming words first (most frequent), then a long tail of generated terms
+VOCABULARY = WORDS + [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+# Common, Hindi, prefix, two-word, mid-frequency, rare and missing terms
+QUERIES = ['soil', 'सिंचाई', 'fert', 'drip irrigation', VOCABULARY[200], VOCABULARY[3000], 'tractor']
+
+def seed(count, rng):
+    start = datetime(2020, 1, 1)
+    rows = [{
+        'title': ' '.join(rng.choices(VOCABULARY, WEIGHTS, k=5)),
+        'description': ' '.join(rng.choices(VOCABULARY, WEIGHTS, k=30)),
+        'url': f'https://example.com/{i}',
+        'category': rng.choice(CATEGORIES),
+        'created_at': start + timedelta(minutes=i),
+    } for i in range(count)]
+    for offset in range(0, count, 10000):
+        db.session.execute(insert(Video), rows[offset:offset + 10000])
+    db.session.commit()
+
+def like_search(query):
+    return Video.query.filter(
+        Video.title.contains(query) | Video.description.contains(query)
+    ).order_by(Video.created_at.desc()).all()
+
+def fts_search(query):
+    page = search_videos(query)
+    count_videos(query)
+    return page.items
+
+def timed(search, query):
+    search(query)
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        results = search(query)
+        db.session.expunge_all()
+    return (time.perf_counter() - start) / REPEATS * 1000, len(results)
+
+def main():
+    app = make_app()
+    rows = []
+    with app.app_context():
+        assert fts_available(), 'SQLite FTS5 index was not created'
+        start = time.perf_counter()
+        seed(VIDEOS, random.Random(42))
+        print(f'Inserted {VIDEOS} videos (index maintained by triggers) in {time.perf_counter() - start:.1f}s')
+        for query in QUERIES:
+            like_ms, like_count = timed(like_search, query)
+            fts_ms, fts_count = timed(fts_search, query)
+            rows.append([query, f'{like_ms:.1f}', like_count, f'{fts_ms:.1f}', fts_count, f'{like_ms / fts_ms:.1f}x'])
+
+    print_table(['query', 'LIKE ms', 'rows', 'FTS5 ms', 'page rows', 'speedup'], rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Shared helpers for KrishiMitra benchmarks
+"""
+
+import time
+from contextlib import contextmanager
+from flask import Flask
+from sqlalchemy import event
+
+from models import db, Farmer, initialize_crops
+
+def make_app(database_uri='sqlite://', **config):
+    """Create a bare app bound to a scratch database (in-memory by default)"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config.update(config)
+    db.init_app(app)
+    if app.config.get('SQLITE_PRAGMAS'):
+        from services.db_config import apply_sqlite_pragmas
+        apply_sqlite_pragmas(app)
+    with app.app_context():
+        db.create_all()
+        initialize_crops()
+    return app
+
+def create_farmer(mobile='9000000000'):
+    """Insert a benchmark farmer and return its id"""
+    farmer = Farmer(
+        name='Bench Farmer',
+        mobile=mobile,
+        village='Village',
+        tehsil='Tehsil',
+        district='District',
+        pincode='411001',
+        password_hash='x'
+    )
+    db.session.add(farmer)
+    db.session.commit()
+    return farmer.id
+
+class QueryCounter:
+    """Counts SQL statements issued on the current engine"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+@contextmanager
+def measure():
+    """Yield a dict filled with 'queries' and 'seconds' for the enclosed block"""
+    counter = QueryCounter()
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', counter)
+    result = {}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result['seconds'] = time.perf_counter() - start
+        result['queries'] = counter.count
+        event.remove(engine, 'before_cursor_execute', counter)
+
+def print_table(headers, rows):
+    """Print rows as a fixed-width table"""
+    widths = [max(len(str(h)), *(len(str(row[i])) for row in rows)) for i, h in enumerate(headers)]
+    print('  '.join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print('  '.join('-' * w for w in widths))
+    for row in rows:
+        print('  '.join(str(v).ljust(w) for v, w in zip(row, widths)))
@@ -2,9 +2,16 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for,
 from models import Alert, Recommendation, Crop, Farmer, db
 from datetime import datetime, timedelta
 from functools import wraps
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from services.pagination import paginate_request, wants_json, page_json
+from services.alert_engine import generate_alerts_for_farmer
 
 alerts_bp = Blueprint('alerts', __name__)
 
+# Statuses with their own tab on the alerts page; the first tab lists every alert
+ALERT_TABS = ['pending', 'completed']
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -18,127 +25,29 @@ def login_required(f):
 @login_required
 def index():
     farmer_id = session['farmer_id']
-    alerts = Alert.query.filter_by(farmer_id=farmer_id).order_by(Alert.alert_date.asc()).all()
-    return render_template('alerts/index.html', alerts=alerts)
+    status = request.args.get('status')
+    if status not in ALERT_TABS:
+        status = None
+    
+    # Each tab is its own query and paginates on its own
+    query = Alert.query.options(joinedload(Alert.crop)).filter_by(farmer_id=farmer_id)
+    if status:
+        query = query.filter_by(status=status)
+    page = paginate_request(query, Alert.alert_date, Alert.id, descending=False)
+    if wants_json():
+        return page_json(page, ['id', 'crop_id', 'crop.crop_name', 'alert_type', 'alert_date', 'message', 'status'])
+    
+    # Tab badges count every alert, not just the current page
+    status_counts = dict(db.session.query(Alert.status, func.count(Alert.id))
+                         .filter(Alert.farmer_id == farmer_id).group_by(Alert.status).all())
+    return render_template('alerts/index.html', alerts=page.items, page=page, status=status, status_counts=status_counts)
 
 @alerts_bp.route('/alerts/generate')
 @login_required
 def generate_alerts():
     farmer_id = session['farmer_id']
     
-    # Get active recommendations
-    recommendations = Recommendation.query.filter_by(farmer_id=farmer_id).all()
-    
-    alerts_created = 0
-    
-    for rec in recommendations:
-        crop = rec.crop
-        start_date = rec.recommended_date
-        
-        # Generate irrigation alerts (every 7 days for first month, then every 10 days)
-        for i in range(1, crop.duration_days // 7 + 1):
-            if i <= 4:  # First month
-                alert_date = start_date + timedelta(days=i*7)
-            else:  # After first month
-                alert_date = start_date + timedelta(days=i*10)
-            
-            if alert_date > datetime.now():  # Only future alerts
-                existing_alert = Alert.query.filter_by(
-                    farmer_id=farmer_id,
-                    crop_id=crop.id,
-                    alert_type='irrigation',
-                    alert_date=alert_date
-                ).first()
-                
-                if not existing_alert:
-                    alert = Alert(
-                        farmer_id=farmer_id,
-                        crop_id=crop.id,
-                        alert_type='irrigation',
-                        alert_date=alert_date,
-                        message=f'Time to irrigate {crop.crop_name} plants'
-                    )
-                    db.session.add(alert)
-                    alerts_created += 1
-        
-        # Generate fertilizer alerts
-        fertilizer_dates = [
-            (15, 'nitrogen', 'Apply nitrogen fertilizer'),
-            (30, 'phosphorus', 'Apply phosphorus fertilizer'),
-            (45, 'potassium', 'Apply potassium fertilizer'),
-            (60, 'balanced', 'Apply balanced NPK fertilizer')
-        ]
-        
-        for days, fert_type, message in fertilizer_dates:
-            if days < crop.duration_days:
-                alert_date = start_date + timedelta(days=days)
-                
-                if alert_date > datetime.now():  # Only future alerts
-                    existing_alert = Alert.query.filter_by(
-                        farmer_id=farmer_id,
-                        crop_id=crop.id,
-                        alert_type='fertilizer',
-                        alert_date=alert_date
-                    ).first()
-                    
-                    if not existing_alert:
-                        alert = Alert(
-                            farmer_id=farmer_id,
-                            crop_id=crop.id,
-                            alert_type='fertilizer',
-                            alert_date=alert_date,
-                            message=f'{message} for {crop.crop_name}'
-                        )
-                        db.session.add(alert)
-                        alerts_created += 1
-        
-        # Generate spray alerts
-        spray_dates = [20, 40, 60, 80]
-        for days in spray_dates:
-            if days < crop.duration_days:
-                alert_date = start_date + timedelta(days=days)
-                
-                if alert_date > datetime.now():  # Only future alerts
-                    existing_alert = Alert.query.filter_by(
-                        farmer_id=farmer_id,
-                        crop_id=crop.id,
-                        alert_type='spray',
-                        alert_date=alert_date
-                    ).first()
-                    
-                    if not existing_alert:
-                        alert = Alert(
-                            farmer_id=farmer_id,
-                            crop_id=crop.id,
-                            alert_type='spray',
-                            alert_date=alert_date,
-                            message=f'Apply pest/disease control spray for {crop.crop_name}'
-                        )
-                        db.session.add(alert)
-                        alerts_created += 1
-        
-        # Generate harvest alert
-        harvest_date = start_date + timedelta(days=crop.duration_days)
-        if harvest_date > datetime.now():  # Only future alerts
-            existing_alert = Alert.query.filter_by(
-                farmer_id=farmer_id,
-                crop_id=crop.id,
-                alert_type='harvest',
-                alert_date=harvest_date
-            ).first()
-            
-            if not existing_alert:
-                alert = Alert(
-                    farmer_id=farmer_id,
-                    crop_id=crop.id,
-                    alert_type='harvest',
-                    alert_date=harvest_date,
-                    message=f'Time to harvest {crop.crop_name}'
-                )
-                db.session.add(alert)
-                alerts_created += 1
-    
-    db.session.commit()
+    alerts_created = generate_alerts_for_farmer(farmer_id)
     
     if alerts_created > 0:
         flash(f'{alerts_created} new alerts generated successfully!', 'success')
@@ -199,7 +108,7 @@ def upcoming():
     
     # Get alerts for next 7 days
     next_week = datetime.now() + timedelta(days=7)
-    upcoming_alerts = Alert.query.filter(
+    upcoming_alerts = Alert.query.options(joinedload(Alert.crop)).filter(
         Alert.farmer_id == farmer_id,
         Alert.alert_date <= next_week,
         Alert.alert_date >= datetime.now(),
@@ -2,6 +2,15 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for,
 from models import Crop, Recommendation, SoilData, WeatherData, Farmer, db
 from datetime import datetime, timedelta
 from functools import wraps
+from services.db_config import read_replica
+from sqlalchemy.orm import joinedload
+from services.crop_schedule import get_schedule
+from services.crop_scorer import rank_crops, get_current_season
+from services.batch_recommend import recommend_all, DEFAULT_TOP_N
+from services.api_auth import api_token_required
+from services.catalog_cache import get_catalog
+from services.page_cache import cache_page
+import click
 
 crops_bp = Blueprint('crops', __name__)
 
@@ -18,7 +27,7 @@ def login_required(f):
 @login_required
 def index():
     farmer_id = session['farmer_id']
-    recommendations = Recommendation.query.filter_by(farmer_id=farmer_id).order_by(Recommendation.recommended_date.desc()).all()
+    recommendations = Recommendation.query.options(joinedload(Recommendation.crop)).filter_by(farmer_id=farmer_id).order_by(Recommendation.recommended_date.desc()).all()
     return render_template('crops/index.html', recommendations=recommendations)
 
 @crops_bp.route('/crops/recommend')
@@ -35,59 +44,18 @@ def recommend():
         return redirect(url_for('dashboard.index'))
     
     # Determine current season based on month
-    current_month = datetime.now().month
-    if current_month in [6, 7, 8, 9, 10]:
-        current_season = 'Kharif'
-    elif current_month in [11, 12, 1, 2]:
-        current_season = 'Rabi'
-    else:
-        current_season = 'Summer'
-    
-    # Get suitable crops based on soil and weather conditions
-    suitable_crops = []
-    all_crops = Crop.query.filter_by(season=current_season).all()
-    
-    for crop in all_crops:
-        score = 0
-        total_conditions = 0
-        
-        # Check pH compatibility
-        if crop.ph_min <= latest_soil.ph <= crop.ph_max:
-            score += 1
-        total_conditions += 1
-        
-        # Check temperature compatibility
-        if crop.temp_min <= latest_weather.temperature <= crop.temp_max:
-            score += 1
-        total_conditions += 1
-        
-        # Check moisture compatibility (within 20% range)
-        if abs(latest_soil.moisture - crop.moisture_req) <= 20:
-            score += 1
-        total_conditions += 1
-        
-        # Check NPK levels
-        if latest_soil.nitrogen >= crop.nitrogen_req * 0.8:
-            score += 0.5
-        if latest_soil.phosphorus >= crop.phosphorus_req * 0.8:
-            score += 0.5
-        if latest_soil.potassium >= crop.potassium_req * 0.8:
-            score += 0.5
-        total_conditions += 1.5
-        
-        # Calculate confidence score
-        confidence = (score / total_conditions) * 100
-        
-        if confidence >= 60:  # Only recommend crops with 60%+ compatibility
-            suitable_crops.append({
-                'crop': crop,
-                'confidence': confidence,
-                'score': score,
-                'total_conditions': total_conditions
-            })
-    
-    # Sort by confidence score
-    suitable_crops.sort(key=lambda x: x['confidence'], reverse=True)
+    current_season = get_current_season()
+    
+    # Score every crop for the season against the latest soil and weather data
+    ranked = rank_crops(latest_soil, latest_weather, current_season)
+    ranked_ids = [crop_id for crop_id, _ in ranked]
+    crops_by_id = get_catalog('crops').by_id
+    
+    suitable_crops = [
+        {'crop': crops_by_id[crop_id], 'confidence': confidence}
+        for crop_id, confidence in ranked
+        if crop_id in crops_by_id
+    ]
     
     return render_template('crops/recommend.html', 
                          suitable_crops=suitable_crops,
@@ -119,88 +87,50 @@ def save_recommendation(crop_id):
     flash('Crop recommendation saved successfully!', 'success')
     return redirect(url_for('crops.index'))
 
+@crops_bp.route('/crops/recommend/batch', methods=['POST'])
+@api_token_required
+def batch_recommend():
+    options = request.get_json(silent=True) or {}
+    
+    try:
+        top_n = int(options.get('top_n', DEFAULT_TOP_N))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'top_n must be an integer'}), 400
+    
+    summary = recommend_all(
+        district=options.get('district'),
+        tehsil=options.get('tehsil'),
+        top_n=top_n,
+        season=options.get('season'),
+        dry_run=bool(options.get('dry_run', False))
+    )
+    return jsonify(summary)
+
+@crops_bp.cli.command('recommend-all')
+@click.option('--district', help='Only farmers in this district')
+@click.option('--tehsil', help='Only farmers in this tehsil')
+@click.option('--top', 'top_n', default=DEFAULT_TOP_N, show_default=True, help='Recommendations saved per farmer')
+@click.option('--season', help='Season to recommend for (defaults to the current one)')
+@click.option('--dry-run', is_flag=True, help='Score farmers without saving recommendations')
+def recommend_all_command(district, tehsil, top_n, season, dry_run):
+    """Precompute crop recommendations for every farmer"""
+    summary = recommend_all(district=district, tehsil=tehsil, top_n=top_n, season=season, dry_run=dry_run)
+    click.echo(f"{summary['season']}: scored {summary['farmers_scored']} farmers, "
+               f"{'would create' if dry_run else 'created'} {summary['recommendations_created']} recommendations")
+
 @crops_bp.route('/crops/calendar/<int:crop_id>')
 @login_required
 def calendar(crop_id):
     farmer_id = session['farmer_id']
-    crop = Crop.query.get(crop_id)
+    crop = get_catalog('crops').get(crop_id)
     
     if not crop:
         flash('Crop not found!', 'error')
         return redirect(url_for('crops.index'))
     
-    # Generate crop calendar
+    # Generate crop calendar from the shared schedule template
     start_date = datetime.now()
-    calendar_events = []
-    
-    # Sowing
-    calendar_events.append({
-        'date': start_date,
-        'event': 'Sowing',
-        'description': f'Plant {crop.crop_name} seeds',
-        'type': 'sowing'
-    })
-    
-    # Irrigation schedule (every 7 days for first month, then every 10 days)
-    for i in range(1, crop.duration_days // 7 + 1):
-        if i <= 4:  # First month
-            event_date = start_date + timedelta(days=i*7)
-            calendar_events.append({
-                'date': event_date,
-                'event': 'Irrigation',
-                'description': f'Water {crop.crop_name} plants',
-                'type': 'irrigation'
-            })
-        else:  # After first month
-            event_date = start_date + timedelta(days=i*10)
-            calendar_events.append({
-                'date': event_date,
-                'event': 'Irrigation',
-                'description': f'Water {crop.crop_name} plants',
-                'type': 'irrigation'
-            })
-    
-    # Fertilizer application schedule
-    fertilizer_dates = [
-        (15, 'Nitrogen application'),
-        (30, 'Phosphorus application'),
-        (45, 'Potassium application'),
-        (60, 'Balanced NPK application')
-    ]
-    
-    for days, description in fertilizer_dates:
-        if days < crop.duration_days:
-            event_date = start_date + timedelta(days=days)
-            calendar_events.append({
-                'date': event_date,
-                'event': 'Fertilizer',
-                'description': f'{description} for {crop.crop_name}',
-                'type': 'fertilizer'
-            })
-    
-    # Pest/Disease spray reminders
-    spray_dates = [20, 40, 60, 80]
-    for days in spray_dates:
-        if days < crop.duration_days:
-            event_date = start_date + timedelta(days=days)
-            calendar_events.append({
-                'date': event_date,
-                'event': 'Spray',
-                'description': f'Pest/Disease control spray for {crop.crop_name}',
-                'type': 'spray'
-            })
-    
-    # Harvest
-    harvest_date = start_date + timedelta(days=crop.duration_days)
-    calendar_events.append({
-        'date': harvest_date,
-        'event': 'Harvest',
-        'description': f'Harvest {crop.crop_name}',
-        'type': 'harvest'
-    })
-    
-    # Sort events by date
-    calendar_events.sort(key=lambda x: x['date'])
+    calendar_events = get_schedule(crop).calendar_events(start_date)
     
     return render_template('crops/calendar.html', 
                          crop=crop, 
@@ -210,14 +140,19 @@ def calendar(crop_id):
 
 @crops_bp.route('/crops/knowledge')
 @login_required
+@read_replica
+@cache_page(catalogs=['crops'])
 def knowledge():
-    crops = Crop.query.all()
+    catalog = get_catalog('crops')
+    season = request.args.get('season')
+    crops = catalog.group(season) if season else catalog.all
     return render_template('crops/knowledge.html', crops=crops)
 
 @crops_bp.route('/crops/knowledge/<int:crop_id>')
 @login_required
+@read_replica
 def crop_details(crop_id):
-    crop = Crop.query.get(crop_id)
+    crop = get_catalog('crops').get(crop_id)
     if not crop:
         flash('Crop not found!', 'error')
         return redirect(url_for('crops.knowledge'))
@@ -2,6 +2,8 @@ from flask import Blueprint, render_template, session, request, flash, redirect,
 from models import Farmer, SoilData, WeatherData, Recommendation, Alert, db
 from datetime import datetime, timedelta
 from functools import wraps
+from sqlalchemy import func, select
+from services.dashboard_snapshot import get_dashboard
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -20,32 +22,18 @@ def index():
     farmer_id = session['farmer_id']
     farmer = Farmer.query.get(farmer_id)
     
-    # Get latest soil data
-    latest_soil = SoilData.query.filter_by(farmer_id=farmer_id).order_by(SoilData.date.desc()).first()
-    
-    # Get latest weather data
-    latest_weather = WeatherData.query.filter_by(farmer_id=farmer_id).order_by(WeatherData.date.desc()).first()
-    
-    # Get active recommendations
-    recommendations = Recommendation.query.filter_by(farmer_id=farmer_id).order_by(Recommendation.recommended_date.desc()).limit(5).all()
-    
-    # Get pending alerts
-    pending_alerts = Alert.query.filter_by(farmer_id=farmer_id, status='pending').order_by(Alert.alert_date.asc()).all()
-    
-    # Get recent soil data history
-    soil_history = SoilData.query.filter_by(farmer_id=farmer_id).order_by(SoilData.date.desc()).limit(5).all()
-    
-    # Get recent weather data history
-    weather_history = WeatherData.query.filter_by(farmer_id=farmer_id).order_by(WeatherData.date.desc()).limit(5).all()
+    # Everything else comes from the cached snapshot while the farmer's data is unchanged
+    dashboard = get_dashboard(farmer)
     
     return render_template('dashboard/index.html',
                          farmer=farmer,
-                         latest_soil=latest_soil,
-                         latest_weather=latest_weather,
-                         recommendations=recommendations,
-                         pending_alerts=pending_alerts,
-                         soil_history=soil_history,
-                         weather_history=weather_history,
+                         latest_soil=dashboard.latest_soil,
+                         latest_weather=dashboard.latest_weather,
+                         recommendations=dashboard.recommendations,
+                         pending_alerts=dashboard.pending_alerts,
+                         pending_alert_count=dashboard.pending_alert_count,
+                         soil_history=dashboard.soil_history,
+                         weather_history=dashboard.weather_history,
                          current_date=datetime.now().date())
 
 @dashboard_bp.route('/profile')
@@ -53,7 +41,16 @@ def index():
 def profile():
     farmer_id = session['farmer_id']
     farmer = Farmer.query.get(farmer_id)
-    return render_template('dashboard/profile.html', farmer=farmer)
+    
+    # Count related rows in one statement instead of loading every collection
+    stats = db.session.execute(select(
+        select(func.count(SoilData.id)).where(SoilData.farmer_id == farmer_id).scalar_subquery().label('soil_tests'),
+        select(func.count(WeatherData.id)).where(WeatherData.farmer_id == farmer_id).scalar_subquery().label('weather_records'),
+        select(func.count(Recommendation.id)).where(Recommendation.farmer_id == farmer_id).scalar_subquery().label('recommendations'),
+        select(func.count(Alert.id)).where(Alert.farmer_id == farmer_id, Alert.status == 'pending').scalar_subquery().label('pending_alerts')
+    )).one()
+    
+    return render_template('dashboard/profile.html', farmer=farmer, stats=stats)
 
 @dashboard_bp.route('/profile/edit', methods=['GET', 'POST'])
 @login_required
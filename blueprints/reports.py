@@ -1,13 +1,21 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session, make_response
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify, send_file
+from flask_babel import get_locale
 from models import Farmer, SoilData, WeatherData, Recommendation, Alert, Crop, db
 from datetime import datetime, timedelta
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from io import BytesIO
 from functools import wraps
+from services.db_config import read_replica
+from services.report_builder import report_filename
+from services.report_jobs import submit_report, get_job, report_file
+from services.report_cache import report_fingerprint, lookup, cache_stats
+from services.api_auth import api_token_required
+from services.bulk_export import export_reports, zip_directory, DEFAULT_CHUNK_SIZE
+from services.streaming_export import stream_export, history_export_query, EXPORT_FORMATS
+from services.rollups import rebuild_rollups
+import click
+from sqlalchemy.orm import joinedload
+from services.pagination import paginate_request, wants_json, page_json
+from blueprints.soil import SOIL_FIELDS
+from blueprints.weather import WEATHER_FIELDS
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -43,196 +51,151 @@ def index():
 @login_required
 def generate_report():
     farmer_id = session['farmer_id']
-    farmer = Farmer.query.get(farmer_id)
-    
-    # Get all data for the report
-    soil_data = SoilData.query.filter_by(farmer_id=farmer_id).order_by(SoilData.date.desc()).all()
-    weather_data = WeatherData.query.filter_by(farmer_id=farmer_id).order_by(WeatherData.date.desc()).all()
-    recommendations = Recommendation.query.filter_by(farmer_id=farmer_id).order_by(Recommendation.recommended_date.desc()).all()
-    alerts = Alert.query.filter_by(farmer_id=farmer_id).order_by(Alert.alert_date.asc()).all()
-    
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Title
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=1  # Center alignment
-    )
-    story.append(Paragraph("KrishiMitra: Agriband - Farmer Report", title_style))
-    story.append(Spacer(1, 12))
-    
-    # Farmer Information
-    story.append(Paragraph("Farmer Information", styles['Heading2']))
-    farmer_info = [
-        ['Name:', farmer.name],
-        ['Mobile:', farmer.mobile],
-        ['Village:', farmer.village],
-        ['Tehsil:', farmer.tehsil],
-        ['District:', farmer.district],
-        ['Pincode:', farmer.pincode]
-    ]
-    
-    farmer_table = Table(farmer_info, colWidths=[2*inch, 4*inch])
-    farmer_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
-        ('BACKGROUND', (1, 0), (1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
+    locale = get_locale()
+    fingerprint = report_fingerprint(farmer_id, locale)
     
-    story.append(farmer_table)
-    story.append(Spacer(1, 20))
+    # Same inputs as a stored report: serve it, or 304 if the browser has it
+    entry = lookup(fingerprint)
+    if entry is not None:
+        return _send_report(entry)
     
-    # Latest Soil Data
-    if soil_data:
-        story.append(Paragraph("Latest Soil Analysis", styles['Heading2']))
-        latest_soil = soil_data[0]
-        soil_info = [
-            ['Parameter', 'Value', 'Unit'],
-            ['pH Level', f"{latest_soil.ph:.2f}", ''],
-            ['Moisture', f"{latest_soil.moisture:.2f}", '%'],
-            ['Nitrogen', f"{latest_soil.nitrogen:.2f}", 'ppm'],
-            ['Phosphorus', f"{latest_soil.phosphorus:.2f}", 'ppm'],
-            ['Potassium', f"{latest_soil.potassium:.2f}", 'ppm'],
-            ['Temperature', f"{latest_soil.temperature:.2f}", '°C'],
-            ['Soil Type', latest_soil.soil_type, ''],
-            ['Test Date', latest_soil.date.strftime('%Y-%m-%d'), '']
-        ]
-        
-        soil_table = Table(soil_info, colWidths=[2*inch, 1.5*inch, 1*inch])
-        soil_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(soil_table)
-        story.append(Spacer(1, 20))
-    
-    # Latest Weather Data
-    if weather_data:
-        story.append(Paragraph("Latest Weather Data", styles['Heading2']))
-        latest_weather = weather_data[0]
-        weather_info = [
-            ['Parameter', 'Value', 'Unit'],
-            ['Temperature', f"{latest_weather.temperature:.2f}", '°C'],
-            ['Humidity', f"{latest_weather.humidity:.2f}", '%'],
-            ['Rainfall', f"{latest_weather.rainfall:.2f}", 'mm'],
-            ['Date', latest_weather.date.strftime('%Y-%m-%d'), '']
-        ]
-        
-        weather_table = Table(weather_info, colWidths=[2*inch, 1.5*inch, 1*inch])
-        weather_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(weather_table)
-        story.append(Spacer(1, 20))
-    
-    # Crop Recommendations
-    if recommendations:
-        story.append(Paragraph("Crop Recommendations", styles['Heading2']))
-        rec_data = [['Crop Name', 'Season', 'Confidence Score', 'Recommended Date']]
-        
-        for rec in recommendations:
-            rec_data.append([
-                rec.crop.crop_name,
-                rec.crop.season,
-                f"{rec.confidence_score:.1f}%",
-                rec.recommended_date.strftime('%Y-%m-%d')
-            ])
-        
-        rec_table = Table(rec_data, colWidths=[2*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-        rec_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(rec_table)
-        story.append(Spacer(1, 20))
+    # Render off the request thread; the job page polls until the PDF is ready
+    job_id = submit_report(farmer_id, fingerprint, locale)
+    return redirect(url_for('reports.report_job', job_id=job_id))
+
+def _send_report(entry):
+    """Send a stored PDF with its content hash as the ETag"""
+    farmer = Farmer.query.get(entry['farmer_id'])
+    response = send_file(report_file(entry), mimetype='application/pdf',
+                         as_attachment=True, download_name=report_filename(farmer),
+                         etag=entry['sha256'], conditional=True)
+    response.cache_control.private = True
+    return response
+
+def _farmer_job(job_id):
+    """Return the job if it exists and belongs to the logged-in farmer"""
+    job = get_job(job_id)
+    if job is None or job['farmer_id'] != session['farmer_id']:
+        return None
+    return job
+
+@reports_bp.route('/reports/jobs/<job_id>')
+@login_required
+def report_job(job_id):
+    job = _farmer_job(job_id)
     
-    # Upcoming Alerts
-    if alerts:
-        story.append(Paragraph("Upcoming Alerts", styles['Heading2']))
-        alert_data = [['Alert Type', 'Crop', 'Date', 'Message']]
-        
-        for alert in alerts[:10]:  # Show only first 10 alerts
-            alert_data.append([
-                alert.alert_type.title(),
-                alert.crop.crop_name,
-                alert.alert_date.strftime('%Y-%m-%d'),
-                alert.message[:50] + '...' if len(alert.message) > 50 else alert.message
-            ])
-        
-        alert_table = Table(alert_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 2.5*inch])
-        alert_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        
-        story.append(alert_table)
-        story.append(Spacer(1, 20))
+    if wants_json():
+        if job is None:
+            return jsonify({'error': 'Report job not found'}), 404
+        status = {key: job.get(key) for key in ('job_id', 'status', 'created_at', 'finished_at', 'sha256', 'error')}
+        if job['status'] == 'done':
+            status['download_url'] = url_for('reports.download_report', job_id=job_id)
+        return jsonify(status)
     
-    # Footer
-    story.append(Paragraph(f"Report Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", styles['Normal']))
-    story.append(Paragraph("KrishiMitra: Agriband - Smart Farming Decision Support System", styles['Normal']))
+    if job is None:
+        flash('Report not found!', 'error')
+        return redirect(url_for('reports.index'))
     
-    # Build PDF
-    doc.build(story)
-    buffer.seek(0)
+    if job['status'] == 'done':
+        return redirect(url_for('reports.download_report', job_id=job_id))
     
-    # Create response
-    response = make_response(buffer.getvalue())
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'attachment; filename=farmer_report_{farmer.name}_{datetime.now().strftime("%Y%m%d")}.pdf'
+    if job['status'] == 'failed':
+        flash('An error occurred while generating the report. Please try again.', 'error')
+        return redirect(url_for('reports.index'))
     
-    return response
+    return render_template('reports/job.html', job=job)
+
+@reports_bp.route('/reports/jobs/<job_id>/download')
+@login_required
+def download_report(job_id):
+    job = _farmer_job(job_id)
+    
+    if job is None or job['status'] != 'done':
+        flash('Report not found!', 'error')
+        return redirect(url_for('reports.index'))
+    
+    try:
+        return _send_report(job)
+    except FileNotFoundError:
+        # Evicted from the report cache since the job finished
+        flash('Report has expired. Please generate it again.', 'error')
+        return redirect(url_for('reports.index'))
+
+@reports_bp.route('/reports/cache/stats')
+@api_token_required
+def report_cache_stats():
+    return jsonify(cache_stats())
 
 @reports_bp.route('/reports/soil-history')
 @login_required
+@read_replica
 def soil_history():
     farmer_id = session['farmer_id']
-    soil_data = SoilData.query.filter_by(farmer_id=farmer_id).order_by(SoilData.date.desc()).all()
-    return render_template('reports/soil_history.html', soil_data=soil_data)
+    page = paginate_request(SoilData.query.filter_by(farmer_id=farmer_id), SoilData.date, SoilData.id)
+    if wants_json():
+        return page_json(page, SOIL_FIELDS)
+    return render_template('reports/soil_history.html', soil_data=page.items, page=page)
 
 @reports_bp.route('/reports/weather-history')
 @login_required
+@read_replica
 def weather_history():
     farmer_id = session['farmer_id']
-    weather_data = WeatherData.query.filter_by(farmer_id=farmer_id).order_by(WeatherData.date.desc()).all()
-    return render_template('reports/weather_history.html', weather_data=weather_data)
+    page = paginate_request(WeatherData.query.filter_by(farmer_id=farmer_id), WeatherData.date, WeatherData.id)
+    if wants_json():
+        return page_json(page, WEATHER_FIELDS)
+    return render_template('reports/weather_history.html', weather_data=page.items, page=page)
+
+def _export_history(model, fields, export_format, name):
+    """Stream the logged-in farmer's rows of `model`, newest first"""
+    if export_format not in EXPORT_FORMATS:
+        flash('Unsupported export format!', 'error')
+        return redirect(url_for('reports.index'))
+    
+    statement = history_export_query(model, fields, session['farmer_id'])
+    return stream_export(statement, fields, export_format, f"{name}_{datetime.now().strftime('%Y%m%d')}")
+
+@reports_bp.route('/reports/soil-history/export/<export_format>')
+@login_required
+@read_replica
+def export_soil_history(export_format):
+    return _export_history(SoilData, SOIL_FIELDS, export_format, 'soil_history')
+
+@reports_bp.route('/reports/weather-history/export/<export_format>')
+@login_required
+@read_replica
+def export_weather_history(export_format):
+    return _export_history(WeatherData, WEATHER_FIELDS, export_format, 'weather_history')
+
+@reports_bp.cli.command('export')
+@click.option('--district', help='Only farmers in this district')
+@click.option('--tehsil', help='Only farmers in this tehsil')
+@click.option('--out', 'output', required=True, help='Output directory, or a .zip file')
+@click.option('--locale', default='en', show_default=True, help='Report language')
+@click.option('--workers', type=int, help='Render processes (defaults to the CPU count)')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True, help='Farmers rendered per batch')
+def export_command(district, tehsil, output, locale, workers, chunk_size):
+    """Export PDF reports for every farmer in a district or tehsil"""
+    # A zip is packed from a working directory next to it, which also makes the export resumable
+    directory = output[:-4] if output.endswith('.zip') else output
+    
+    def progress(summary):
+        click.echo(f"{summary['exported']} exported, {summary['skipped']} already done, "
+                   f"{summary['failed']} failed ({summary['reports_per_second']:.1f} reports/s)")
+    
+    summary = export_reports(directory, district=district, tehsil=tehsil, locale=locale,
+                             workers=workers, chunk_size=chunk_size, progress=progress)
+    if output.endswith('.zip'):
+        zip_directory(directory, output)
+    
+    click.echo(f"Exported {summary['exported']} reports ({summary['bytes'] / 1024 / 1024:.1f} MB) "
+               f"in {summary['seconds']:.1f}s, {summary['reports_per_second']:.1f} reports/s -> {output}")
+    if summary['failed']:
+        click.echo(f"{summary['failed']} reports failed; rerun the same command to retry them")
+
+@reports_bp.cli.command('rebuild-rollups')
+@click.option('--farmer-id', type=int, help='Only this farmer (defaults to everyone)')
+def rebuild_rollups_command(farmer_id):
+    """Recompute the daily and weekly reading rollups from raw readings"""
+    rebuild_rollups(farmer_id)
+    click.echo('Rollups rebuilt')
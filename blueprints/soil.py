@@ -2,9 +2,19 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for,
 from models import SoilData, Farmer, db
 from datetime import datetime
 from functools import wraps
+from services.db_config import read_replica
+from services.pagination import paginate_request, wants_json, page_json
+from services.sensor_ingest import SOIL_BOUNDS, out_of_bounds, parse_payload, ingest, ingest_file
+from services.api_auth import api_token_required
+from services.write_behind import get_buffer, BufferClosed, BufferFull, WriteFailed
+from services.rollups import series, series_json, parse_series_args
+import click
 
 soil_bp = Blueprint('soil', __name__)
 
+# Fields returned by the JSON variant of the soil history list
+SOIL_FIELDS = ['id', 'ph', 'moisture', 'nitrogen', 'phosphorus', 'potassium', 'temperature', 'soil_type', 'date']
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -16,15 +26,18 @@ def login_required(f):
 
 @soil_bp.route('/soil')
 @login_required
+@read_replica
 def index():
     farmer_id = session['farmer_id']
     
     try:
-        soil_data = SoilData.query.filter_by(farmer_id=farmer_id).order_by(SoilData.date.desc()).all()
-        return render_template('soil/index.html', soil_data=soil_data)
+        page = paginate_request(SoilData.query.filter_by(farmer_id=farmer_id), SoilData.date, SoilData.id)
+        if wants_json():
+            return page_json(page, SOIL_FIELDS)
+        return render_template('soil/index.html', soil_data=page.items, page=page)
     except Exception as e:
         flash('An error occurred while retrieving soil data. Please try again.', 'error')
-        return render_template('soil/index.html', soil_data=[])
+        return render_template('soil/index.html', soil_data=[], page=None)
 
 @soil_bp.route('/soil/add', methods=['GET', 'POST'])
 @login_required
@@ -41,29 +54,11 @@ def add():
             temperature = float(request.form['temperature'])
             soil_type = request.form['soil_type']
             
-            # Validation
-            if not (0 <= ph <= 14):
-                flash('pH value must be between 0 and 14!', 'error')
-                return render_template('soil/add.html')
-            
-            if not (0 <= moisture <= 100):
-                flash('Moisture level must be between 0 and 100%!', 'error')
-                return render_template('soil/add.html')
-            
-            if not (0 <= nitrogen <= 1000):
-                flash('Nitrogen level must be between 0 and 1000 ppm!', 'error')
-                return render_template('soil/add.html')
-            
-            if not (0 <= phosphorus <= 1000):
-                flash('Phosphorus level must be between 0 and 1000 ppm!', 'error')
-                return render_template('soil/add.html')
-            
-            if not (0 <= potassium <= 1000):
-                flash('Potassium level must be between 0 and 1000 ppm!', 'error')
-                return render_template('soil/add.html')
-            
-            if not (-10 <= temperature <= 50):
-                flash('Temperature must be between -10°C and 50°C!', 'error')
+            # Validation (the bulk ingest endpoint checks the same bounds)
+            error = out_of_bounds({'ph': ph, 'moisture': moisture, 'nitrogen': nitrogen, 'phosphorus': phosphorus,
+                                   'potassium': potassium, 'temperature': temperature}, SOIL_BOUNDS)
+            if error:
+                flash(error, 'error')
                 return render_template('soil/add.html')
             
             if not soil_type or soil_type.strip() == '':
@@ -71,19 +66,24 @@ def add():
                 return render_template('soil/add.html')
             
             # Create soil data record
-            soil_data = SoilData(
-                farmer_id=farmer_id,
-                ph=ph,
-                moisture=moisture,
-                nitrogen=nitrogen,
-                phosphorus=phosphorus,
-                potassium=potassium,
-                temperature=temperature,
-                soil_type=soil_type
-            )
+            reading = {
+                'farmer_id': farmer_id,
+                'ph': ph,
+                'moisture': moisture,
+                'nitrogen': nitrogen,
+                'phosphorus': phosphorus,
+                'potassium': potassium,
+                'temperature': temperature,
+                'soil_type': soil_type
+            }
             
-            db.session.add(soil_data)
-            db.session.commit()
+            buffer = get_buffer()
+            if buffer is not None:
+                # Shares a group commit with concurrent readings; wait for it so the list shows this one
+                buffer.submit('soil', [dict(reading, date=datetime.utcnow())], wait=True)
+            else:
+                db.session.add(SoilData(**reading))
+                db.session.commit()
             
             flash('Soil data added successfully!', 'success')
             return redirect(url_for('soil.index'))
@@ -91,6 +91,13 @@ def add():
         except ValueError:
             flash('Please enter valid numeric values!', 'error')
             return render_template('soil/add.html')
+        except (BufferFull, BufferClosed):
+            # Full, or closed while this worker shuts down
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('soil/add.html')
+        except WriteFailed:
+            flash('Your soil data could not be saved. Please check the values and try again.', 'error')
+            return render_template('soil/add.html')
         except Exception as e:
             db.session.rollback()
             flash('An error occurred while saving soil data. Please try again.', 'error')
@@ -100,6 +107,43 @@ def add():
     return render_template('soil/add.html')
             
 
+@soil_bp.route('/soil/ingest', methods=['POST'])
+@api_token_required
+def ingest_readings():
+    """Bulk insert soil readings posted as JSON, NDJSON or CSV"""
+    try:
+        rows = parse_payload(request.get_data(), request.content_type or '')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid payload: {e}'}), 400
+    
+    try:
+        summary = ingest('soil', rows, request.args.get('farmer_id', type=int), buffer=get_buffer())
+    except (BufferFull, BufferClosed) as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    return jsonify(summary), 202 if summary['queued'] else 200
+
+@soil_bp.cli.command('ingest')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--farmer-id', type=int, help='Farmer for rows without a farmer_id column')
+def ingest_command(path, farmer_id):
+    """Load soil readings from a .csv, .ndjson or .json file"""
+    summary = ingest_file('soil', path, farmer_id)
+    click.echo(f"Inserted {summary['inserted']} of {summary['received']} readings "
+               f"({summary['rows_per_second']:.0f} rows/s), rejected {summary['rejected']}")
+    for reject in summary['rejects'][:20]:
+        click.echo(f"  row {reject['row']}: {'; '.join(reject['errors'])}")
+
+@soil_bp.route('/soil/series')
+@login_required
+@read_replica
+def series_data():
+    """Soil chart data at the resolution that suits the requested range"""
+    try:
+        start, end, metrics, resolution = parse_series_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(series_json(series(session['farmer_id'], 'soil', start, end, metrics, resolution)))
+
 @soil_bp.route('/soil/<int:soil_id>')
 @login_required
 def view(soil_id):
@@ -2,6 +2,8 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for,
 from models import Query, Farmer, db
 from datetime import datetime
 from functools import wraps
+from services.pagination import paginate_request, wants_json, page_json
+from services.page_cache import cache_page
 
 support_bp = Blueprint('support', __name__)
 
@@ -18,8 +20,10 @@ def login_required(f):
 @login_required
 def index():
     farmer_id = session['farmer_id']
-    queries = Query.query.filter_by(farmer_id=farmer_id).order_by(Query.created_at.desc()).all()
-    return render_template('support/index.html', queries=queries)
+    page = paginate_request(Query.query.filter_by(farmer_id=farmer_id), Query.created_at, Query.id)
+    if wants_json():
+        return page_json(page, ['id', 'question', 'status', 'reply', 'created_at', 'answered_at'])
+    return render_template('support/index.html', queries=page.items, page=page)
 
 @support_bp.route('/support/ask', methods=['GET', 'POST'])
 @login_required
@@ -60,6 +64,7 @@ def view_query(query_id):
 
 @support_bp.route('/support/faq')
 @login_required
+@cache_page()
 def faq():
     faqs = [
         {
@@ -100,5 +105,6 @@ def faq():
 
 @support_bp.route('/support/contact')
 @login_required
+@cache_page()
 def contact():
     return render_template('support/contact.html')
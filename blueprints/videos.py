@@ -2,9 +2,19 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for,
 from models import Video, db
 from datetime import datetime
 from functools import wraps
+from services.db_config import read_replica
+from services.pagination import DEFAULT_PER_PAGE
+from services.video_search import search_videos, count_videos, rebuild_video_search
+from services.catalog_cache import get_catalog
+from services.related_videos import related_video_ids, record_view, rebuild_related
+import click
 
 videos_bp = Blueprint('videos', __name__)
 
+RELATED_SHOWN = 4
+# Videos per farmer session already recorded in video_views
+VIEWED_REMEMBERED = 100
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -16,44 +26,68 @@ def login_required(f):
 
 @videos_bp.route('/videos')
 @login_required
+@read_replica
 def index():
-    videos = Video.query.order_by(Video.created_at.desc()).all()
+    videos = get_catalog('videos').all
     return render_template('videos/index.html', videos=videos)
 
 @videos_bp.route('/videos/category/<category>')
 @login_required
+@read_replica
 def category(category):
-    videos = Video.query.filter_by(category=category).order_by(Video.created_at.desc()).all()
+    videos = get_catalog('videos').group(category)
     return render_template('videos/category.html', videos=videos, category=category)
 
 @videos_bp.route('/videos/<int:video_id>')
 @login_required
+@read_replica
 def view(video_id):
-    video = Video.query.get(video_id)
+    catalog = get_catalog('videos')
+    video = catalog.get(video_id)
     if not video:
         flash('Video not found!', 'error')
         return redirect(url_for('videos.index'))
     
-    # Get related videos (same category)
-    related_videos = Video.query.filter(
-        Video.category == video.category,
-        Video.id != video_id
-    ).limit(4).all()
+    # Precomputed neighbours; the same category until the video's row is built
+    related_ids = related_video_ids(video_id)
+    if related_ids is None:
+        related_ids = [related.id for related in catalog.group(video.category) if related.id != video_id]
+    related_videos = [related for related in map(catalog.get, related_ids) if related][:RELATED_SHOWN]
+    
+    viewed = session.get('viewed_videos', [])
+    if video_id not in viewed:
+        record_view(session['farmer_id'], video_id)
+        session['viewed_videos'] = (viewed + [video_id])[-VIEWED_REMEMBERED:]
     
     return render_template('videos/view.html', video=video, related_videos=related_videos)
 
 @videos_bp.route('/videos/search')
 @login_required
+@read_replica
 def search():
     query = request.args.get('q', '')
+    page = None
+    total = 0
     if query:
-        videos = Video.query.filter(
-            Video.title.contains(query) | Video.description.contains(query)
-        ).order_by(Video.created_at.desc()).all()
-    else:
-        videos = []
+        # A page of results at a time, best matches first
+        page = search_videos(query, request.args.get('cursor'),
+                             request.args.get('per_page', DEFAULT_PER_PAGE, type=int))
+        total = count_videos(query)
     
-    return render_template('videos/search.html', videos=videos, query=query)
+    return render_template('videos/search.html', videos=page.items if page else [], page=page, total=total, query=query)
+
+@videos_bp.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Reindex all videos for full-text search"""
+    rebuild_video_search()
+    click.echo('Video search index rebuilt')
+
+@videos_bp.cli.command('rebuild-related')
+def rebuild_related_command():
+    """Recompute related videos from text, categories and co-viewing"""
+    count = rebuild_related()
+    db.session.commit()
+    click.echo(f'Related videos rebuilt for {count} videos')
 
 def initialize_videos():
     """Initialize the video database with sample BMP videos"""
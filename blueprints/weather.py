@@ -1,12 +1,24 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session, jsonify, current_app
 from models import WeatherData, Farmer, db
-from datetime import datetime
+from datetime import datetime, timedelta
 import requests
 import os
 from functools import wraps
+from services.db_config import read_replica
+from services.pagination import paginate_request, wants_json, page_json
+from services.sensor_ingest import WEATHER_BOUNDS, out_of_bounds, parse_payload, ingest, ingest_file
+from services.api_auth import api_token_required
+from services.write_behind import get_buffer, BufferClosed, BufferFull, WriteFailed
+from services.rollups import series, series_json, parse_series_args, totals
+from services.weather_stats import farmer_stats, trend, rebuild_stats
+from services.weather_provider import get_client, WeatherProviderError
+import click
 
 weather_bp = Blueprint('weather', __name__)
 
+# Fields returned by the JSON variant of the weather history list
+WEATHER_FIELDS = ['id', 'temperature', 'humidity', 'rainfall', 'date']
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -18,10 +30,13 @@ def login_required(f):
 
 @weather_bp.route('/weather')
 @login_required
+@read_replica
 def index():
     farmer_id = session['farmer_id']
-    weather_data = WeatherData.query.filter_by(farmer_id=farmer_id).order_by(WeatherData.date.desc()).all()
-    return render_template('weather/index.html', weather_data=weather_data)
+    page = paginate_request(WeatherData.query.filter_by(farmer_id=farmer_id), WeatherData.date, WeatherData.id)
+    if wants_json():
+        return page_json(page, WEATHER_FIELDS)
+    return render_template('weather/index.html', weather_data=page.items, page=page)
 
 @weather_bp.route('/weather/fetch')
 @login_required
@@ -29,24 +44,16 @@ def fetch_weather():
     farmer_id = session['farmer_id']
     farmer = Farmer.query.get(farmer_id)
     
-    # OpenWeather API key (you should set this as an environment variable)
-    api_key = os.getenv('OPENWEATHER_API_KEY', 'your-api-key-here')
+    # Provider configured with OPENWEATHER_API_KEY or WEATHER_PROVIDER
+    client = get_client()
     
-    if api_key == 'your-api-key-here':
+    if client is None:
         flash('Weather API key not configured. Please add weather data manually.', 'warning')
         return redirect(url_for('weather.add'))
     
     try:
-        # Get weather data by pincode (using a weather service that supports postal codes)
-        # For demo purposes, we'll use a mock API call
-        # In production, you would use a real weather API
-        
-        # Mock weather data for demonstration
-        weather_data = {
-            'temperature': 28.5,
-            'humidity': 65.0,
-            'rainfall': 0.0
-        }
+        # Farmers sharing a pincode share one cached provider call
+        weather_data = client.current(farmer.pincode)
         
         # Create weather data record
         weather_record = WeatherData(
@@ -61,11 +68,26 @@ def fetch_weather():
         
         flash('Weather data fetched and saved successfully!', 'success')
         
-    except Exception as e:
-        flash(f'Error fetching weather data: {str(e)}', 'error')
+    except WeatherProviderError as e:
+        # Provider errors stay in the server log; farmers get a generic message
+        current_app.logger.warning('Weather fetch for pincode %s failed: %s', farmer.pincode, e)
+        flash('Weather service unavailable. Please add weather data manually.', 'error')
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Saving fetched weather for farmer %s failed', farmer_id)
+        flash('Error fetching weather data. Please try again later.', 'error')
     
     return redirect(url_for('weather.index'))
 
+@weather_bp.route('/weather/provider/stats')
+@api_token_required
+def provider_stats():
+    """Weather provider cache and latency counters"""
+    client = get_client()
+    if client is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(client.metrics(), enabled=True))
+
 @weather_bp.route('/weather/add', methods=['GET', 'POST'])
 @login_required
 def add():
@@ -77,29 +99,27 @@ def add():
             humidity = float(request.form['humidity'])
             rainfall = float(request.form['rainfall'])
             
-            # Validation
-            if not (-50 <= temperature <= 50):
-                flash('Temperature must be between -50°C and 50°C!', 'error')
-                return render_template('weather/add.html')
-            
-            if not (0 <= humidity <= 100):
-                flash('Humidity must be between 0 and 100%!', 'error')
-                return render_template('weather/add.html')
-            
-            if rainfall < 0:
-                flash('Rainfall cannot be negative!', 'error')
+            # Validation (the bulk ingest endpoint checks the same bounds)
+            error = out_of_bounds({'temperature': temperature, 'humidity': humidity, 'rainfall': rainfall}, WEATHER_BOUNDS)
+            if error:
+                flash(error, 'error')
                 return render_template('weather/add.html')
             
             # Create weather data record
-            weather_data = WeatherData(
-                farmer_id=farmer_id,
-                temperature=temperature,
-                humidity=humidity,
-                rainfall=rainfall
-            )
+            reading = {
+                'farmer_id': farmer_id,
+                'temperature': temperature,
+                'humidity': humidity,
+                'rainfall': rainfall
+            }
             
-            db.session.add(weather_data)
-            db.session.commit()
+            buffer = get_buffer()
+            if buffer is not None:
+                # Shares a group commit with concurrent readings; wait for it so the list shows this one
+                buffer.submit('weather', [dict(reading, date=datetime.utcnow())], wait=True)
+            else:
+                db.session.add(WeatherData(**reading))
+                db.session.commit()
             
             flash('Weather data added successfully!', 'success')
             return redirect(url_for('weather.index'))
@@ -107,9 +127,61 @@ def add():
         except ValueError:
             flash('Please enter valid numeric values!', 'error')
             return render_template('weather/add.html')
+        except (BufferFull, BufferClosed):
+            # Full, or closed while this worker shuts down
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('weather/add.html')
+        except WriteFailed:
+            flash('Your weather data could not be saved. Please check the values and try again.', 'error')
+            return render_template('weather/add.html')
     
     return render_template('weather/add.html')
 
+@weather_bp.route('/weather/ingest', methods=['POST'])
+@api_token_required
+def ingest_readings():
+    """Bulk insert weather readings posted as JSON, NDJSON or CSV"""
+    try:
+        rows = parse_payload(request.get_data(), request.content_type or '')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid payload: {e}'}), 400
+    
+    try:
+        summary = ingest('weather', rows, request.args.get('farmer_id', type=int), buffer=get_buffer())
+    except (BufferFull, BufferClosed) as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+    return jsonify(summary), 202 if summary['queued'] else 200
+
+@weather_bp.cli.command('ingest')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--farmer-id', type=int, help='Farmer for rows without a farmer_id column')
+def ingest_command(path, farmer_id):
+    """Load weather readings from a .csv, .ndjson or .json file"""
+    summary = ingest_file('weather', path, farmer_id)
+    click.echo(f"Inserted {summary['inserted']} of {summary['received']} readings "
+               f"({summary['rows_per_second']:.0f} rows/s), rejected {summary['rejected']}")
+    for reject in summary['rejects'][:20]:
+        click.echo(f"  row {reject['row']}: {'; '.join(reject['errors'])}")
+
+@weather_bp.cli.command('rebuild-stats')
+@click.option('--farmer-id', type=int, help='Only this farmer (defaults to everyone)')
+def rebuild_stats_command(farmer_id):
+    """Recompute the rolling weather statistics from the reading history"""
+    rebuild_stats([farmer_id] if farmer_id else None)
+    db.session.commit()
+    click.echo('Weather stats rebuilt')
+
+@weather_bp.route('/weather/series')
+@login_required
+@read_replica
+def series_data():
+    """Weather chart data at the resolution that suits the requested range"""
+    try:
+        start, end, metrics, resolution = parse_series_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(series_json(series(session['farmer_id'], 'weather', start, end, metrics, resolution)))
+
 @weather_bp.route('/weather/<int:weather_id>')
 @login_required
 def view(weather_id):
@@ -143,20 +215,27 @@ def forecast():
     farmer_id = session['farmer_id']
     farmer = Farmer.query.get(farmer_id)
     
-    # Get recent weather data for trend analysis
-    recent_weather = WeatherData.query.filter_by(farmer_id=farmer_id).order_by(WeatherData.date.desc()).limit(7).all()
+    current = WeatherData.query.filter_by(farmer_id=farmer_id).order_by(WeatherData.date.desc()).first()
     
-    # Simple forecast based on recent trends
+    # Simple forecast from the rolling stats and the daily rollups of the week up to the latest reading
+    stats = farmer_stats(farmer_id)
+    temperature = stats.get('temperature')
     forecast_data = {
-        'current': recent_weather[0] if recent_weather else None,
-        'trend': 'stable',
+        'current': current,
+        'trend': trend(temperature),
+        'trend_rate': temperature.slope if temperature else None,
         'recommendations': []
     }
+    recent_weather = []
     
-    if recent_weather:
-        avg_temp = sum(w.temperature for w in recent_weather) / len(recent_weather)
-        avg_humidity = sum(w.humidity for w in recent_weather) / len(recent_weather)
-        total_rainfall = sum(w.rainfall for w in recent_weather)
+    if current:
+        end = current.date + timedelta(days=1)
+        recent_weather = series(farmer_id, 'weather', end - timedelta(days=7), end, resolution='day')['points']
+        recent_weather.reverse()
+        _, _, total_rainfall = totals(recent_weather, 'rainfall')
+        # Moving averages; the rollups cover databases whose stats are not built yet
+        avg_temp = temperature.mean if temperature else totals(recent_weather, 'temperature')[1]
+        avg_humidity = stats['humidity'].mean if 'humidity' in stats else totals(recent_weather, 'humidity')[1]
         
         if avg_temp > 30:
             forecast_data['recommendations'].append('High temperature - increase irrigation')
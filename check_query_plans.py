@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Query plan audit for KrishiMitra blueprint queries.
+
+Runs EXPLAIN QUERY PLAN on the queries each blueprint issues and fails when
+one of them scans a whole table instead of searching an index. Queries built
+in services are taken from the builders the services run themselves. Catalog
+and rebuild queries that are meant to read every row are listed with
+allow_scan=True.
+
+Usage: python check_query_plans.py [path/to/krishimitra.db]
+Without a path the audit runs on a scratch in-memory database built from
+models.py. A database file is audited as-is, so missing migrations show up.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+from flask import Flask
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+from services.pagination import keyset_query, DEFAULT_PER_PAGE
+from models import (db, ensure_indexes, Alert, Crop, Query, Recommendation, RelatedVideos, SoilData, Video, VideoTerm,
+                    VideoTermFrequency, VideoView, WeatherData)
+from services.rollups import readings_query, rollup_query
+from services.video_search import SEARCH_SQL
+from services.catalog_cache import catalog_query, versions_query
+from services.report_builder import farmer_report_queries
+from services.batch_recommend import latest_readings_query
+from services.bulk_export import farmer_chunk_query
+from services.streaming_export import history_export_query
+from services.weather_stats import history_query, state_query, stats_query
+
+FARMER_ID = 1
+
+def history_page(query, sort_column, id_column, descending=True, key=(datetime(2024, 1, 1), 100)):
+    """A keyset-paginated history page after some cursor, as the list views issue it"""
+    return keyset_query(query, sort_column, id_column, key, descending).limit(DEFAULT_PER_PAGE + 1)
+
+def audited_queries():
+    """(name, statement, allow_scan) for every blueprint query"""
+    now = datetime.now()
+    return [
+        # soil
+        ('soil.index', history_page(SoilData.query.filter_by(farmer_id=FARMER_ID), SoilData.date, SoilData.id), False),
+        ('soil.view', SoilData.query.filter_by(id=1, farmer_id=FARMER_ID), False),
+        ('soil.analysis', SoilData.query.filter_by(farmer_id=FARMER_ID).order_by(SoilData.date.desc()).limit(1), False),
+        # weather
+        ('weather.index', history_page(WeatherData.query.filter_by(farmer_id=FARMER_ID), WeatherData.date, WeatherData.id), False),
+        ('weather.view', WeatherData.query.filter_by(id=1, farmer_id=FARMER_ID), False),
+        ('weather.forecast', WeatherData.query.filter_by(farmer_id=FARMER_ID).order_by(WeatherData.date.desc()).limit(1), False),
+        ('weather.forecast_days', rollup_query(FARMER_ID, 'weather', 'day', ['temperature', 'humidity', 'rainfall'],
+            now - timedelta(days=7), now), False),
+        ('weather.series_weeks', rollup_query(FARMER_ID, 'weather', 'week', ['temperature'], now - timedelta(days=365), now), False),
+        ('weather.series_raw', readings_query('weather', FARMER_ID, now - timedelta(days=3), now), False),
+        ('weather.stats', stats_query(FARMER_ID, 30), False),
+        # rollups and weather stats kept up to date on every write
+        ('rollups.recompute_period', readings_query('soil', FARMER_ID, now - timedelta(days=7), now), False),
+        ('weather_stats.state', state_query([FARMER_ID, FARMER_ID + 1]), False),
+        ('weather_stats.replay', history_query([FARMER_ID]), False),
+        ('weather_stats.rebuild', history_query(), True),
+        # alerts
+        ('alerts.index', history_page(Alert.query.options(joinedload(Alert.crop)).filter_by(farmer_id=FARMER_ID),
+            Alert.alert_date, Alert.id, descending=False), False),
+        ('alerts.index_status', history_page(Alert.query.options(joinedload(Alert.crop))
+            .filter_by(farmer_id=FARMER_ID, status='pending'), Alert.alert_date, Alert.id, descending=False), False),
+        ('soil.index_null_dates', history_page(SoilData.query.filter_by(farmer_id=FARMER_ID), SoilData.date, SoilData.id,
+            key=(None, 100)), False),
+        ('alerts.status_counts', select(Alert.status, func.count(Alert.id))
+            .where(Alert.farmer_id == FARMER_ID).group_by(Alert.status), False),
+        ('alerts.upcoming', Alert.query.options(joinedload(Alert.crop)).filter(
+            Alert.farmer_id == FARMER_ID, Alert.alert_date <= now + timedelta(days=7),
+            Alert.alert_date >= now, Alert.status == 'pending').order_by(Alert.alert_date.asc()), False),
+        ('alerts.existing_keys', select(Alert.crop_id, Alert.alert_type, Alert.alert_date)
+            .where(Alert.farmer_id == FARMER_ID), False),
+        ('alerts.by_id', Alert.query.filter_by(id=1, farmer_id=FARMER_ID), False),
+        # dashboard / reports
+        ('dashboard.recommendations', Recommendation.query.options(joinedload(Recommendation.crop))
+            .filter_by(farmer_id=FARMER_ID).order_by(Recommendation.recommended_date.desc()).limit(5), False),
+        ('dashboard.pending_alerts', Alert.query.options(joinedload(Alert.crop))
+            .filter_by(farmer_id=FARMER_ID, status='pending').order_by(Alert.alert_date.asc()), False),
+        ('reports.recommendations', Recommendation.query.options(joinedload(Recommendation.crop))
+            .filter_by(farmer_id=FARMER_ID).order_by(Recommendation.recommended_date.desc()), False),
+        *[(f'reports.pdf_{field}', query, False) for field, query in farmer_report_queries(FARMER_ID).items()],
+        ('reports.export_soil', history_export_query(SoilData, ['id', 'ph', 'date'], FARMER_ID), False),
+        ('reports.export_weather', history_export_query(WeatherData, ['id', 'temperature', 'date'], FARMER_ID), False),
+        ('reports.bulk_export_chunk', farmer_chunk_query(district='Pune', last_id=100), False),
+        # batch recommendations read every farmer's latest readings, or one district's
+        ('crops.batch_latest_readings', latest_readings_query(), True),
+        ('crops.batch_latest_readings_district', latest_readings_query(district='Pune'), False),
+        # crops
+        ('crops.save_recommendation', Recommendation.query.filter_by(farmer_id=FARMER_ID, crop_id=1), False),
+        # crop and video catalogs, loaded whole into each worker's cache
+        ('catalog.versions', versions_query(), True),
+        ('catalog.crops', catalog_query('crops'), True),
+        ('catalog.videos', catalog_query('videos'), True),
+        # support
+        ('support.index', history_page(Query.query.filter_by(farmer_id=FARMER_ID), Query.created_at, Query.id), False),
+        ('support.view_query', Query.query.filter_by(id=1, farmer_id=FARMER_ID), False),
+        # videos
+        ('videos.view', select(RelatedVideos.neighbours).where(RelatedVideos.video_id == 1), False),
+        ('videos.search', SEARCH_SQL.bindparams(expression='"soil"*', rank=-1.0, id=1, limit=26), False),
+        # related videos of an added or edited video, read through the word and view indexes
+        ('related.term_frequencies', select(VideoTermFrequency.term, VideoTermFrequency.videos)
+            .where(VideoTermFrequency.term.in_(['drip', 'soil'])), False),
+        ('related.similar_videos', select(VideoTerm.video_id).distinct().where(VideoTerm.term.in_(['drip', 'soil'])), False),
+        ('related.term_counts', select(VideoTerm.video_id, VideoTerm.term, VideoTerm.count)
+            .where(VideoTerm.video_id.in_([1, 2])), False),
+        ('related.viewers', select(VideoView.farmer_id).where(VideoView.video_id.in_([1])), False),
+        ('related.viewer_views', select(VideoView.farmer_id, VideoView.video_id).where(VideoView.farmer_id.in_([1, 2])), False),
+        ('related.heavy_viewers', select(VideoView.farmer_id).where(VideoView.farmer_id.in_([1, 2]))
+            .group_by(VideoView.farmer_id).having(func.count() > 200), False),
+        ('related.category_newest', select(Video.id, Video.category, Video.created_at).where(Video.category == 'Irrigation')
+            .order_by(Video.created_at.desc(), Video.id.desc()).limit(9), False),
+    ]
+
+def explain(statement):
+    """Return the EXPLAIN QUERY PLAN detail lines for an ORM query or Core statement"""
+    statement = getattr(statement, 'statement', statement)
+    # Expand IN lists into one placeholder per value
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.construct_params()
+    parameters = []
+    for name in compiled.positiontup:
+        # Expanded IN values have no bind of their own
+        bind = compiled.binds.get(name)
+        process = bind.type.bind_processor(db.engine.dialect) if bind is not None else None
+        parameters.append(process(params[name]) if process else params[name])
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', tuple(parameters))
+    return [row[-1] for row in rows]
+
+def is_table_scan(detail):
+    # "SCAN alerts" or "SCAN alerts USING INDEX ..." read every row;
+    # "SEARCH ..." and covering index lookups do not, nor do full-text index lookups
+    return (detail.startswith('SCAN ') and 'CONSTANT ROW' not in detail and 'SUBQUERY' not in detail
+            and 'VIRTUAL TABLE' not in detail)
+
+def main():
+    database_path = sys.argv[1] if len(sys.argv) > 1 else None
+    database_uri = f'sqlite:///{os.path.abspath(database_path)}' if database_path else 'sqlite://'
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    failures = 0
+    with app.app_context():
+        if not database_path:
+            db.create_all()
+            ensure_indexes()
+        for name, statement, allow_scan in audited_queries():
+            details = explain(statement)
+            scans = [d for d in details if is_table_scan(d)]
+            if scans and not allow_scan:
+                status = 'FAIL'
+                failures += 1
+            else:
+                status = 'ok  '
+            print(f'{status} {name}')
+            for detail in details:
+                print(f'       {detail}')
+
+    if failures:
+        print(f'\n{failures} queries scan a whole table')
+        sys.exit(1)
+    print('\nAll queries use an index')
+
+if __name__ == '__main__':
+    main()
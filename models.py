@@ -1,7 +1,25 @@
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event, inspect, insert, Select
+from sqlalchemy.orm import Session
 from datetime import datetime
 
-db = SQLAlchemy()
+# Bind key of the optional read replica (SQLALCHEMY_BINDS['replica'])
+REPLICA_BIND = 'replica'
+
+class RoutingSession(FlaskSession):
+    """Session that sends SELECTs to the read replica in views marked with @read_replica"""
+    
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and isinstance(clause, Select) and has_app_context() and g.get('use_replica')
+                and not self._flushing and not (self.new or self.dirty or self.deleted)):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Farmer(db.Model):
     __tablename__ = 'farmers'
@@ -15,6 +33,8 @@ class Farmer(db.Model):
     pincode = db.Column(db.String(10), nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped on every write to the farmer's data, used to validate cached views
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationships
     soil_data = db.relationship('SoilData', backref='farmer', lazy=True, cascade='all, delete-orphan')
@@ -23,6 +43,11 @@ class Farmer(db.Model):
     alerts = db.relationship('Alert', backref='farmer', lazy=True, cascade='all, delete-orphan')
     queries = db.relationship('Query', backref='farmer', lazy=True, cascade='all, delete-orphan')
 
+    # Batch recommendations and bulk exports select farmers by district and tehsil
+    __table_args__ = (
+        db.Index('ix_farmers_district_tehsil', 'district', 'tehsil'),
+    )
+
 class SoilData(db.Model):
     __tablename__ = 'soil_data'
     
@@ -36,6 +61,10 @@ class SoilData(db.Model):
     temperature = db.Column(db.Float, nullable=False)
     soil_type = db.Column(db.String(50), nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_soil_data_farmer_date', 'farmer_id', 'date'),
+    )
 
 class WeatherData(db.Model):
     __tablename__ = 'weather_data'
@@ -46,6 +75,10 @@ class WeatherData(db.Model):
     humidity = db.Column(db.Float, nullable=False)
     rainfall = db.Column(db.Float, nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_weather_data_farmer_date', 'farmer_id', 'date'),
+    )
 
 class Crop(db.Model):
     __tablename__ = 'crops'
@@ -76,6 +109,10 @@ class Recommendation(db.Model):
     crop_id = db.Column(db.Integer, db.ForeignKey('crops.id'), nullable=False)
     recommended_date = db.Column(db.DateTime, default=datetime.utcnow)
     confidence_score = db.Column(db.Float, default=0.0)
+    
+    __table_args__ = (
+        db.Index('ix_recommendations_farmer_date', 'farmer_id', 'recommended_date'),
+    )
 
 class Alert(db.Model):
     __tablename__ = 'alerts'
@@ -87,6 +124,13 @@ class Alert(db.Model):
     alert_date = db.Column(db.DateTime, nullable=False)
     message = db.Column(db.Text, nullable=False)
     status = db.Column(db.String(20), default='pending')  # pending, completed, dismissed
+    
+    __table_args__ = (
+        # One alert per (farmer, crop, type, date) so alert generation is idempotent
+        db.Index('uq_alert_schedule', 'farmer_id', 'crop_id', 'alert_type', 'alert_date', unique=True),
+        db.Index('ix_alerts_farmer_date', 'farmer_id', 'alert_date'),
+        db.Index('ix_alerts_farmer_status_date', 'farmer_id', 'status', 'alert_date'),
+    )
 
 class Video(db.Model):
     __tablename__ = 'videos'
@@ -97,6 +141,52 @@ class Video(db.Model):
     url = db.Column(db.String(500), nullable=False)
     category = db.Column(db.String(50), default='General')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_videos_category_created', 'category', 'created_at'),
+        db.Index('ix_videos_created', 'created_at'),
+    )
+
+class VideoView(db.Model):
+    """A farmer's first view of a video; co-viewing feeds the related videos"""
+    __tablename__ = 'video_views'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    farmer_id = db.Column(db.Integer, db.ForeignKey('farmers.id'), nullable=False)
+    video_id = db.Column(db.Integer, db.ForeignKey('videos.id', ondelete='CASCADE'), nullable=False)
+    viewed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('uq_video_view', 'farmer_id', 'video_id', unique=True),
+        db.Index('ix_video_views_video', 'video_id'),
+    )
+
+class RelatedVideos(db.Model):
+    """Precomputed neighbours of a video, best first, as 'id:score' pairs (services/related_videos.py)"""
+    __tablename__ = 'related_videos'
+    
+    video_id = db.Column(db.Integer, db.ForeignKey('videos.id', ondelete='CASCADE'), primary_key=True)
+    neighbours = db.Column(db.Text, nullable=False, default='')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class VideoTerm(db.Model):
+    """How often a word occurs in a video's title and description; the word index behind related videos"""
+    __tablename__ = 'video_terms'
+    
+    term = db.Column(db.String(100), primary_key=True)
+    video_id = db.Column(db.Integer, db.ForeignKey('videos.id', ondelete='CASCADE'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+    
+    __table_args__ = (
+        db.Index('ix_video_terms_video', 'video_id'),
+    )
+
+class VideoTermFrequency(db.Model):
+    """Number of videos using a word, kept next to video_terms for TF-IDF weights"""
+    __tablename__ = 'video_term_frequencies'
+    
+    term = db.Column(db.String(100), primary_key=True)
+    videos = db.Column(db.Integer, nullable=False, default=0)
 
 class Query(db.Model):
     __tablename__ = 'queries'
@@ -108,6 +198,173 @@ class Query(db.Model):
     reply = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     answered_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_queries_farmer_created', 'farmer_id', 'created_at'),
+    )
+
+class ReadingRollup(db.Model):
+    """Count/min/max/sum of one soil or weather metric per farmer per day or week"""
+    __tablename__ = 'reading_rollups'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    farmer_id = db.Column(db.Integer, db.ForeignKey('farmers.id'), nullable=False)
+    source = db.Column(db.String(10), nullable=False)  # soil, weather
+    resolution = db.Column(db.String(10), nullable=False)  # day, week
+    metric = db.Column(db.String(20), nullable=False)
+    period_start = db.Column(db.DateTime, nullable=False)
+    count = db.Column(db.Integer, nullable=False)
+    min_value = db.Column(db.Float, nullable=False)
+    max_value = db.Column(db.Float, nullable=False)
+    sum_value = db.Column(db.Float, nullable=False)
+    
+    __table_args__ = (
+        db.Index('uq_reading_rollup', 'farmer_id', 'source', 'resolution', 'metric', 'period_start', unique=True),
+    )
+    
+    @property
+    def mean_value(self):
+        return self.sum_value / self.count if self.count else None
+
+class WeatherStats(db.Model):
+    """Time-decayed running sums of one weather metric per farmer and window (see services/weather_stats.py)"""
+    __tablename__ = 'weather_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    farmer_id = db.Column(db.Integer, db.ForeignKey('farmers.id'), nullable=False)
+    metric = db.Column(db.String(20), nullable=False)
+    window_days = db.Column(db.Integer, nullable=False)
+    readings = db.Column(db.Integer, nullable=False)
+    # Decayed weight and weighted sums of y, y², t, t² and t·y, with t in days since updated_at
+    weight = db.Column(db.Float, nullable=False)
+    sum_y = db.Column(db.Float, nullable=False)
+    sum_yy = db.Column(db.Float, nullable=False)
+    sum_t = db.Column(db.Float, nullable=False)
+    sum_tt = db.Column(db.Float, nullable=False)
+    sum_ty = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)  # time of the latest reading
+    
+    __table_args__ = (
+        db.Index('uq_weather_stats', 'farmer_id', 'metric', 'window_days', unique=True),
+    )
+    
+    @property
+    def mean(self):
+        """Exponentially weighted moving average"""
+        return self.sum_y / self.weight if self.weight else None
+    
+    @property
+    def stddev(self):
+        if not self.weight:
+            return None
+        return max(self.sum_yy / self.weight - self.mean ** 2, 0.0) ** 0.5
+    
+    @property
+    def slope(self):
+        """Weighted least-squares change per day, or None without enough spread in time"""
+        denominator = self.weight * self.sum_tt - self.sum_t ** 2
+        if self.readings < 2 or denominator <= 1e-9:
+            return None
+        return (self.weight * self.sum_ty - self.sum_t * self.sum_y) / denominator
+
+class CatalogVersion(db.Model):
+    """Change counter for a shared catalog table; process-local catalog caches reload when it moves"""
+    __tablename__ = 'catalog_versions'
+    
+    name = db.Column(db.String(20), primary_key=True)  # crops, videos
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+# Tables whose rows belong to one farmer; writes bump that farmer's data_version
+FARMER_OWNED_MODELS = (SoilData, WeatherData, Recommendation, Alert, Query)
+
+# Catalog tables shared by all farmers, by catalog name
+CATALOG_MODELS = {'crops': Crop, 'videos': Video}
+
+def bump_data_version(farmer_ids=None, connection=None):
+    """Mark farmers' cached views stale (all farmers when farmer_ids is None)"""
+    stmt = Farmer.__table__.update().values(data_version=Farmer.__table__.c.data_version + 1)
+    if farmer_ids is not None:
+        if not farmer_ids:
+            return
+        stmt = stmt.where(Farmer.__table__.c.id.in_(list(farmer_ids)))
+    (connection or db.session).execute(stmt)
+
+def bump_catalog_version(names, connection=None):
+    """Mark catalogs ('crops', 'videos') changed so every worker reloads its cached copy"""
+    connection = connection or db.session
+    table = CatalogVersion.__table__
+    for name in sorted(names):
+        connection.execute(insert_ignore(CatalogVersion).values(name=name, version=0))
+        connection.execute(table.update().where(table.c.name == name).values(version=table.c.version + 1))
+
+@event.listens_for(Session, 'before_flush')
+def _collect_farmer_writes(session, flush_context, instances):
+    touched = session.info.setdefault('touched_farmers', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        for name, model in CATALOG_MODELS.items():
+            if isinstance(obj, model):
+                session.info.setdefault('catalogs_changed', set()).add(name)
+        if isinstance(obj, FARMER_OWNED_MODELS) and obj.farmer_id:
+            touched.add(obj.farmer_id)
+        elif isinstance(obj, Farmer) and obj.id:
+            touched.add(obj.id)
+        elif isinstance(obj, Crop):
+            # Crop names and seasons appear on every farmer's pages
+            session.info['crops_changed'] = True
+
+@event.listens_for(Session, 'after_flush')
+def _bump_touched_farmers(session, flush_context):
+    touched = session.info.pop('touched_farmers', set())
+    catalogs = session.info.pop('catalogs_changed', set())
+    if catalogs:
+        bump_catalog_version(catalogs, connection=session.connection())
+        # services/catalog_cache.py drops this process's copies once the transaction commits
+        session.info.setdefault('catalogs_bumped', set()).update(catalogs)
+    if session.info.pop('crops_changed', False):
+        bump_data_version(connection=session.connection())
+    elif touched:
+        bump_data_version(touched, connection=session.connection())
+
+def insert_ignore(model):
+    """INSERT for `model` that skips rows clashing with a unique index, on SQLite, PostgreSQL or MySQL"""
+    if db.session.get_bind(mapper=inspect(model)).dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        return postgresql_insert(model).on_conflict_do_nothing()
+    return insert(model).prefix_with('OR IGNORE', dialect='sqlite').prefix_with('IGNORE', dialect='mysql')
+
+def ensure_columns():
+    """Add model columns missing from databases made before they were added"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            default = f' DEFAULT {column.server_default.arg}' if column.server_default is not None else ''
+            not_null = ' NOT NULL' if not column.nullable and default else ''
+            db.session.execute(db.text(
+                f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}{not_null}{default}'
+            ))
+    db.session.commit()
+
+def ensure_indexes():
+    """Create model indexes missing from databases made before they were added"""
+    # Drop duplicate alerts first so the unique index can be built,
+    # keeping the oldest row of each group (the derived table lets MySQL
+    # delete from the table it reads)
+    db.session.execute(db.text(
+        'DELETE FROM alerts WHERE id NOT IN (SELECT id FROM ('
+        'SELECT MIN(id) AS id FROM alerts GROUP BY farmer_id, crop_id, alert_type, alert_date) AS keep)'
+    ))
+    db.session.commit()
+    
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
 
 def initialize_crops():
     """Initialize the crop knowledge base with sample data"""
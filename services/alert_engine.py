@@ -0,0 +1,72 @@
+"""
+Set-based alert generation for farmer crop recommendations.
+
+All candidate alerts are computed in memory, the farmer's existing alert keys
+are loaded with one query, and only the missing alerts are bulk inserted.
+"""
+
+from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+from models import Alert, Recommendation, bump_data_version, db, insert_ignore
+from services.crop_schedule import get_schedule
+
+def candidate_alerts(recommendations, now=None):
+    """Return {(crop_id, alert_type, alert_date): message} for all future alerts"""
+    now = now or datetime.now()
+    candidates = {}
+
+    for rec in recommendations:
+        schedule = get_schedule(rec.crop)
+        for alert_type, alert_date, message in schedule.alerts(rec.recommended_date, after=now):
+            candidates[(rec.crop_id, alert_type, alert_date)] = message
+
+    return candidates
+
+def existing_alert_keys(farmer_id):
+    """Load the (crop_id, alert_type, alert_date) keys a farmer already has"""
+    rows = db.session.execute(
+        select(Alert.crop_id, Alert.alert_type, Alert.alert_date).where(Alert.farmer_id == farmer_id)
+    )
+    return {tuple(row) for row in rows}
+
+def count_alerts(farmer_id):
+    return db.session.execute(select(func.count(Alert.id)).where(Alert.farmer_id == farmer_id)).scalar()
+
+def generate_alerts_for_farmer(farmer_id, now=None):
+    """Create missing alerts for all of a farmer's recommendations, returning how many were inserted"""
+    recommendations = Recommendation.query.options(joinedload(Recommendation.crop)) \
+        .filter_by(farmer_id=farmer_id).all()
+
+    candidates = candidate_alerts(recommendations, now)
+    if not candidates:
+        return 0
+
+    missing = candidates.keys() - existing_alert_keys(farmer_id)
+    if not missing:
+        return 0
+
+    rows = [
+        {
+            'farmer_id': farmer_id,
+            'crop_id': crop_id,
+            'alert_type': alert_type,
+            'alert_date': alert_date,
+            'message': candidates[(crop_id, alert_type, alert_date)],
+            'status': 'pending'
+        }
+        for crop_id, alert_type, alert_date in sorted(missing, key=lambda key: (key[2], key[0], key[1]))
+    ]
+
+    # Skipping duplicates keeps concurrent generation idempotent under the unique index,
+    # so rows a concurrent generation inserted first are not counted
+    connection = db.session.connection()
+    if connection.dialect.supports_sane_multi_rowcount:
+        created = connection.execute(insert_ignore(Alert), rows).rowcount
+    else:
+        before = count_alerts(farmer_id)
+        connection.execute(insert_ignore(Alert), rows)
+        created = count_alerts(farmer_id) - before
+    bump_data_version([farmer_id])
+    db.session.commit()
+    return created
@@ -0,0 +1,23 @@
+"""
+Token check for machine-to-machine batch endpoints.
+
+Batch endpoints act on many farmers at once, so they are not tied to a farmer
+session. Callers send the token configured in BATCH_API_TOKEN in the
+X-API-Token header; if no token is configured the endpoints are disabled.
+"""
+
+import hmac
+from functools import wraps
+from flask import current_app, jsonify, request
+
+def api_token_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        expected = current_app.config.get('BATCH_API_TOKEN')
+        supplied = request.headers.get('X-API-Token', '')
+        if not expected:
+            return jsonify({'error': 'Batch API is disabled'}), 403
+        if not hmac.compare_digest(supplied, expected):
+            return jsonify({'error': 'Invalid API token'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,88 @@
+"""
+Batch crop recommendations for many farmers at once.
+
+The latest soil and weather reading of every farmer in scope is fetched with
+one query that looks each farmer's newest rows up in the (farmer_id, date)
+indexes, all readings are scored against the crop matrix in a single NumPy
+call, and new Recommendation rows are bulk inserted.
+"""
+
+from datetime import datetime
+from sqlalchemy import insert, select
+from sqlalchemy.orm import aliased
+from models import Farmer, Recommendation, SoilData, WeatherData, bump_data_version, db
+from services.crop_scorer import get_crop_matrix, get_current_season, MIN_CONFIDENCE
+
+# Number of recommendations saved per farmer by default
+DEFAULT_TOP_N = 3
+
+def _latest_id(model):
+    """Correlated subquery for the id of the farmer's newest row in a time-ordered table"""
+    row = aliased(model)
+    return (
+        select(row.id).where(row.farmer_id == Farmer.id)
+        .order_by(row.date.desc(), row.id.desc()).limit(1)
+        .correlate(Farmer).scalar_subquery()
+    )
+
+def latest_readings_query(district=None, tehsil=None):
+    """Select (farmer_id, ph, temperature, moisture, nitrogen, phosphorus, potassium) per farmer in scope"""
+    # One index lookup per farmer in scope, instead of ranking every reading
+    stmt = (
+        select(Farmer.id, SoilData.ph, WeatherData.temperature, SoilData.moisture,
+               SoilData.nitrogen, SoilData.phosphorus, SoilData.potassium)
+        .select_from(Farmer)
+        .join(SoilData, SoilData.id == _latest_id(SoilData))
+        .join(WeatherData, WeatherData.id == _latest_id(WeatherData))
+        .order_by(Farmer.id)
+    )
+    if district:
+        stmt = stmt.where(Farmer.district == district)
+    if tehsil:
+        stmt = stmt.where(Farmer.tehsil == tehsil)
+    return stmt
+
+def latest_readings(district=None, tehsil=None):
+    """Return rows of (farmer_id, ph, temperature, moisture, nitrogen, phosphorus, potassium)"""
+    return db.session.execute(latest_readings_query(district, tehsil)).all()
+
+def recommend_all(district=None, tehsil=None, top_n=DEFAULT_TOP_N, season=None,
+                  min_confidence=MIN_CONFIDENCE, dry_run=False):
+    """
+    Score every farmer in scope and save their top crops as recommendations.
+
+    Top crops a farmer already has a recommendation for are not saved again.
+    Returns a summary dict with the number of farmers scored and
+    recommendations created.
+    """
+    season = season or get_current_season()
+    readings = latest_readings(district, tehsil)
+    summary = {'season': season, 'farmers_scored': len(readings), 'recommendations_created': 0}
+    if not readings:
+        return summary
+
+    farmer_ids = [row[0] for row in readings]
+    matrix = get_crop_matrix()
+    confidence = matrix.score_samples([row[1:] for row in readings])
+
+    existing = set(db.session.execute(
+        select(Recommendation.farmer_id, Recommendation.crop_id)
+        .where(Recommendation.farmer_id.in_(farmer_ids))
+    ).all())
+
+    now = datetime.now()
+    rows = []
+    for farmer_id, farmer_confidence in zip(farmer_ids, confidence):
+        ranked = matrix.rank(farmer_confidence, season, min_confidence)
+        rows.extend(
+            {'farmer_id': farmer_id, 'crop_id': crop_id, 'confidence_score': score, 'recommended_date': now}
+            for crop_id, score in ranked[:top_n]
+            if (farmer_id, crop_id) not in existing
+        )
+
+    summary['recommendations_created'] = len(rows)
+    if rows and not dry_run:
+        db.session.execute(insert(Recommendation), rows)
+        bump_data_version({row['farmer_id'] for row in rows})
+        db.session.commit()
+    return summary
@@ -0,0 +1,161 @@
+"""
+Bulk PDF report export for every farmer in a district or tehsil.
+
+Farmers are read in id-ordered chunks and each chunk is rendered on a
+process pool, so memory stays bounded by the chunk size however many
+farmers match. Reports are written into a directory together with a
+manifest.csv that is appended as each report lands; rerunning the export
+skips every farmer already in the manifest. The directory can then be
+packed into a zip.
+"""
+
+import csv
+import hashlib
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from io import BytesIO
+from flask import Flask, current_app
+from sqlalchemy import select
+from werkzeug.utils import secure_filename
+from models import db, Farmer
+
+DEFAULT_CHUNK_SIZE = 100
+MANIFEST_NAME = 'manifest.csv'
+MANIFEST_FIELDS = ['farmer_id', 'name', 'village', 'tehsil', 'district', 'file', 'sha256', 'bytes', 'rendered_at']
+
+_worker_app = None
+
+def _init_worker(database_uri, font_dir):
+    """Give each worker process its own app, engine and app context"""
+    global _worker_app
+    _worker_app = Flask(__name__)
+    _worker_app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    _worker_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    _worker_app.config['REPORT_FONT_DIR'] = font_dir
+    db.init_app(_worker_app)
+    _worker_app.app_context().push()
+
+    from services.report_layout import init_report_layouts
+    init_report_layouts(_worker_app)
+
+def _render(farmer_id, locale):
+    """Render one farmer's report in a worker and return (farmer_id, pdf bytes)"""
+    from services.report_builder import build_farmer_report
+    buffer = BytesIO()
+    try:
+        build_farmer_report(farmer_id, buffer, locale)
+    finally:
+        db.session.remove()
+    return farmer_id, buffer.getvalue()
+
+def farmer_chunk_query(district=None, tehsil=None, last_id=0, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Select the next `chunk_size` matching farmers after `last_id`, in id order"""
+    statement = select(Farmer.id, Farmer.name, Farmer.village, Farmer.tehsil, Farmer.district)
+    if district:
+        statement = statement.where(Farmer.district == district)
+    if tehsil:
+        statement = statement.where(Farmer.tehsil == tehsil)
+    return statement.where(Farmer.id > last_id).order_by(Farmer.id).limit(chunk_size)
+
+def farmer_chunks(district=None, tehsil=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of matching farmer rows, `chunk_size` at a time, in id order"""
+    last_id = 0
+    while True:
+        rows = db.session.execute(farmer_chunk_query(district, tehsil, last_id, chunk_size)).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+def read_manifest(directory):
+    """Farmer ids already exported into `directory`"""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), newline='', encoding='utf-8') as f:
+            return {int(row['farmer_id']) for row in csv.DictReader(f)}
+    except FileNotFoundError:
+        return set()
+
+def report_name(farmer):
+    name = secure_filename(farmer.name or '')
+    return f'{farmer.id}_{name}.pdf' if name else f'{farmer.id}.pdf'
+
+def export_reports(directory, district=None, tehsil=None, locale='en', workers=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Render reports for matching farmers into `directory` and return a summary.
+
+    `progress` is called with the running summary after every chunk.
+    """
+    os.makedirs(directory, exist_ok=True)
+    done = read_manifest(directory)
+    database_uri = db.engine.url.render_as_string(hide_password=False)
+
+    summary = {'exported': 0, 'skipped': 0, 'failed': 0, 'bytes': 0, 'seconds': 0.0, 'reports_per_second': 0.0}
+    start = time.perf_counter()
+
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    write_header = not os.path.exists(manifest_path)
+    with open(manifest_path, 'a', newline='', encoding='utf-8') as manifest_file, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(database_uri, current_app.config.get('REPORT_FONT_DIR'))) as pool:
+        manifest = csv.DictWriter(manifest_file, fieldnames=MANIFEST_FIELDS)
+        if write_header:
+            manifest.writeheader()
+
+        for chunk in farmer_chunks(district, tehsil, chunk_size):
+            farmers = {farmer.id: farmer for farmer in chunk if farmer.id not in done}
+            summary['skipped'] += len(chunk) - len(farmers)
+
+            futures = [pool.submit(_render, farmer_id, locale) for farmer_id in farmers]
+            for future in as_completed(futures):
+                try:
+                    farmer_id, pdf = future.result()
+                except Exception:
+                    # Left out of the manifest so the next run retries it
+                    current_app.logger.exception('Report export failed')
+                    summary['failed'] += 1
+                    continue
+
+                farmer = farmers[farmer_id]
+                filename = report_name(farmer)
+                tmp_path = os.path.join(directory, f'{filename}.tmp')
+                with open(tmp_path, 'wb') as f:
+                    f.write(pdf)
+                os.replace(tmp_path, os.path.join(directory, filename))
+
+                # Only record the farmer once the file is in place
+                manifest.writerow({
+                    'farmer_id': farmer.id,
+                    'name': farmer.name,
+                    'village': farmer.village,
+                    'tehsil': farmer.tehsil,
+                    'district': farmer.district,
+                    'file': filename,
+                    'sha256': hashlib.sha256(pdf).hexdigest(),
+                    'bytes': len(pdf),
+                    'rendered_at': datetime.now().isoformat(timespec='seconds')
+                })
+                summary['exported'] += 1
+                summary['bytes'] += len(pdf)
+            manifest_file.flush()
+
+            summary['seconds'] = time.perf_counter() - start
+            summary['reports_per_second'] = summary['exported'] / summary['seconds'] if summary['seconds'] else 0.0
+            if progress:
+                progress(summary)
+
+    summary['seconds'] = time.perf_counter() - start
+    summary['reports_per_second'] = summary['exported'] / summary['seconds'] if summary['seconds'] else 0.0
+    return summary
+
+def zip_directory(directory, zip_path):
+    """Pack an export directory (reports and manifest) into a zip file"""
+    tmp_path = f'{zip_path}.tmp'
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.pdf') or filename == MANIFEST_NAME:
+                archive.write(os.path.join(directory, filename), filename)
+    os.replace(tmp_path, zip_path)
@@ -0,0 +1,180 @@
+"""
+Process-local cache of the crop and video catalogs.
+
+Crops and videos are read on most pages but change only when an admin
+seeds or edits them. Each worker process keeps an immutable snapshot of
+each catalog: records as named tuples, in display order, with lookups by
+id and by season (crops) or category (videos).
+
+Consistency across workers comes from the catalog_versions table: every
+ORM write to Crop or Video bumps its catalog's version in the same
+transaction (models.py). A worker re-reads the versions at most once every
+CATALOG_CHECK_SECONDS, with one primary-key scan, and reloads a snapshot
+whose version has moved. One thread at a time checks and reloads, outside
+the lock that guards the snapshots; meanwhile the others keep serving the
+snapshot they have. A worker's own writes drop its snapshot as soon as
+they commit. Core or raw SQL writes must call models.bump_catalog_version().
+"""
+
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from models import db, CatalogVersion, Crop, Video, CATALOG_MODELS
+
+DEFAULT_CHECK_SECONDS = 1.0
+
+# Display order and grouping column of each catalog
+CATALOG_ORDER = {
+    'crops': [Crop.id],
+    'videos': [Video.created_at.desc(), Video.id.desc()],
+}
+CATALOG_GROUP_BY = {'crops': 'season', 'videos': 'category'}
+
+# Immutable row types, one field per table column
+RECORD_TYPES = {
+    name: namedtuple(f'{model.__name__}Record', [column.key for column in model.__table__.columns])
+    for name, model in CATALOG_MODELS.items()
+}
+
+class CatalogSnapshot:
+    """Read-only copy of one catalog table at a version"""
+
+    def __init__(self, name, version, records):
+        self.name = name
+        self.version = version
+        self.all = tuple(records)
+        self.by_id = MappingProxyType({record.id: record for record in self.all})
+        groups = {}
+        for record in self.all:
+            groups.setdefault(getattr(record, CATALOG_GROUP_BY[name]), []).append(record)
+        self.groups = MappingProxyType({key: tuple(members) for key, members in groups.items()})
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def get(self, record_id):
+        return self.by_id.get(record_id)
+
+    def group(self, key):
+        """Records with this season (crops) or category (videos), in display order"""
+        return self.groups.get(key, ())
+
+    def derived(self, key, build):
+        """Value computed once per snapshot by build(snapshot), e.g. the crop scoring matrix"""
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build(self)
+            return self._derived[key]
+
+class CatalogCache:
+    """Snapshots of every catalog, reloaded when the catalog's database version moves"""
+
+    def __init__(self, check_seconds=DEFAULT_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._snapshots = {}
+        self._versions = {}
+        self._checked_at = None
+        # Bumped by invalidate() so a refresh that read the old rows does not install them
+        self._generation = 0
+        # Guards the fields above; held only to read or swap them
+        self._lock = threading.Lock()
+        # Held by the one thread checking versions and reloading
+        self._refresh_lock = threading.Lock()
+        self.stats = {'hits': 0, 'version_checks': 0, 'loads': 0}
+
+    def _checked_recently(self):
+        return self._checked_at is not None and time.monotonic() - self._checked_at < self.check_seconds
+
+    def _cached(self, name):
+        # The snapshot when versions were checked recently and its version is current; caller holds _lock
+        snapshot = self._snapshots.get(name)
+        if snapshot is not None and self._checked_recently() and snapshot.version == self._versions.get(name, 0):
+            self.stats['hits'] += 1
+            return snapshot
+        return None
+
+    def snapshot(self, name):
+        with self._lock:
+            snapshot = self._cached(name)
+            if snapshot is not None:
+                return snapshot
+            snapshot = self._snapshots.get(name)
+
+        # Another thread is refreshing: serve the snapshot we have, or wait when there is none
+        if not self._refresh_lock.acquire(blocking=snapshot is None):
+            with self._lock:
+                self.stats['hits'] += 1
+            return snapshot
+        try:
+            with self._lock:
+                cached = self._cached(name)
+                if cached is not None:
+                    return cached
+                snapshot = self._snapshots.get(name)
+                generation = self._generation
+                versions = self._versions if self._checked_recently() else None
+                checked_at = self._checked_at
+
+            if versions is None:
+                checked_at = time.monotonic()
+                versions = dict(db.session.execute(versions_query()).all())
+                with self._lock:
+                    self.stats['version_checks'] += 1
+            version = versions.get(name, 0)
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._load(name, version)
+
+            with self._lock:
+                if self._generation == generation:
+                    self._versions = versions
+                    self._checked_at = checked_at
+                    self._snapshots[name] = snapshot
+            return snapshot
+        finally:
+            self._refresh_lock.release()
+
+    def _load(self, name, version):
+        record_type = RECORD_TYPES[name]
+        rows = db.session.execute(catalog_query(name)).all()
+        with self._lock:
+            self.stats['loads'] += 1
+        return CatalogSnapshot(name, version, [record_type(*row) for row in rows])
+
+    def invalidate(self, names=None):
+        """Drop snapshots (all when names is None) so the next read reloads them"""
+        with self._lock:
+            self._generation += 1
+            for name in list(self._snapshots) if names is None else names:
+                self._snapshots.pop(name, None)
+
+def catalog_query(name):
+    """Every row of a catalog table, in display order"""
+    return select(*CATALOG_MODELS[name].__table__.columns).order_by(*CATALOG_ORDER[name])
+
+def versions_query():
+    return select(CatalogVersion.name, CatalogVersion.version)
+
+def init_catalog_cache(app):
+    cache = CatalogCache(app.config.get('CATALOG_CHECK_SECONDS', DEFAULT_CHECK_SECONDS))
+    app.extensions['catalog_cache'] = cache
+    return cache
+
+def get_catalog(name):
+    """Current snapshot of 'crops' or 'videos'"""
+    cache = current_app.extensions.get('catalog_cache') or init_catalog_cache(current_app)
+    return cache.snapshot(name)
+
+@event.listens_for(Session, 'after_commit')
+def _drop_committed_catalogs(session):
+    names = session.info.pop('catalogs_bumped', None)
+    if names and has_app_context():
+        cache = current_app.extensions.get('catalog_cache')
+        if cache is not None:
+            cache.invalidate(names)
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_catalogs(session):
+    session.info.pop('catalogs_bumped', None)
@@ -0,0 +1,104 @@
+"""
+Crop schedule templates shared by the crop calendar and alert generation.
+
+Each crop's schedule is built once as a list of day offsets and cached per
+crop. Concrete dates are produced by adding a start date to the offsets.
+The cache is cleared whenever a Crop row is inserted, updated or deleted,
+and a template is rebuilt if the crop it was built from has since changed.
+"""
+
+from datetime import timedelta
+from sqlalchemy import event
+from models import Crop
+
+FERTILIZER_SCHEDULE = [
+    (15, 'Nitrogen application', 'Apply nitrogen fertilizer'),
+    (30, 'Phosphorus application', 'Apply phosphorus fertilizer'),
+    (45, 'Potassium application', 'Apply potassium fertilizer'),
+    (60, 'Balanced NPK application', 'Apply balanced NPK fertilizer')
+]
+
+SPRAY_SCHEDULE = [20, 40, 60, 80]
+
+# Event types that become alerts (sowing only appears on the calendar)
+ALERT_TYPES = ('irrigation', 'fertilizer', 'spray', 'harvest')
+
+_templates = {}
+
+class CropSchedule:
+    """Precomputed day-offset schedule for one crop"""
+
+    def __init__(self, crop):
+        self.crop_id = crop.id
+        self.signature = (crop.crop_name, crop.duration_days)
+        name = crop.crop_name
+
+        # (days, type, event, calendar description, alert message)
+        entries = [(0, 'sowing', 'Sowing', f'Plant {name} seeds', None)]
+
+        # Irrigation every 7 days for the first month, then every 10 days
+        for i in range(1, crop.duration_days // 7 + 1):
+            days = i * 7 if i <= 4 else i * 10
+            entries.append((days, 'irrigation', 'Irrigation',
+                            f'Water {name} plants', f'Time to irrigate {name} plants'))
+
+        for days, description, message in FERTILIZER_SCHEDULE:
+            if days < crop.duration_days:
+                entries.append((days, 'fertilizer', 'Fertilizer',
+                                f'{description} for {name}', f'{message} for {name}'))
+
+        for days in SPRAY_SCHEDULE:
+            if days < crop.duration_days:
+                entries.append((days, 'spray', 'Spray',
+                                f'Pest/Disease control spray for {name}',
+                                f'Apply pest/disease control spray for {name}'))
+
+        entries.append((crop.duration_days, 'harvest', 'Harvest',
+                        f'Harvest {name}', f'Time to harvest {name}'))
+
+        # Stable sort keeps same-day events in the order they were added
+        entries.sort(key=lambda entry: entry[0])
+
+        self.offsets = tuple(timedelta(days=entry[0]) for entry in entries)
+        self.types = tuple(entry[1] for entry in entries)
+        self.events = tuple(entry[2] for entry in entries)
+        self.descriptions = tuple(entry[3] for entry in entries)
+        self.messages = tuple(entry[4] for entry in entries)
+
+    def dates(self, start_date):
+        """Concrete dates of every scheduled event"""
+        return [start_date + offset for offset in self.offsets]
+
+    def calendar_events(self, start_date):
+        """Calendar entries ordered by date"""
+        return [
+            {'date': date, 'event': event_name, 'description': description, 'type': event_type}
+            for date, event_name, description, event_type
+            in zip(self.dates(start_date), self.events, self.descriptions, self.types)
+        ]
+
+    def alerts(self, start_date, after=None):
+        """(alert_type, alert_date, message) tuples, optionally only those after a date"""
+        return [
+            (event_type, date, message)
+            for date, event_type, message in zip(self.dates(start_date), self.types, self.messages)
+            if event_type in ALERT_TYPES and (after is None or date > after)
+        ]
+
+def get_schedule(crop):
+    """Return the cached schedule for a crop, building it on first use"""
+    schedule = _templates.get(crop.id)
+    if schedule is None or schedule.signature != (crop.crop_name, crop.duration_days):
+        schedule = CropSchedule(crop)
+        _templates[crop.id] = schedule
+    return schedule
+
+def clear_schedules():
+    """Drop all cached schedules"""
+    _templates.clear()
+
+@event.listens_for(Crop, 'after_insert')
+@event.listens_for(Crop, 'after_update')
+@event.listens_for(Crop, 'after_delete')
+def _crop_changed(mapper, connection, target):
+    clear_schedules()
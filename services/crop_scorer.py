@@ -0,0 +1,114 @@
+"""
+Vectorized crop suitability scoring.
+
+The crop knowledge base is held as columnar NumPy arrays, built once per
+crop catalog snapshot (services/catalog_cache.py), so every worker rebuilds
+them after any Crop row changes. Soil/weather samples are scored against
+every crop with array operations, either one sample at a time or as a batch.
+"""
+
+from datetime import datetime
+import numpy as np
+from sqlalchemy import select
+from models import Crop, db
+from services.catalog_cache import get_catalog
+
+# Only crops with at least this much compatibility are recommended
+MIN_CONFIDENCE = 60
+
+# pH, temperature and moisture count 1 each, N/P/K count 0.5 each
+TOTAL_CONDITIONS = 4.5
+
+# Sample columns accepted by score_samples, in order
+SAMPLE_FIELDS = ('ph', 'temperature', 'moisture', 'nitrogen', 'phosphorus', 'potassium')
+
+CROP_COLUMNS = ('id', 'season', 'ph_min', 'ph_max', 'temp_min', 'temp_max', 'moisture_req',
+                'nitrogen_req', 'phosphorus_req', 'potassium_req')
+
+def get_current_season(today=None):
+    """Season for a date: Kharif (Jun-Oct), Rabi (Nov-Feb) or Summer"""
+    month = (today or datetime.now()).month
+    if month in [6, 7, 8, 9, 10]:
+        return 'Kharif'
+    elif month in [11, 12, 1, 2]:
+        return 'Rabi'
+    return 'Summer'
+
+class CropMatrix:
+    """Crop requirements as parallel NumPy arrays, one element per crop"""
+
+    def __init__(self, rows):
+        columns = list(zip(*rows)) if rows else [()] * len(CROP_COLUMNS)
+        data = dict(zip(CROP_COLUMNS, columns))
+
+        self.ids = np.array(data['id'], dtype=np.int64)
+        self.seasons = np.array(data['season'], dtype=object)
+        for name in CROP_COLUMNS[2:]:
+            setattr(self, name, np.array(data[name], dtype=np.float64))
+
+        # Thresholds the scorer compares against, computed once
+        self.nitrogen_min = self.nitrogen_req * 0.8
+        self.phosphorus_min = self.phosphorus_req * 0.8
+        self.potassium_min = self.potassium_req * 0.8
+
+    @classmethod
+    def from_db(cls):
+        columns = [getattr(Crop, name) for name in CROP_COLUMNS]
+        return cls(db.session.execute(select(*columns).order_by(Crop.id)).all())
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        return cls([tuple(getattr(crop, name) for name in CROP_COLUMNS) for crop in snapshot.all])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def season_mask(self, season):
+        """Boolean mask of crops grown in a season (all crops if season is None)"""
+        if season is None:
+            return np.ones(len(self), dtype=bool)
+        return self.seasons == season
+
+    def score_samples(self, samples):
+        """
+        Score many samples against every crop.
+
+        `samples` is an (n, 6) array with columns in SAMPLE_FIELDS order.
+        Returns an (n, crops) array of confidence percentages.
+        """
+        samples = np.asarray(samples, dtype=np.float64).reshape(-1, len(SAMPLE_FIELDS))
+        ph, temperature, moisture, nitrogen, phosphorus, potassium = (samples[:, [i]] for i in range(6))
+
+        score = (
+            ((self.ph_min <= ph) & (ph <= self.ph_max)).astype(np.float64)
+            + ((self.temp_min <= temperature) & (temperature <= self.temp_max))
+            + (np.abs(moisture - self.moisture_req) <= 20)
+            + 0.5 * (nitrogen >= self.nitrogen_min)
+            + 0.5 * (phosphorus >= self.phosphorus_min)
+            + 0.5 * (potassium >= self.potassium_min)
+        )
+        return (score / TOTAL_CONDITIONS) * 100
+
+    def score(self, soil, weather):
+        """Confidence of every crop for one soil and weather reading"""
+        return self.score_samples(sample_from(soil, weather))[0]
+
+    def rank(self, confidence, season=None, min_confidence=MIN_CONFIDENCE):
+        """Return [(crop_id, confidence)] above the threshold, best first"""
+        keep = np.flatnonzero(self.season_mask(season) & (confidence >= min_confidence))
+        # Stable sort so ties keep knowledge base order
+        order = keep[np.argsort(-confidence[keep], kind='stable')]
+        return list(zip(self.ids[order].tolist(), confidence[order].tolist()))
+
+def sample_from(soil, weather):
+    """Build a scoring sample row from SoilData and WeatherData records"""
+    return [soil.ph, weather.temperature, soil.moisture, soil.nitrogen, soil.phosphorus, soil.potassium]
+
+def get_crop_matrix():
+    """Return the crop matrix of the current crop catalog snapshot"""
+    return get_catalog('crops').derived('matrix', CropMatrix.from_snapshot)
+
+def rank_crops(soil, weather, season=None, min_confidence=MIN_CONFIDENCE):
+    """Return [(crop_id, confidence)] above the threshold, best first"""
+    matrix = get_crop_matrix()
+    return matrix.rank(matrix.score(soil, weather), season, min_confidence)
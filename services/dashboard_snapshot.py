@@ -0,0 +1,101 @@
+"""
+Cached dashboard view model per farmer.
+
+The dashboard is built from four queries (soil history, weather history,
+recommendations, pending alerts) into plain snapshot objects and cached per
+farmer. A snapshot is reused while the farmer's data_version is unchanged;
+any write to the farmer's soil, weather, recommendations, alerts or to the
+crops table bumps the version, so every worker sees fresh data on the next
+visit while repeat visits cost only the farmer lookup.
+"""
+
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from models import Alert, Recommendation, SoilData, WeatherData, db
+
+# Number of farmers whose dashboards are kept in memory
+MAX_SNAPSHOTS = 1024
+
+# Rows shown per dashboard section
+HISTORY_LIMIT = 5
+
+SOIL_FIELDS = ('id', 'ph', 'moisture', 'nitrogen', 'phosphorus', 'potassium', 'temperature', 'soil_type', 'date')
+WEATHER_FIELDS = ('id', 'temperature', 'humidity', 'rainfall', 'date')
+CROP_FIELDS = ('id', 'crop_name', 'season', 'duration_days')
+
+_snapshots = OrderedDict()
+_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0}
+
+def _freeze(obj, fields, **extra):
+    """Copy ORM attributes into a plain object that is safe to share between requests"""
+    return SimpleNamespace(**{name: getattr(obj, name) for name in fields}, **extra)
+
+def build_snapshot(farmer_id, version):
+    """Load the dashboard view model for a farmer"""
+    soil_history = [
+        _freeze(row, SOIL_FIELDS)
+        for row in SoilData.query.filter_by(farmer_id=farmer_id)
+        .order_by(SoilData.date.desc()).limit(HISTORY_LIMIT)
+    ]
+    weather_history = [
+        _freeze(row, WEATHER_FIELDS)
+        for row in WeatherData.query.filter_by(farmer_id=farmer_id)
+        .order_by(WeatherData.date.desc()).limit(HISTORY_LIMIT)
+    ]
+    recommendations = [
+        _freeze(rec, ('id', 'confidence_score', 'recommended_date'), crop=_freeze(rec.crop, CROP_FIELDS))
+        for rec in Recommendation.query.options(joinedload(Recommendation.crop))
+        .filter_by(farmer_id=farmer_id).order_by(Recommendation.recommended_date.desc()).limit(HISTORY_LIMIT)
+    ]
+
+    # First few pending alerts plus the total count in the same statement
+    pending_rows = db.session.query(Alert, func.count().over().label('total')) \
+        .options(joinedload(Alert.crop)) \
+        .filter(Alert.farmer_id == farmer_id, Alert.status == 'pending') \
+        .order_by(Alert.alert_date.asc()).limit(HISTORY_LIMIT).all()
+    pending_alerts = [
+        _freeze(alert, ('id', 'alert_type', 'alert_date', 'message', 'status'), crop=_freeze(alert.crop, CROP_FIELDS))
+        for alert, _ in pending_rows
+    ]
+
+    return SimpleNamespace(
+        version=version,
+        latest_soil=soil_history[0] if soil_history else None,
+        latest_weather=weather_history[0] if weather_history else None,
+        soil_history=soil_history,
+        weather_history=weather_history,
+        recommendations=recommendations,
+        pending_alerts=pending_alerts,
+        pending_alert_count=pending_rows[0].total if pending_rows else 0
+    )
+
+def get_dashboard(farmer):
+    """Return the farmer's dashboard snapshot, rebuilding it if their data changed"""
+    version = farmer.data_version
+    with _lock:
+        snapshot = _snapshots.get(farmer.id)
+        if snapshot is not None and snapshot.version == version:
+            _snapshots.move_to_end(farmer.id)
+            stats['hits'] += 1
+            return snapshot
+        stats['misses'] += 1
+
+    snapshot = build_snapshot(farmer.id, version)
+    with _lock:
+        _snapshots[farmer.id] = snapshot
+        _snapshots.move_to_end(farmer.id)
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return snapshot
+
+def invalidate(farmer_id=None):
+    """Drop one farmer's snapshot, or all snapshots"""
+    with _lock:
+        if farmer_id is None:
+            _snapshots.clear()
+        else:
+            _snapshots.pop(farmer_id, None)
@@ -0,0 +1,117 @@
+"""
+Database engine configuration.
+
+The database URI, an optional read replica and the engine and pool options
+come from the environment, so the same code runs on a local SQLite file or
+PostgreSQL, under the dev server or multi-threaded gunicorn workers.
+
+For SQLite every new connection is switched to WAL with the pragmas below:
+readers no longer block the writer, commits skip the per-transaction fsync
+of the rollback journal, and writers wait for the lock instead of failing
+with "database is locked".
+"""
+
+import json
+import os
+from functools import wraps
+from flask import g
+from sqlalchemy import event
+from models import db, REPLICA_BIND
+
+DEFAULT_DATABASE_URI = 'sqlite:///krishimitra.db'
+
+# Pragma defaults, overridable with SQLITE_<NAME> environment variables
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,             # ms
+    'cache_size': -64000,             # negative means KiB, so 64 MB per connection
+    'mmap_size': 256 * 1024 * 1024,   # bytes
+    'foreign_keys': 'ON',
+}
+
+# Connections kept per process; size to the worker's thread count
+DEFAULT_POOL_SIZE = 8
+DEFAULT_MAX_OVERFLOW = 8
+DEFAULT_POOL_TIMEOUT = 30
+
+def database_uri(value):
+    """Normalize a DATABASE_URL (Heroku-style postgres:// URLs included)"""
+    if value.startswith('postgres://'):
+        return 'postgresql://' + value[len('postgres://'):]
+    return value
+
+def is_sqlite(uri):
+    return uri.startswith('sqlite')
+
+def is_memory_sqlite(uri):
+    return uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri
+
+def sqlite_pragmas(environ=os.environ):
+    """Pragmas to run on each SQLite connection, with environment overrides"""
+    return {name: environ.get(f'SQLITE_{name.upper()}', default) for name, default in SQLITE_PRAGMAS.items()}
+
+def engine_options(uri, environ=os.environ):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URI, read from the environment"""
+    if is_memory_sqlite(uri):
+        # One shared in-memory connection; there is no pool to size
+        return {}
+
+    options = {
+        'pool_size': int(environ.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW)),
+        'pool_timeout': int(environ.get('DB_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT)),
+    }
+    if not is_sqlite(uri):
+        # Server connections can be dropped by the server or a proxy while idle
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = int(environ.get('DB_POOL_RECYCLE', 1800))
+    # Anything else create_engine accepts, e.g. {"echo": true}
+    options.update(json.loads(environ.get('DB_ENGINE_OPTIONS', '{}')))
+    return options
+
+def configure_engine(app, environ=os.environ):
+    """
+    Set the database URI, replica bind, engine options and SQLite pragmas before db.init_app.
+
+    DATABASE_URL picks the primary database and DATABASE_REPLICA_URL adds a
+    read replica used by views marked with @read_replica.
+    """
+    uri = database_uri(environ.get('DATABASE_URL') or app.config.get('SQLALCHEMY_DATABASE_URI') or DEFAULT_DATABASE_URI)
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    options = engine_options(uri, environ)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    replica_uri = environ.get('DATABASE_REPLICA_URL')
+    if replica_uri:
+        replica_uri = database_uri(replica_uri)
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds[REPLICA_BIND] = dict(engine_options(replica_uri, environ), url=replica_uri)
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+    app.config.setdefault('SQLITE_PRAGMAS', sqlite_pragmas(environ))
+
+def read_replica(f):
+    """Send the view's SELECTs to the read replica when one is configured"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+def _set_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return on_connect
+
+def apply_sqlite_pragmas(app):
+    """Run the configured pragmas on every new connection of the app's SQLite engines"""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite' and pragmas:
+                event.listen(engine, 'connect', _set_pragmas(pragmas))
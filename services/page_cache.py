@@ -0,0 +1,141 @@
+"""
+Response and template-fragment cache for pages that are the same for
+every user in a language.
+
+Rendered HTML is kept in an in-process LRU of at most
+PAGE_CACHE_MAX_ENTRIES entries, each for PAGE_CACHE_TTL seconds. Keys hold
+the endpoint or fragment name and its arguments, the request's locale and
+the versions of the catalogs the page shows (services/catalog_cache.py),
+so switching language or editing a crop never serves stale HTML.
+
+- @cache_page(catalogs) caches whole responses for anonymous requests with
+  no flash message waiting, and sends them as `public, max-age` for
+  browsers and proxies. Pages for logged-in farmers carry their name in
+  the navbar, so they are rendered each time (from cached fragments) and
+  sent as `private, no-cache`. Both get an ETag, and a matching
+  If-None-Match is answered with 304 Not Modified.
+- {% call cached_fragment(name, *vary) %}...{% endcall %} caches the
+  rendered body of the call block, e.g. the navbar in base.html; `vary`
+  lists whatever else the block reads from the session or request.
+
+PAGE_CACHE_TTL=0 turns the cache off; the headers are still sent.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, make_response, request, session
+from flask_babel import get_locale
+from services.catalog_cache import get_catalog
+
+DEFAULT_TTL = 300             # seconds
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_AGE = 60          # seconds browsers and proxies may reuse a public page
+
+class PageCache:
+    """LRU of rendered HTML with a time-to-live per entry"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    @property
+    def enabled(self):
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries))
+
+def init_page_cache(app):
+    cache = PageCache(app.config.get('PAGE_CACHE_TTL', DEFAULT_TTL),
+                      app.config.get('PAGE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+    app.extensions['page_cache'] = cache
+    app.jinja_env.globals['cached_fragment'] = cached_fragment
+    return cache
+
+def get_page_cache():
+    return current_app.extensions.get('page_cache')
+
+def _shared_key(catalogs):
+    """Locale and catalog versions, the parts of every key that are not the page's own"""
+    return (str(get_locale()), tuple(get_catalog(name).version for name in catalogs))
+
+def cached_fragment(name, *vary, catalogs=(), caller=None):
+    """Template global: the rendered {% call %} body, rendered once per name, vary values, locale and catalogs"""
+    cache = get_page_cache()
+    if cache is None or not cache.enabled:
+        return caller()
+    key = ('fragment', name, vary, _shared_key(catalogs))
+    html = cache.get(key)
+    if html is None:
+        html = caller()
+        cache.set(key, html)
+    return html
+
+def _conditional(response, cache_control):
+    response.headers['Cache-Control'] = cache_control
+    if response.status_code == 200:
+        if not response.get_etag()[0]:
+            response.add_etag()
+        response.make_conditional(request)
+    return response
+
+def cache_page(catalogs=()):
+    """Cache the view's response for anonymous requests; ETag and Cache-Control for all"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or 'farmer_id' in session or '_flashes' in session):
+                return _conditional(make_response(f(*args, **kwargs)), 'private, no-cache')
+
+            cache = get_page_cache()
+            key = ('page', request.endpoint, tuple(sorted(kwargs.items())),
+                   tuple(sorted(request.args.items(multi=True))), _shared_key(catalogs))
+            entry = cache.get(key) if cache is not None and cache.enabled else None
+            if entry is None:
+                response = make_response(f(*args, **kwargs))
+                # Redirects, errors and pages that flashed a message are not shared
+                if response.status_code != 200 or '_flashes' in session:
+                    return _conditional(response, 'private, no-cache')
+                response.add_etag()
+                entry = (response.get_data(), response.mimetype, response.get_etag()[0])
+                if cache is not None and cache.enabled:
+                    cache.set(key, entry)
+
+            body, mimetype, etag = entry
+            response = current_app.response_class(body, mimetype=mimetype)
+            response.set_etag(etag)
+            max_age = current_app.config.get('PAGE_CACHE_MAX_AGE', DEFAULT_MAX_AGE)
+            return _conditional(response, f'public, max-age={max_age}')
+        return decorated_function
+    return decorator
@@ -0,0 +1,135 @@
+"""
+Keyset (cursor) pagination for per-farmer history lists.
+
+Pages are fetched with WHERE (date, id) < (last_date, last_id) instead of
+OFFSET, so every page costs the same index range scan no matter how long the
+history is. The cursor is an opaque token encoding the last row's key.
+
+Rows whose sort value is NULL come after all the others, ordered by id, on
+every database; they are read with a second range scan once the non-NULL
+rows run out.
+"""
+
+import base64
+from datetime import datetime
+from flask import jsonify, request
+from sqlalchemy import tuple_
+
+DEFAULT_PER_PAGE = 25
+MAX_PER_PAGE = 100
+# Cursor sort value of a row whose sort column is NULL
+NULL_SORT_VALUE = '-'
+
+class KeysetPage:
+    """One page of rows plus the cursors around it"""
+
+    def __init__(self, items, cursor, next_cursor):
+        self.items = items
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+def encode_cursor(sort_value, row_id):
+    """Opaque URL-safe token for a (datetime or number, id) key"""
+    # Numbers (e.g. search ranks) are marked so they decode back to floats
+    if sort_value is None:
+        text = NULL_SORT_VALUE
+    elif isinstance(sort_value, datetime):
+        text = sort_value.isoformat()
+    else:
+        text = f'#{float(sort_value)!r}'
+    raw = f'{text}|{row_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return the (datetime, number or None, id) key of a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        sort_value, row_id = raw.rsplit('|', 1)
+        if sort_value == NULL_SORT_VALUE:
+            return None, int(row_id)
+        if sort_value.startswith('#'):
+            return float(sort_value[1:]), int(row_id)
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def _nullable(column):
+    return getattr(getattr(column, 'expression', column), 'nullable', True)
+
+def keyset_query(query, sort_column, id_column, key=None, descending=True):
+    """
+    Order `query` by (sort_column, id_column) and skip rows up to and including `key`.
+
+    Rows with a NULL sort value are left out, except with a key whose sort
+    value is None: then only they are returned, after the key's id (any id
+    when that is None too).
+    """
+    if key is not None and key[0] is None:
+        query = query.filter(sort_column.is_(None))
+        if key[1] is not None:
+            query = query.filter(id_column < key[1] if descending else id_column > key[1])
+        return query.order_by(id_column.desc() if descending else id_column.asc())
+
+    if key is not None:
+        position = tuple_(sort_column, id_column)
+        query = query.filter(position < key if descending else position > key)
+    elif _nullable(sort_column):
+        query = query.filter(sort_column.isnot(None))
+
+    if descending:
+        return query.order_by(sort_column.desc(), id_column.desc())
+    return query.order_by(sort_column.asc(), id_column.asc())
+
+def paginate(query, sort_column, id_column, cursor=None, per_page=DEFAULT_PER_PAGE, descending=True):
+    """Return the KeysetPage of `query` that follows `cursor`, ordered by (sort_column, id_column)"""
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    key = decode_cursor(cursor)
+
+    # One extra row tells us whether another page exists
+    rows = keyset_query(query, sort_column, id_column, key, descending).limit(per_page + 1).all()
+    if len(rows) <= per_page and _nullable(sort_column) and (key is None or key[0] is not None):
+        # The rows with a sort value ran out: go on with the NULL ones
+        rows += keyset_query(query, sort_column, id_column, (None, None), descending).limit(per_page + 1 - len(rows)).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+    return KeysetPage(rows, cursor if key is not None else None, next_cursor)
+
+def paginate_request(query, sort_column, id_column, descending=True):
+    """Paginate using the cursor and per_page query string arguments"""
+    return paginate(
+        query, sort_column, id_column,
+        cursor=request.args.get('cursor'),
+        per_page=request.args.get('per_page', DEFAULT_PER_PAGE, type=int),
+        descending=descending
+    )
+
+def wants_json():
+    """True when the caller asked for the JSON "load more" variant of a list"""
+    return request.args.get('format') == 'json'
+
+def page_json(page, fields):
+    """
+    JSON response with the given fields of each row and the next cursor.
+
+    Dotted fields such as 'crop.crop_name' follow relationships and are
+    returned under their last segment.
+    """
+    def value(obj, path):
+        for name in path.split('.'):
+            obj = getattr(obj, name)
+        return obj.isoformat() if isinstance(obj, datetime) else obj
+
+    return jsonify({
+        'items': [{path.rsplit('.', 1)[-1]: value(obj, path) for path in fields} for obj in page.items],
+        'next_cursor': page.next_cursor
+    })
@@ -0,0 +1,40 @@
+"""
+Per-request SQL statement guard.
+
+Counts the statements each request sends to the database. When the app is in
+testing mode (or SQL_QUERY_GUARD is set) a request that issues more than
+SQL_QUERY_LIMIT statements raises QueryLimitExceeded, which catches N+1 lazy
+loads in templates before they reach production.
+"""
+
+from flask import g, has_app_context, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_QUERY_LIMIT = 20
+
+class QueryLimitExceeded(AssertionError):
+    """A request issued more SQL statements than SQL_QUERY_LIMIT allows"""
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_statements = g.get('sql_statements', 0) + 1
+
+def statement_count():
+    """Statements issued so far by the current request"""
+    return g.get('sql_statements', 0) if has_app_context() else 0
+
+def init_query_guard(app):
+    """Enforce the per-request statement limit on an app"""
+    app.config.setdefault('SQL_QUERY_LIMIT', DEFAULT_QUERY_LIMIT)
+    app.config.setdefault('SQL_QUERY_GUARD', False)
+
+    @app.after_request
+    def check_statement_count(response):
+        if app.testing or app.config['SQL_QUERY_GUARD']:
+            limit = app.config['SQL_QUERY_LIMIT']
+            count = statement_count()
+            if limit is not None and count > limit:
+                raise QueryLimitExceeded(f'Request issued {count} SQL statements (limit {limit})')
+        return response
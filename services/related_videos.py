@@ -0,0 +1,359 @@
+"""
+Related videos for videos.view.
+
+Each video's neighbours are precomputed into the related_videos table, one
+row per video holding its RELATED_LIMIT best neighbours and their scores,
+so the view reads them with a single primary-key lookup. A neighbour's
+score adds up:
+
+- text: cosine similarity of TF-IDF vectors over the title (counted twice)
+  and description words;
+- co-viewing: farmers who watched both videos (video_views), divided by the
+  geometric mean of the two videos' viewer counts;
+- category: a fixed bonus for sharing the category.
+
+Words in more than MAX_TERM_VIDEOS videos and farmers with more than
+MAX_FARMER_VIEWS views say little about any pair and would make the
+pairwise pass quadratic, so they are left out of the candidate lists.
+
+Each video's word counts are kept in video_terms, an inverted index, and
+the number of videos using each word in video_term_frequencies, so videos
+added or edited through the ORM are scored in the same transaction from
+the index and the views of their own viewers, without reading the rest of
+the catalog. They enter the rows of the videos they score against when
+they beat the weakest neighbour there. `flask videos rebuild-related`
+recomputes every row and the word index; run it periodically so co-viewing
+and word weights stay current.
+"""
+
+import heapq
+import math
+import unicodedata
+import numpy as np
+from collections import Counter, defaultdict
+from datetime import datetime
+from sqlalchemy import bindparam, delete, event, func, insert, select, update
+from sqlalchemy.orm import Session
+from models import db, Video, VideoView, VideoTerm, VideoTermFrequency, RelatedVideos, insert_ignore
+from services.video_search import TERM
+
+RELATED_LIMIT = 8
+TEXT_WEIGHT = 0.5
+COVIEW_WEIGHT = 0.3
+CATEGORY_WEIGHT = 0.2
+MAX_TERM_VIDEOS = 500
+MAX_FARMER_VIEWS = 200
+# Longer "words" are noise and would not fit video_terms.term
+MAX_TERM_LENGTH = 100
+WRITE_CHUNK = 1000
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'how', 'in', 'into', 'is', 'it',
+    'of', 'on', 'or', 'the', 'to', 'your', 'with', 'when', 'what', 'about',
+    'और', 'का', 'की', 'के', 'को', 'में', 'से', 'है', 'पर',
+])
+
+def video_terms(title, description):
+    text = unicodedata.normalize('NFC', f'{title} {title} {description or ""}').lower()
+    return [term for term in TERM.findall(text)
+            if term not in STOP_WORDS and not term.isdigit() and len(term) <= MAX_TERM_LENGTH]
+
+def encode(neighbours):
+    return ' '.join(f'{video_id}:{score:.4f}' for video_id, score in neighbours)
+
+def decode(text):
+    pairs = (item.split(':') for item in (text or '').split())
+    return [(int(video_id), float(score)) for video_id, score in pairs]
+
+def _top(scores, limit=RELATED_LIMIT):
+    # Ties go to the newer (higher id) video
+    return heapq.nlargest(limit, scores, key=lambda item: (item[1], item[0]))
+
+class RelatedIndex:
+    """TF-IDF vectors and word and viewer posting lists of the videos, for scoring neighbours"""
+
+    def __init__(self, videos, counts, frequency, total, views, viewer_counts=None):
+        # videos: (id, category) newest first; counts: {video_id: Counter of its words} of the
+        # videos to vectorize; frequency: {word: videos using it} over all `total` videos;
+        # views: (farmer_id, video_id). `viewer_counts` gives the viewer counts of videos
+        # whose viewers are not all among `views`.
+        videos = list(videos)
+        self.ids = np.array([video[0] for video in videos], dtype=np.int64)
+        self.position = {video[0]: position for position, video in enumerate(videos)}
+        self.categories = {video[0]: video[1] for video in videos}
+        self.by_category = defaultdict(list)
+        for video_id, category in self.categories.items():
+            self.by_category[category].append(video_id)
+        codes = {category: code for code, category in enumerate(self.by_category)}
+        self.category_codes = np.array([codes[video[1]] for video in videos], dtype=np.int64)
+
+        idf = {term: math.log((1 + total) / (1 + videos_with)) + 1 for term, videos_with in frequency.items()}
+        self.vectors = {}
+        postings = defaultdict(lambda: ([], []))
+        for video_id, terms in counts.items():
+            weights = {term: (1 + math.log(count)) * idf[term] for term, count in terms.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            self.vectors[video_id] = vector = {term: weight / norm for term, weight in weights.items()}
+            for term, weight in vector.items():
+                if frequency[term] <= MAX_TERM_VIDEOS:
+                    positions, values = postings[term]
+                    positions.append(self.position[video_id])
+                    values.append(weight)
+        self.postings = {term: (np.array(positions, dtype=np.int64), np.array(values))
+                         for term, (positions, values) in postings.items()}
+
+        watched = defaultdict(list)
+        for farmer_id, video_id in views:
+            if video_id in self.position:
+                watched[farmer_id].append(video_id)
+        self.watched = {farmer_id: ids for farmer_id, ids in watched.items() if len(ids) <= MAX_FARMER_VIEWS}
+        self.viewers = defaultdict(list)
+        for farmer_id, ids in self.watched.items():
+            for video_id in ids:
+                self.viewers[video_id].append(farmer_id)
+        self.viewer_counts = {video_id: len(farmers) for video_id, farmers in self.viewers.items()}
+        self.viewer_counts.update(viewer_counts or {})
+
+    def neighbours(self, video_id, limit=RELATED_LIMIT):
+        """[(video_id, score)] of the best `limit` neighbours, best first"""
+        position = self.position.get(video_id)
+        if position is None:
+            return []
+        # (positions, weighted scores) pairs, summed per video below
+        parts = [(self.postings[term][0], self.postings[term][1] * (TEXT_WEIGHT * weight))
+                 for term, weight in self.vectors.get(video_id, {}).items() if term in self.postings]
+        coviews = Counter()
+        for farmer_id in self.viewers.get(video_id, ()):
+            coviews.update(self.watched[farmer_id])
+        if coviews:
+            viewers = self.viewer_counts[video_id]
+            parts.append((
+                np.array([self.position[other] for other in coviews], dtype=np.int64),
+                np.array([COVIEW_WEIGHT * together / math.sqrt(viewers * self.viewer_counts[other])
+                          for other, together in coviews.items()])
+            ))
+
+        related = {}
+        if parts:
+            candidates, inverse = np.unique(np.concatenate([positions for positions, _ in parts]), return_inverse=True)
+            scores = np.bincount(inverse, weights=np.concatenate([values for _, values in parts]))
+            scores += CATEGORY_WEIGHT * (self.category_codes[candidates] == self.category_codes[position])
+            others = candidates != position
+            candidates, scores = candidates[others], scores[others]
+            if len(scores) > limit:
+                best = np.argpartition(-scores, limit)[:limit]
+                candidates, scores = candidates[best], scores[best]
+            related = dict(zip(self.ids[candidates].tolist(), scores.tolist()))
+
+        # Too few similar videos: top up with the newest of the same category
+        for other in self.by_category[self.categories[video_id]]:
+            if len(related) >= limit:
+                break
+            if other != video_id and other not in related:
+                related[other] = CATEGORY_WEIGHT
+        return [(other, round(score, 4)) for other, score in _top(related.items(), limit)]
+
+def _newest_first(videos):
+    # Matches ORDER BY created_at DESC, id DESC as SQLite sorts it, NULL dates last
+    return sorted(videos, key=lambda video: (video.created_at is not None, video.created_at or datetime.min, video.id),
+                  reverse=True)
+
+def _select_in(connection, statement, column, values):
+    """Rows of `statement` with `column` IN `values`, queried WRITE_CHUNK values at a time"""
+    values = sorted(values)
+    for offset in range(0, len(values), WRITE_CHUNK):
+        yield from connection.execute(statement.where(column.in_(values[offset:offset + WRITE_CHUNK])))
+
+def _write_terms(connection, counts):
+    rows = [{'term': term, 'video_id': video_id, 'count': count}
+            for video_id, terms in counts.items() for term, count in terms.items()]
+    for offset in range(0, len(rows), WRITE_CHUNK * 10):
+        connection.execute(insert(VideoTerm), rows[offset:offset + WRITE_CHUNK * 10])
+
+def _adjust_frequencies(connection, changes):
+    """Add {word: change} to the stored number of videos using each word"""
+    table = VideoTermFrequency
+    added = sorted(term for term, change in changes.items() if change > 0)
+    for offset in range(0, len(added), WRITE_CHUNK):
+        connection.execute(insert_ignore(table), [{'term': term, 'videos': 0} for term in added[offset:offset + WRITE_CHUNK]])
+    by_change = defaultdict(list)
+    for term, change in changes.items():
+        if change:
+            by_change[change].append(term)
+    for change, terms in by_change.items():
+        connection.execute(update(table).where(table.term.in_(terms)).values(videos=table.videos + change))
+    connection.execute(delete(table).where(table.term.in_(list(changes)), table.videos <= 0))
+
+def load_index(connection):
+    """Index of every video, rebuilding video_terms on the way"""
+    videos = connection.execute(
+        select(Video.id, Video.title, Video.description, Video.category)
+        .order_by(Video.created_at.desc(), Video.id.desc())
+    ).all()
+    counts = {video.id: Counter(video_terms(video.title, video.description)) for video in videos}
+    frequency = Counter()
+    for terms in counts.values():
+        frequency.update(terms.keys())
+    connection.execute(delete(VideoTerm))
+    _write_terms(connection, counts)
+    connection.execute(delete(VideoTermFrequency))
+    rows = [{'term': term, 'videos': videos_with} for term, videos_with in frequency.items()]
+    for offset in range(0, len(rows), WRITE_CHUNK * 10):
+        connection.execute(insert(VideoTermFrequency), rows[offset:offset + WRITE_CHUNK * 10])
+    views = connection.execute(select(VideoView.farmer_id, VideoView.video_id)).all()
+    return RelatedIndex([(video.id, video.category) for video in videos], counts, frequency, len(videos), views)
+
+def term_frequencies(connection, terms):
+    """{word: number of videos using it}"""
+    statement = select(VideoTermFrequency.term, VideoTermFrequency.videos)
+    return dict(_select_in(connection, statement, VideoTermFrequency.term, terms))
+
+def _term_counts(connection, video_ids):
+    counts = defaultdict(Counter)
+    statement = select(VideoTerm.video_id, VideoTerm.term, VideoTerm.count)
+    for video_id, term, count in _select_in(connection, statement, VideoTerm.video_id, video_ids):
+        counts[video_id][term] = count
+    return counts
+
+def _viewer_counts(connection, video_ids):
+    # Viewers per video, leaving out farmers with more than MAX_FARMER_VIEWS views
+    views = list(_select_in(connection, select(VideoView.farmer_id, VideoView.video_id), VideoView.video_id, video_ids))
+    heavy = {farmer_id for (farmer_id,) in _select_in(
+        connection,
+        select(VideoView.farmer_id).group_by(VideoView.farmer_id).having(func.count() > MAX_FARMER_VIEWS),
+        VideoView.farmer_id, {farmer_id for farmer_id, _ in views}
+    )}
+    return Counter(video_id for farmer_id, video_id in views if farmer_id not in heavy)
+
+def load_neighbourhood(connection, video_ids):
+    """
+    Index of just what scoring `video_ids` reads.
+
+    That is the videos sharing an indexed word with them, the views of
+    their viewers and the newest videos of their categories. Their own
+    words are written to the word index first.
+    """
+    targets = connection.execute(
+        select(Video.id, Video.title, Video.description, Video.category, Video.created_at)
+        .where(Video.id.in_(list(video_ids)))
+    ).all()
+    own = {video.id: Counter(video_terms(video.title, video.description)) for video in targets}
+    changes = Counter()
+    previous = _term_counts(connection, own)
+    for video_id, terms in own.items():
+        changes.update(terms.keys() - previous[video_id].keys())
+        changes.subtract(previous[video_id].keys() - terms.keys())
+    connection.execute(delete(VideoTerm).where(VideoTerm.video_id.in_(list(own))))
+    _write_terms(connection, own)
+    _adjust_frequencies(connection, changes)
+
+    frequency = term_frequencies(connection, {term for terms in own.values() for term in terms})
+    indexed = [term for term, videos_with in frequency.items() if videos_with <= MAX_TERM_VIDEOS]
+    similar = {video_id for (video_id,) in _select_in(
+        connection, select(VideoTerm.video_id).distinct(), VideoTerm.term, indexed)} - own.keys()
+    counts = _term_counts(connection, similar)
+    counts.update(own)
+    frequency.update(term_frequencies(
+        connection, {term for terms in counts.values() for term in terms} - frequency.keys()))
+
+    farmers = {farmer_id for (farmer_id,) in _select_in(
+        connection, select(VideoView.farmer_id), VideoView.video_id, own)}
+    views = list(_select_in(connection, select(VideoView.farmer_id, VideoView.video_id), VideoView.farmer_id, farmers))
+    # Dropped here: only some of their views' videos are in this index
+    per_farmer = Counter(farmer_id for farmer_id, _ in views)
+    views = [(farmer_id, video_id) for farmer_id, video_id in views if per_farmer[farmer_id] <= MAX_FARMER_VIEWS]
+    coviewed = {video_id for _, video_id in views}
+
+    # Enough of each category's newest videos to top up a short list
+    videos = {video.id: video for video in targets}
+    columns = (Video.id, Video.category, Video.created_at)
+    for category in {video.category for video in targets}:
+        for video in connection.execute(
+                select(*columns).where(Video.category == category)
+                .order_by(Video.created_at.desc(), Video.id.desc()).limit(RELATED_LIMIT + 1)):
+            videos[video.id] = video
+    for video in _select_in(connection, select(*columns), Video.id, (similar | coviewed) - videos.keys()):
+        videos[video.id] = video
+
+    total = connection.execute(select(func.count(Video.id))).scalar()
+    return RelatedIndex([(video.id, video.category) for video in _newest_first(videos.values())], counts,
+                        frequency, total, views, _viewer_counts(connection, coviewed | own.keys()))
+
+def _insert_rows(connection, neighbours):
+    now = datetime.utcnow()
+    rows = [{'video_id': video_id, 'neighbours': encode(related), 'updated_at': now}
+            for video_id, related in neighbours.items()]
+    for offset in range(0, len(rows), WRITE_CHUNK):
+        connection.execute(insert(RelatedVideos), rows[offset:offset + WRITE_CHUNK])
+
+def rebuild_related(connection=None):
+    """Recompute every video's related videos and word index; returns the number of videos"""
+    connection = connection or db.session.connection()
+    index = load_index(connection)
+    connection.execute(delete(RelatedVideos))
+    _insert_rows(connection, {video_id: index.neighbours(video_id) for video_id in index.categories})
+    return len(index.categories)
+
+def update_related(video_ids, connection=None):
+    """Give new or edited videos their related videos and add them to their neighbours' rows"""
+    connection = connection or db.session.connection()
+    index = load_neighbourhood(connection, video_ids)
+    own = {video_id: index.neighbours(video_id) for video_id in video_ids if video_id in index.categories}
+    if not own:
+        return
+    table = RelatedVideos.__table__
+    connection.execute(delete(table).where(table.c.video_id.in_(list(own))))
+    _insert_rows(connection, own)
+
+    # Scores are symmetric, so only the videos each one picked can gain it as a neighbour
+    affected = sorted({other for related in own.values() for other, _ in related} - own.keys())
+    existing = {}
+    for offset in range(0, len(affected), WRITE_CHUNK):
+        chunk = affected[offset:offset + WRITE_CHUNK]
+        for video_id, neighbours in connection.execute(
+                select(table.c.video_id, table.c.neighbours).where(table.c.video_id.in_(chunk))):
+            existing[video_id] = decode(neighbours)
+
+    changed = {}
+    for video_id, related in own.items():
+        for other, score in related:
+            if other in existing:
+                merged = [pair for pair in changed.get(other, existing[other]) if pair[0] != video_id]
+                changed[other] = _top(merged + [(video_id, score)])
+    if changed:
+        connection.execute(
+            update(table).where(table.c.video_id == bindparam('related_id'))
+            .values(neighbours=bindparam('new_neighbours'), updated_at=datetime.utcnow()),
+            [{'related_id': other, 'new_neighbours': encode(related)} for other, related in changed.items()]
+        )
+
+def backfill_related():
+    """Build related videos and the word index for databases that had videos before the tables existed"""
+    has_rows = all(db.session.execute(select(column).limit(1)).first()
+                   for column in (RelatedVideos.video_id, VideoTerm.video_id, VideoTermFrequency.term))
+    if not has_rows and db.session.execute(select(Video.id).limit(1)).first():
+        rebuild_related()
+        db.session.commit()
+
+def related_video_ids(video_id):
+    """Neighbour ids of a video, best first, or None when its row has not been built"""
+    neighbours = db.session.execute(
+        select(RelatedVideos.neighbours).where(RelatedVideos.video_id == video_id)
+    ).scalar()
+    if neighbours is None:
+        return None
+    return [related_id for related_id, _ in decode(neighbours)]
+
+def record_view(farmer_id, video_id):
+    """Remember that a farmer watched a video (only the first view is kept)"""
+    db.session.execute(insert_ignore(VideoView).values(
+        farmer_id=farmer_id, video_id=video_id, viewed_at=datetime.utcnow()
+    ))
+    db.session.commit()
+
+@event.listens_for(Session, 'after_flush')
+def _update_flushed_videos(session, flush_context):
+    video_ids = [obj.id for obj in session.new if isinstance(obj, Video)]
+    video_ids += [obj.id for obj in session.dirty if isinstance(obj, Video) and session.is_modified(obj)]
+    if video_ids:
+        update_related(video_ids, session.connection())
@@ -0,0 +1,133 @@
+"""
+PDF farmer report rendering.
+
+Only the rows that appear in the report are loaded: the latest soil and
+weather readings, the farmer's recommendations and the first alerts. The
+PDF is written to any file-like object so callers can stream it to disk.
+Each part of the report is a section registered with the shared report
+layout, so other reports can reuse them.
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+from reportlab.platypus import Paragraph, Spacer
+from sqlalchemy.orm import joinedload
+from models import Farmer, SoilData, WeatherData, Recommendation, Alert
+from services.report_layout import report_section, render_report
+
+# Number of alerts listed in the report
+ALERT_ROWS = 10
+
+FARMER_REPORT_SECTIONS = ('title', 'farmer', 'soil', 'weather', 'recommendations', 'alerts', 'footer')
+
+def report_filename(farmer):
+    """Download name for a farmer's report"""
+    return f'farmer_report_{farmer.name}_{datetime.now().strftime("%Y%m%d")}.pdf'
+
+def farmer_report_queries(farmer_id):
+    """The queries behind a farmer's report, by the report field they fill"""
+    return {
+        'latest_soil': SoilData.query.filter_by(farmer_id=farmer_id).order_by(SoilData.date.desc()).limit(1),
+        'latest_weather': WeatherData.query.filter_by(farmer_id=farmer_id).order_by(WeatherData.date.desc()).limit(1),
+        'recommendations': Recommendation.query.options(joinedload(Recommendation.crop)).filter_by(farmer_id=farmer_id).order_by(Recommendation.recommended_date.desc()),
+        'alerts': Alert.query.options(joinedload(Alert.crop)).filter_by(farmer_id=farmer_id).order_by(Alert.alert_date.asc()).limit(ALERT_ROWS),
+    }
+
+def load_farmer_report(farmer_id):
+    """Load the rows shown in a farmer's report"""
+    queries = farmer_report_queries(farmer_id)
+    return SimpleNamespace(
+        farmer=Farmer.query.get(farmer_id),
+        latest_soil=queries['latest_soil'].first(),
+        latest_weather=queries['latest_weather'].first(),
+        recommendations=queries['recommendations'].all(),
+        alerts=queries['alerts'].all()
+    )
+
+def build_farmer_report(farmer_id, output, locale=None):
+    """Render a farmer's PDF report into `output` (a path or binary file object)"""
+    render_report(output, FARMER_REPORT_SECTIONS, load_farmer_report(farmer_id), locale)
+
+@report_section('title')
+def title_section(layout, data):
+    return [Paragraph("KrishiMitra: Agriband - Farmer Report", layout.title), Spacer(1, 12)]
+
+@report_section('farmer')
+def farmer_section(layout, data):
+    farmer = data.farmer
+    farmer_info = [
+        ['Name:', farmer.name],
+        ['Mobile:', farmer.mobile],
+        ['Village:', farmer.village],
+        ['Tehsil:', farmer.tehsil],
+        ['District:', farmer.district],
+        ['Pincode:', farmer.pincode]
+    ]
+    return layout.table("Farmer Information", farmer_info, [2, 4], layout.info_table)
+
+@report_section('soil')
+def soil_section(layout, data):
+    latest_soil = data.latest_soil
+    if not latest_soil:
+        return []
+    soil_info = [
+        ['Parameter', 'Value', 'Unit'],
+        ['pH Level', f"{latest_soil.ph:.2f}", ''],
+        ['Moisture', f"{latest_soil.moisture:.2f}", '%'],
+        ['Nitrogen', f"{latest_soil.nitrogen:.2f}", 'ppm'],
+        ['Phosphorus', f"{latest_soil.phosphorus:.2f}", 'ppm'],
+        ['Potassium', f"{latest_soil.potassium:.2f}", 'ppm'],
+        ['Temperature', f"{latest_soil.temperature:.2f}", '°C'],
+        ['Soil Type', latest_soil.soil_type, ''],
+        ['Test Date', latest_soil.date.strftime('%Y-%m-%d'), '']
+    ]
+    return layout.table("Latest Soil Analysis", soil_info, [2, 1.5, 1])
+
+@report_section('weather')
+def weather_section(layout, data):
+    latest_weather = data.latest_weather
+    if not latest_weather:
+        return []
+    weather_info = [
+        ['Parameter', 'Value', 'Unit'],
+        ['Temperature', f"{latest_weather.temperature:.2f}", '°C'],
+        ['Humidity', f"{latest_weather.humidity:.2f}", '%'],
+        ['Rainfall', f"{latest_weather.rainfall:.2f}", 'mm'],
+        ['Date', latest_weather.date.strftime('%Y-%m-%d'), '']
+    ]
+    return layout.table("Latest Weather Data", weather_info, [2, 1.5, 1])
+
+@report_section('recommendations')
+def recommendations_section(layout, data):
+    if not data.recommendations:
+        return []
+    rec_data = [['Crop Name', 'Season', 'Confidence Score', 'Recommended Date']]
+    for rec in data.recommendations:
+        rec_data.append([
+            rec.crop.crop_name,
+            rec.crop.season,
+            f"{rec.confidence_score:.1f}%",
+            rec.recommended_date.strftime('%Y-%m-%d')
+        ])
+    return layout.table("Crop Recommendations", rec_data, [2, 1.5, 1.5, 1.5])
+
+@report_section('alerts')
+def alerts_section(layout, data):
+    if not data.alerts:
+        return []
+    alert_data = [['Alert Type', 'Crop', 'Date', 'Message']]
+    for alert in data.alerts:
+        alert_data.append([
+            alert.alert_type.title(),
+            alert.crop.crop_name,
+            alert.alert_date.strftime('%Y-%m-%d'),
+            alert.message[:50] + '...' if len(alert.message) > 50 else alert.message
+        ])
+    return layout.table("Upcoming Alerts", alert_data, [1.5, 1.5, 1.5, 2.5])
+
+@report_section('footer')
+def footer_section(layout, data):
+    return [
+        Paragraph(f"Report Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", layout.normal),
+        Paragraph("KrishiMitra: Agriband - Smart Farming Decision Support System", layout.normal)
+    ]
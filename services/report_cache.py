@@ -0,0 +1,137 @@
+"""
+Content-addressed cache of rendered farmer reports.
+
+A report is identified by a fingerprint of everything it is built from: the
+row count, highest id and latest date of the farmer's soil, weather,
+recommendation and alert rows, the farmer's data_version (which also moves
+on edits and status changes) and the locale. The fingerprint maps to the
+SHA-256 of the PDF stored by the report job queue. PDFs are evicted least
+recently used first once the directory grows past REPORT_CACHE_MAX_BYTES,
+together with the cache/*.json index entries that point at them.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from flask import current_app
+from sqlalchemy import func, select
+from models import Alert, Farmer, Recommendation, SoilData, WeatherData, db
+from services.report_jobs import report_dir
+
+# Bump when the report layout changes so old PDFs are not served
+REPORT_LAYOUT_VERSION = 2
+
+DEFAULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+_stats_lock = threading.Lock()
+
+def _count(key):
+    with _stats_lock:
+        stats[key] += 1
+
+def report_fingerprint(farmer_id, locale):
+    """Fingerprint of a farmer's report inputs, computed in one statement"""
+    columns = [select(Farmer.data_version).where(Farmer.id == farmer_id).scalar_subquery()]
+    for model, date_column in [(SoilData, SoilData.date), (WeatherData, WeatherData.date),
+                               (Recommendation, Recommendation.recommended_date), (Alert, Alert.alert_date)]:
+        for aggregate in (func.count(model.id), func.max(model.id), func.max(date_column)):
+            columns.append(select(aggregate).where(model.farmer_id == farmer_id).scalar_subquery())
+
+    values = db.session.execute(select(*columns)).one()
+    key = [REPORT_LAYOUT_VERSION, farmer_id, str(locale)] + [str(value) for value in values]
+    return hashlib.sha256(json.dumps(key).encode()).hexdigest()
+
+def _index_path(fingerprint, app=None):
+    directory = os.path.join(report_dir(app), 'cache')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f'{fingerprint}.json')
+
+def lookup(fingerprint, app=None):
+    """Return the cache entry for a fingerprint if its PDF is still on disk"""
+    try:
+        with open(_index_path(fingerprint, app)) as f:
+            entry = json.load(f)
+    except (FileNotFoundError, ValueError):
+        _count('misses')
+        return None
+
+    path = os.path.join(report_dir(app), f"{entry['sha256']}.pdf")
+    try:
+        # Touch the PDF so eviction sees it as recently used
+        os.utime(path)
+    except FileNotFoundError:
+        # The PDF is gone; so is the entry
+        _remove(_index_path(fingerprint, app))
+        _count('misses')
+        return None
+
+    _count('hits')
+    return entry
+
+def store(fingerprint, farmer_id, sha256, app=None):
+    """Record a rendered PDF under its fingerprint and trim the cache"""
+    path = _index_path(fingerprint, app)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'farmer_id': farmer_id, 'sha256': sha256}, f)
+    os.replace(tmp_path, path)
+    evict(app)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _remove_index_entries(app, sha256s):
+    """Delete the index entries that point at any of the given PDFs"""
+    for path in glob.glob(os.path.join(report_dir(app), 'cache', '*.json')):
+        try:
+            with open(path) as f:
+                sha256 = json.load(f).get('sha256')
+        except (FileNotFoundError, ValueError):
+            continue
+        if sha256 in sha256s:
+            _remove(path)
+
+def _pdf_files(app):
+    """(mtime, size, path) of the cached PDFs, skipping any evicted while listing"""
+    files = []
+    for path in glob.glob(os.path.join(report_dir(app), '*.pdf')):
+        try:
+            info = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append((info.st_mtime, info.st_size, path))
+    return files
+
+def evict(app=None):
+    """Delete least recently used PDFs, and their index entries, until the cache fits in REPORT_CACHE_MAX_BYTES"""
+    app = app or current_app
+    max_bytes = app.config.get('REPORT_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)
+
+    files = _pdf_files(app)
+    total = sum(size for _, size, _ in files)
+    evicted = set()
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        evicted.add(os.path.basename(path)[:-len('.pdf')])
+        total -= size
+        _count('evictions')
+    if evicted:
+        _remove_index_entries(app, evicted)
+
+def cache_stats(app=None):
+    """Counters plus the current size of the cache on disk"""
+    files = _pdf_files(app)
+    with _stats_lock:
+        result = dict(stats)
+    result['files'] = len(files)
+    result['bytes'] = sum(size for _, size, _ in files)
+    return result
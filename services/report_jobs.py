@@ -0,0 +1,273 @@
+"""
+Background queue for PDF report rendering.
+
+Reports are rendered on a small thread pool instead of the request thread.
+Each finished PDF is stored in the report directory under its SHA-256 content
+hash, and job state is kept as a JSON file next to it so any worker process
+can answer status and download requests. Jobs submitted with a fingerprint
+record their PDF in the report cache when they finish, and submitting the
+same fingerprint again while one is queued or running returns that job.
+
+Each job records the host and process running it. A queued or running job
+whose process has died (e.g. across a restart) is marked failed, on startup
+and whenever its status is read. Job files of finished jobs are deleted
+REPORT_JOB_TTL seconds after they finish.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from models import db
+from services.report_builder import build_farmer_report
+
+DEFAULT_REPORT_WORKERS = 2
+DEFAULT_JOB_TTL = 24 * 60 * 60   # seconds
+SWEEP_INTERVAL = 10 * 60         # seconds between sweeps in one process
+ACTIVE_STATUSES = ('queued', 'running')
+
+_executor = None
+_executor_lock = threading.Lock()
+_last_sweep = 0.0
+# Tells this process apart from an earlier one that had the same pid
+_process_token = uuid.uuid4().hex
+
+def _reset():
+    global _executor, _process_token, _last_sweep
+    _executor = None
+    _process_token = uuid.uuid4().hex
+    _last_sweep = 0.0
+
+# Forked workers (e.g. gunicorn --preload) run their own jobs
+os.register_at_fork(after_in_child=_reset)
+
+def report_dir(app=None):
+    """Directory holding rendered reports and job files"""
+    app = app or current_app
+    path = app.config.get('REPORT_DIR') or os.path.join(app.instance_path, 'reports')
+    os.makedirs(os.path.join(path, 'jobs'), exist_ok=True)
+    return path
+
+def _job_path(app, job_id):
+    return os.path.join(report_dir(app), 'jobs', f'{job_id}.json')
+
+def _write_job(app, job):
+    # Write then rename so readers never see a half-written file
+    path = _job_path(app, job['job_id'])
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, path)
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = app.config.get('REPORT_WORKERS', DEFAULT_REPORT_WORKERS)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='report')
+        return _executor
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _orphaned(job):
+    """True for a queued or running job whose process on this host is gone"""
+    if job.get('status') not in ACTIVE_STATUSES or job.get('process') == _process_token:
+        return False
+    if job.get('host') is None:
+        # Submitted before jobs recorded their process
+        return True
+    if job['host'] != socket.gethostname():
+        return False
+    return job['pid'] == os.getpid() or not _alive(job['pid'])
+
+def _fail_orphan(app, job):
+    job.update(status='failed', error='Interrupted before it finished', finished_at=datetime.now().isoformat())
+    _write_job(app, job)
+    _release(app, job)
+
+def get_job(job_id, app=None):
+    """Return a job's state dict, or None if there is no such job"""
+    # Job ids are hex uuids; anything else cannot name a job file
+    if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+        return None
+    app = app or current_app
+    job = _read_json(_job_path(app, job_id))
+    if job is not None and _orphaned(job):
+        _fail_orphan(app, job)
+    return job
+
+def report_file(job, app=None):
+    """Path of a finished job's PDF"""
+    return os.path.join(report_dir(app), f"{job['sha256']}.pdf")
+
+def store_report(app, render):
+    """Run `render(output_path)` and file the result under its content hash"""
+    directory = report_dir(app)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.pdf.tmp')
+    os.close(fd)
+    try:
+        render(tmp_path)
+        digest = hashlib.sha256()
+        with open(tmp_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        os.replace(tmp_path, os.path.join(directory, f'{sha256}.pdf'))
+        return sha256
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _claim_path(app, fingerprint):
+    return os.path.join(report_dir(app), 'jobs', f'{fingerprint}.claim')
+
+def _claim(app, fingerprint, job_id):
+    """Make `job_id` the fingerprint's in-flight job, or return the id of the queued or running one"""
+    path = _claim_path(app, fingerprint)
+    for _ in range(2):
+        try:
+            # O_EXCL: of two processes claiming at once, only one creates the file
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(path) as f:
+                    holder = f.read().strip()
+            except FileNotFoundError:
+                continue
+            job = get_job(holder, app)
+            if job is not None and job['status'] in ACTIVE_STATUSES:
+                return holder
+            # The holder finished or failed without releasing its claim
+            _remove(path)
+            continue
+        with os.fdopen(fd, 'w') as f:
+            f.write(job_id)
+        return job_id
+    return job_id
+
+def _release(app, job):
+    """Drop the job's claim on its fingerprint"""
+    if not job.get('fingerprint'):
+        return
+    path = _claim_path(app, job['fingerprint'])
+    try:
+        with open(path) as f:
+            holder = f.read().strip()
+    except FileNotFoundError:
+        return
+    if holder == job['job_id']:
+        _remove(path)
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def sweep_jobs(app, now=None):
+    """Fail orphaned jobs and delete the files of jobs finished more than REPORT_JOB_TTL ago"""
+    ttl = app.config.get('REPORT_JOB_TTL', DEFAULT_JOB_TTL)
+    cutoff = (now or time.time()) - ttl
+    directory = os.path.join(report_dir(app), 'jobs')
+    removed = 0
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        job = _read_json(path)
+        if job is not None and _orphaned(job):
+            _fail_orphan(app, job)
+            continue
+        try:
+            # A job file is last written when its job finishes
+            expired = os.path.getmtime(path) < cutoff
+        except FileNotFoundError:
+            continue
+        if expired and (job is None or job.get('status') not in ACTIVE_STATUSES):
+            _remove(path)
+            removed += 1
+    # Claims and half-written files left behind by crashed processes
+    for path in glob.glob(os.path.join(directory, '*.claim')) + glob.glob(os.path.join(directory, '*.tmp')):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                _remove(path)
+        except FileNotFoundError:
+            pass
+    return removed
+
+def _maybe_sweep(app):
+    global _last_sweep
+    with _executor_lock:
+        if time.monotonic() - _last_sweep < SWEEP_INTERVAL:
+            return
+        _last_sweep = time.monotonic()
+    sweep_jobs(app)
+
+def init_report_jobs(app):
+    """Fail jobs a previous run left queued or running and drop expired job files"""
+    global _last_sweep
+    sweep_jobs(app)
+    _last_sweep = time.monotonic()
+
+def _run_job(app, job):
+    with app.app_context():
+        job.update(status='running', started_at=datetime.now().isoformat())
+        _write_job(app, job)
+        try:
+            job['sha256'] = store_report(app, lambda path: build_farmer_report(job['farmer_id'], path, job.get('locale')))
+            job['status'] = 'done'
+            if job.get('fingerprint'):
+                from services.report_cache import store
+                store(job['fingerprint'], job['farmer_id'], job['sha256'], app)
+        except Exception as e:
+            app.logger.exception('Report job %s failed', job['job_id'])
+            job.update(status='failed', error=str(e))
+        finally:
+            db.session.remove()
+        job['finished_at'] = datetime.now().isoformat()
+        _write_job(app, job)
+        _release(app, job)
+
+def submit_report(farmer_id, fingerprint=None, locale=None):
+    """Queue a report for a farmer and return its job id (an in-flight one for the same fingerprint is reused)"""
+    app = current_app._get_current_object()
+    _maybe_sweep(app)
+    job = {
+        'job_id': uuid.uuid4().hex,
+        'farmer_id': farmer_id,
+        'fingerprint': fingerprint,
+        'locale': str(locale) if locale else None,
+        'status': 'queued',
+        'created_at': datetime.now().isoformat(),
+        'host': socket.gethostname(),
+        'pid': os.getpid(),
+        'process': _process_token
+    }
+    # Written before it is claimed, so a concurrent submit that finds the claim can read it
+    _write_job(app, job)
+    if fingerprint:
+        holder = _claim(app, fingerprint, job['job_id'])
+        if holder != job['job_id']:
+            _remove(_job_path(app, job['job_id']))
+            return holder
+    _get_executor(app).submit(_run_job, app, job)
+    return job['job_id']
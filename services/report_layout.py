@@ -0,0 +1,159 @@
+"""
+Shared ReportLab layout for PDF reports.
+
+Fonts, paragraph styles and table styles are built once per locale and
+reused by every report the process renders. Reports are assembled from
+named sections: a section is a function taking (layout, data) and returning
+a list of flowables, registered with @report_section so new report types can
+mix the existing sections with their own.
+"""
+
+import os
+import threading
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+# Locales whose text needs a Devanagari font
+DEVANAGARI_LOCALES = ('hi', 'mr')
+
+# (font name, regular file, bold file) tried in order; the bold file is optional
+DEVANAGARI_FONTS = [
+    ('NotoSansDevanagari', 'NotoSansDevanagari-Regular.ttf', 'NotoSansDevanagari-Bold.ttf'),
+    ('Lohit-Devanagari', 'Lohit-Devanagari.ttf', None),
+    ('Mangal', 'mangal.ttf', 'mangalb.ttf'),
+]
+
+FONT_DIRS = [
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'fonts'),
+    '/usr/share/fonts',
+    '/usr/local/share/fonts',
+    'C:\\Windows\\Fonts',
+]
+
+_layouts = {}
+_lock = threading.Lock()
+_devanagari_font = None
+
+SECTIONS = {}
+
+def report_section(name):
+    """Register a section function under `name`"""
+    def register(func):
+        SECTIONS[name] = func
+        return func
+    return register
+
+def _find_font_file(filename, font_dirs):
+    for directory in font_dirs:
+        for root, _, files in os.walk(directory):
+            if filename in files:
+                return os.path.join(root, filename)
+    return None
+
+def register_devanagari_font(font_dirs=None):
+    """Register the first Devanagari TrueType font found, returning (regular, bold) names or None"""
+    global _devanagari_font
+    if _devanagari_font is not None:
+        return _devanagari_font or None
+
+    font_dirs = [d for d in (font_dirs or FONT_DIRS) if d and os.path.isdir(d)]
+    for name, regular, bold in DEVANAGARI_FONTS:
+        regular_path = _find_font_file(regular, font_dirs)
+        if regular_path is None:
+            continue
+        pdfmetrics.registerFont(TTFont(name, regular_path))
+        bold_name = name
+        bold_path = _find_font_file(bold, font_dirs) if bold else None
+        if bold_path:
+            bold_name = f'{name}-Bold'
+            pdfmetrics.registerFont(TTFont(bold_name, bold_path))
+        _devanagari_font = (name, bold_name)
+        return _devanagari_font
+
+    # Remember the miss so every report does not walk the font directories again
+    _devanagari_font = ()
+    return None
+
+class ReportLayout:
+    """Fonts, paragraph styles and table styles for one locale"""
+
+    def __init__(self, font='Helvetica', bold_font='Helvetica-Bold'):
+        styles = getSampleStyleSheet()
+        self.font = font
+        self.bold_font = bold_font
+        self.title = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontName=bold_font,
+            fontSize=18,
+            spaceAfter=30,
+            alignment=1  # Center alignment
+        )
+        self.heading = ParagraphStyle('ReportHeading', parent=styles['Heading2'], fontName=bold_font)
+        self.normal = ParagraphStyle('ReportNormal', parent=styles['Normal'], fontName=font)
+
+        # Label/value rows, labels in the first column
+        self.info_table = TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), font),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+            ('BACKGROUND', (1, 0), (1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+        # Header row followed by data rows
+        self.data_table = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), bold_font),
+            ('FONTNAME', (0, 1), (-1, -1), font),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ])
+
+    def table(self, heading, rows, col_widths, style=None):
+        """Heading, table and trailing spacer for one report section"""
+        table = Table(rows, colWidths=[width * inch for width in col_widths])
+        table.setStyle(style or self.data_table)
+        return [Paragraph(heading, self.heading), table, Spacer(1, 20)]
+
+def get_layout(locale=None):
+    """Return the shared layout for a locale, building it on first use"""
+    locale = str(locale or 'en')
+    devanagari = locale in DEVANAGARI_LOCALES
+    key = 'devanagari' if devanagari else 'latin'
+    with _lock:
+        layout = _layouts.get(key)
+        if layout is None:
+            fonts = register_devanagari_font() if devanagari else None
+            layout = ReportLayout(*fonts) if fonts else ReportLayout()
+            _layouts[key] = layout
+        return layout
+
+def init_report_layouts(app):
+    """Build the layouts for every configured language at startup"""
+    font_dir = app.config.get('REPORT_FONT_DIR')
+    if font_dir:
+        FONT_DIRS.insert(0, font_dir)
+    for locale in app.config.get('LANGUAGES', ['en']):
+        get_layout(locale)
+    if _devanagari_font == ():
+        app.logger.warning('No Devanagari font found; hi/mr reports fall back to Helvetica')
+
+def render_report(output, sections, data, locale=None, layout=None):
+    """Render the named sections into `output` (a path or binary file object)"""
+    layout = layout or get_layout(locale)
+    story = []
+    for name in sections:
+        story.extend(SECTIONS[name](layout, data))
+    SimpleDocTemplate(output, pagesize=letter).build(story)
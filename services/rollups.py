@@ -0,0 +1,282 @@
+"""
+Daily and weekly rollups of soil and weather readings.
+
+Every reading is folded into count/min/max/sum rows per farmer, metric and
+day or week as it is written: ORM inserts through a flush listener, bulk
+and write-behind inserts by calling add_readings(). Deleted or edited
+readings make the listener rebuild just the affected day and week from the
+raw rows. series() answers chart and forecast queries from the coarsest
+resolution that still fits the requested range, so long ranges never scan
+raw readings.
+"""
+
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, event, func, inspect, select
+from sqlalchemy.orm import Session
+from models import db, ReadingRollup, SoilData, WeatherData
+
+SOURCES = {
+    'soil': (SoilData, ['ph', 'moisture', 'nitrogen', 'phosphorus', 'potassium', 'temperature']),
+    'weather': (WeatherData, ['temperature', 'humidity', 'rainfall']),
+}
+RESOLUTIONS = ('day', 'week')
+
+# Longest ranges served from raw readings and from daily rollups; longer ones use weeks
+RAW_MAX_DAYS = 3
+DAILY_MAX_DAYS = 120
+
+# Raw readings folded in memory before the buckets are written during a rebuild
+REBUILD_BATCH = 50000
+
+# Longest ?days= range a series request may ask for
+MAX_SERIES_DAYS = 3650
+
+def period_start(moment, resolution):
+    """Start of the day, or of the Monday-based week, containing `moment`"""
+    day = datetime(moment.year, moment.month, moment.day)
+    return day if resolution == 'day' else day - timedelta(days=day.weekday())
+
+def _period_end(start, resolution):
+    return start + timedelta(days=1 if resolution == 'day' else 7)
+
+def aggregate(source, readings, buckets=None):
+    """Fold readings (dicts or model objects) into {(farmer_id, resolution, metric, period_start): [count, min, max, sum]}"""
+    metrics = SOURCES[source][1]
+    buckets = {} if buckets is None else buckets
+    # Period starts per calendar day; a batch usually spans only a few days
+    starts_by_day = {}
+    for reading in readings:
+        if not isinstance(reading, Mapping):
+            reading = {name: getattr(reading, name) for name in ('farmer_id', 'date', *metrics)}
+        farmer_id = reading['farmer_id']
+        moment = reading['date'] or datetime.utcnow()
+        starts = starts_by_day.get(moment.date())
+        if starts is None:
+            starts = starts_by_day[moment.date()] = [(resolution, period_start(moment, resolution)) for resolution in RESOLUTIONS]
+        for metric in metrics:
+            value = reading[metric]
+            for resolution, start in starts:
+                key = (farmer_id, resolution, metric, start)
+                bucket = buckets.get(key)
+                if bucket is None:
+                    buckets[key] = [1, value, value, value]
+                else:
+                    bucket[0] += 1
+                    if value < bucket[1]:
+                        bucket[1] = value
+                    elif value > bucket[2]:
+                        bucket[2] = value
+                    bucket[3] += value
+    return buckets
+
+def _upsert(connection, source, buckets):
+    """Merge aggregated buckets into the rollup table"""
+    if not buckets:
+        return
+    rows = [
+        {'farmer_id': farmer_id, 'source': source, 'resolution': resolution, 'metric': metric,
+         'period_start': start, 'count': count, 'min_value': low, 'max_value': high, 'sum_value': total}
+        for (farmer_id, resolution, metric, start), (count, low, high, total) in buckets.items()
+    ]
+    table = ReadingRollup.__table__
+
+    def merged(new):
+        # The stored row with the clashing new bucket `new` folded in;
+        # SQLite spells LEAST/GREATEST as its two-argument scalar min()/max()
+        least, greatest = (func.min, func.max) if connection.dialect.name == 'sqlite' else (func.least, func.greatest)
+        return {
+            'count': table.c.count + new['count'],
+            'min_value': least(table.c.min_value, new.min_value),
+            'max_value': greatest(table.c.max_value, new.max_value),
+            'sum_value': table.c.sum_value + new.sum_value,
+        }
+
+    if connection.dialect.name == 'mysql':
+        from sqlalchemy.dialects.mysql import insert
+        statement = insert(table)
+        # Conflicts on the (farmer_id, source, resolution, metric, period_start) unique key
+        statement = statement.on_duplicate_key_update(merged(statement.inserted))
+    else:
+        if connection.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=['farmer_id', 'source', 'resolution', 'metric', 'period_start'],
+            set_=merged(statement.excluded)
+        )
+    connection.execute(statement, rows)
+
+def add_readings(source, readings, connection=None):
+    """Fold newly inserted readings into the rollups"""
+    _upsert(connection or db.session.connection(), source, aggregate(source, readings))
+
+def readings_query(source, farmer_id, start, end, metrics=None):
+    """Select (farmer_id, date, *metrics) of a farmer's raw readings in [start, end), oldest first"""
+    model, all_metrics = SOURCES[source]
+    return (select(model.farmer_id, model.date, *[getattr(model, metric) for metric in metrics or all_metrics])
+            .where(model.farmer_id == farmer_id, model.date >= start, model.date < end)
+            .order_by(model.date))
+
+def recompute_periods(source, farmer_days, connection=None):
+    """Rebuild the day and week rollups covering each (farmer_id, moment) from raw readings"""
+    connection = connection or db.session.connection()
+    periods = {(farmer_id, resolution, period_start(moment, resolution))
+               for farmer_id, moment in farmer_days for resolution in RESOLUTIONS}
+
+    for farmer_id, resolution, start in periods:
+        end = _period_end(start, resolution)
+        connection.execute(delete(ReadingRollup).where(
+            ReadingRollup.farmer_id == farmer_id, ReadingRollup.source == source,
+            ReadingRollup.resolution == resolution, ReadingRollup.period_start == start
+        ))
+        rows = connection.execute(readings_query(source, farmer_id, start, end)).mappings().all()
+        buckets = {key: value for key, value in aggregate(source, rows).items() if key[1] == resolution}
+        _upsert(connection, source, buckets)
+
+@event.listens_for(Session, 'after_flush')
+def _rollup_flushed_readings(session, flush_context):
+    for source, (model, _) in SOURCES.items():
+        added = [obj for obj in session.new if isinstance(obj, model)]
+        if added:
+            add_readings(source, added, session.connection())
+
+        changed = set()
+        for obj in session.deleted:
+            if isinstance(obj, model) and obj.date:
+                changed.add((obj.farmer_id, obj.date))
+        for obj in session.dirty:
+            if isinstance(obj, model) and session.is_modified(obj):
+                changed.add((obj.farmer_id, obj.date))
+                # A moved reading also leaves its old day and week
+                changed.update((obj.farmer_id, old) for old in inspect(obj).attrs.date.history.deleted if old)
+        if changed:
+            recompute_periods(source, changed, session.connection())
+
+def rebuild_rollups(farmer_id=None):
+    """Recompute all rollups (or one farmer's) from raw readings"""
+    for source, (model, metrics) in SOURCES.items():
+        clear = delete(ReadingRollup).where(ReadingRollup.source == source)
+        statement = select(model.farmer_id, model.date, *[getattr(model, metric) for metric in metrics])
+        if farmer_id is not None:
+            clear = clear.where(ReadingRollup.farmer_id == farmer_id)
+            statement = statement.where(model.farmer_id == farmer_id)
+        db.session.execute(clear)
+
+        buckets = {}
+        folded = 0
+        for rows in db.session.execute(statement.execution_options(yield_per=REBUILD_BATCH)).mappings().partitions():
+            aggregate(source, rows, buckets)
+            folded += len(rows)
+            if folded >= REBUILD_BATCH:
+                _upsert(db.session.connection(), source, buckets)
+                buckets, folded = {}, 0
+        _upsert(db.session.connection(), source, buckets)
+    db.session.commit()
+
+def backfill_rollups():
+    """Build rollups for databases that had readings before rollups existed"""
+    has_rollups = db.session.execute(select(ReadingRollup.id).limit(1)).first()
+    has_readings = any(db.session.execute(select(model.id).limit(1)).first() for model, _ in SOURCES.values())
+    if has_readings and not has_rollups:
+        rebuild_rollups()
+
+def pick_resolution(start, end):
+    """'raw', 'day' or 'week', whichever keeps a chart of [start, end) to a readable number of points"""
+    span = end - start
+    if span <= timedelta(days=RAW_MAX_DAYS):
+        return 'raw'
+    if span <= timedelta(days=DAILY_MAX_DAYS):
+        return 'day'
+    return 'week'
+
+def rollup_query(farmer_id, source, resolution, metrics, start, end):
+    """Rollup rows of the periods overlapping [start, end), oldest first"""
+    return (
+        select(ReadingRollup)
+        .where(ReadingRollup.farmer_id == farmer_id, ReadingRollup.source == source,
+               ReadingRollup.resolution == resolution, ReadingRollup.metric.in_(metrics),
+               ReadingRollup.period_start >= period_start(start, resolution), ReadingRollup.period_start < end)
+        .order_by(ReadingRollup.period_start)
+    )
+
+def series(farmer_id, source, start, end, metrics=None, resolution=None):
+    """
+    Points for a farmer's readings between `start` and `end`.
+
+    Each point has 'period_start', 'count' and, per metric, a dict with
+    'min', 'max', 'mean' and 'sum'. Raw points are single readings.
+    """
+    all_metrics = SOURCES[source][1]
+    metrics = [metric for metric in (metrics or all_metrics) if metric in all_metrics]
+    resolution = resolution or pick_resolution(start, end)
+
+    if resolution == 'raw':
+        rows = db.session.execute(readings_query(source, farmer_id, start, end, metrics)).all()
+        points = [
+            dict({'period_start': row[1], 'count': 1},
+                 **{metric: {'min': value, 'max': value, 'mean': value, 'sum': value}
+                    for metric, value in zip(metrics, row[2:])})
+            for row in rows
+        ]
+        return {'resolution': resolution, 'points': points}
+
+    points = {}
+    for rollup in db.session.execute(rollup_query(farmer_id, source, resolution, metrics, start, end)).scalars():
+        point = points.setdefault(rollup.period_start, {'period_start': rollup.period_start, 'count': rollup.count})
+        point[rollup.metric] = {'min': rollup.min_value, 'max': rollup.max_value,
+                                'mean': rollup.mean_value, 'sum': rollup.sum_value}
+    return {'resolution': resolution, 'points': sorted(points.values(), key=lambda point: point['period_start'])}
+
+def totals(points, metric):
+    """(count, mean, sum) of a metric over a list of series points"""
+    count = sum(point['count'] for point in points if metric in point)
+    total = sum(point[metric]['sum'] for point in points if metric in point)
+    return count, (total / count if count else None), total
+
+def _parse_moment(value):
+    """Naive UTC datetime from an ISO 8601 string, converting any UTC offset"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        try:
+            moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+        except OverflowError:
+            raise ValueError(f'{value} is out of range')
+    return moment
+
+def parse_series_args(args, now=None):
+    """
+    (start, end, metrics, resolution) from request args.
+
+    The range is ?start=&end= (ISO 8601, offsets converted to UTC) or the
+    last ?days= (default 30, at most MAX_SERIES_DAYS); ?metric= may repeat
+    and ?resolution= forces raw, day or week. Raises ValueError for
+    malformed values.
+    """
+    end = _parse_moment(args['end']) if args.get('end') else (now or datetime.utcnow())
+    if args.get('start'):
+        start = _parse_moment(args['start'])
+    else:
+        days = int(args.get('days', 30))
+        if not 1 <= days <= MAX_SERIES_DAYS:
+            raise ValueError(f'days must be between 1 and {MAX_SERIES_DAYS}')
+        try:
+            start = end - timedelta(days=days)
+        except OverflowError:
+            raise ValueError('days reaches before the earliest supported date')
+    if start >= end:
+        raise ValueError('start must be before end')
+
+    resolution = args.get('resolution') or None
+    if resolution not in (None, 'raw') + RESOLUTIONS:
+        raise ValueError(f'resolution must be one of raw, {", ".join(RESOLUTIONS)}')
+    return start, end, args.getlist('metric') or None, resolution
+
+def series_json(result):
+    """series() output with timestamps as ISO 8601 strings"""
+    return {
+        'resolution': result['resolution'],
+        'points': [dict(point, period_start=point['period_start'].isoformat()) for point in result['points']],
+    }
@@ -0,0 +1,223 @@
+"""
+Bulk ingestion of soil and weather sensor readings.
+
+Readings arrive as a list of dicts (from JSON, NDJSON or CSV). Each numeric
+column is converted to a NumPy array and checked against the same bounds
+the soil and weather forms enforce, so a whole batch is validated with a
+handful of array comparisons. Valid rows are inserted with executemany in
+chunked transactions and every rejected row is reported with its reasons.
+"""
+
+import csv
+import json
+import time
+from datetime import datetime
+import numpy as np
+from sqlalchemy import insert, select
+from models import db, bump_data_version, Farmer, SoilData, WeatherData
+from services.rollups import add_readings
+from services.weather_stats import update_stats
+
+# (field, low, high, message) checked by the forms and by bulk ingestion
+SOIL_BOUNDS = [
+    ('ph', 0, 14, 'pH value must be between 0 and 14!'),
+    ('moisture', 0, 100, 'Moisture level must be between 0 and 100%!'),
+    ('nitrogen', 0, 1000, 'Nitrogen level must be between 0 and 1000 ppm!'),
+    ('phosphorus', 0, 1000, 'Phosphorus level must be between 0 and 1000 ppm!'),
+    ('potassium', 0, 1000, 'Potassium level must be between 0 and 1000 ppm!'),
+    ('temperature', -10, 50, 'Temperature must be between -10°C and 50°C!'),
+]
+WEATHER_BOUNDS = [
+    ('temperature', -50, 50, 'Temperature must be between -50°C and 50°C!'),
+    ('humidity', 0, 100, 'Humidity must be between 0 and 100%!'),
+    ('rainfall', 0, float('inf'), 'Rainfall cannot be negative!'),
+]
+
+SENSOR_KINDS = {
+    'soil': (SoilData, SOIL_BOUNDS, ['soil_type']),
+    'weather': (WeatherData, WEATHER_BOUNDS, []),
+}
+
+# Rows inserted per transaction
+CHUNK_SIZE = 5000
+# Rejected rows listed in a summary; the count covers all of them
+MAX_REPORTED_REJECTS = 1000
+
+def out_of_bounds(values, bounds):
+    """Return the message of the first bound a single form reading breaks, or None"""
+    for field, low, high, message in bounds:
+        if not (low <= values[field] <= high):
+            return message
+    return None
+
+def _floats(values):
+    try:
+        return np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        def to_float(value):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return np.nan
+        return np.array([to_float(value) for value in values], dtype=float)
+
+def _parse_date(value, default):
+    if value in (None, ''):
+        return default
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+def validate(kind, rows, farmer_id=None):
+    """
+    Validate a batch of readings.
+
+    Returns (records, rejects): insert-ready dicts for the valid rows and
+    {'row': index, 'errors': [...]} for the others. `farmer_id` fills in
+    rows that do not carry their own.
+    """
+    model, bounds, text_fields = SENSOR_KINDS[kind]
+    count = len(rows)
+    errors = {}
+
+    def reject(mask, message):
+        for index in np.flatnonzero(mask).tolist():
+            errors.setdefault(index, []).append(message)
+
+    columns = {}
+    for field, low, high, message in bounds:
+        column = _floats([row.get(field) for row in rows])
+        reject(~np.isfinite(column) | (column < low) | (column > high), message)
+        columns[field] = column
+
+    farmer_ids = _floats([row.get('farmer_id') or farmer_id for row in rows])
+    candidate_ids = {int(i) for i in np.unique(farmer_ids[np.isfinite(farmer_ids)]).tolist()}
+    known_ids = set(db.session.execute(select(Farmer.id).where(Farmer.id.in_(candidate_ids))).scalars())
+    reject(~np.isin(farmer_ids, list(known_ids)), 'Unknown farmer_id')
+
+    for field in text_fields:
+        values = [str(row.get(field) or '').strip() for row in rows]
+        # Strict backends such as PostgreSQL refuse strings longer than the column
+        max_length = model.__table__.c[field].type.length
+        reject(np.array([not value or len(value) > max_length for value in values], dtype=bool),
+               f'{field} is required (at most {max_length} characters)')
+        columns[field] = values
+
+    now = datetime.utcnow()
+    dates = []
+    for index, row in enumerate(rows):
+        try:
+            dates.append(_parse_date(row.get('date'), now))
+        except (TypeError, ValueError):
+            dates.append(None)
+            errors.setdefault(index, []).append('date must be an ISO 8601 timestamp')
+
+    valid = np.ones(count, dtype=bool)
+    if errors:
+        valid[list(errors)] = False
+
+    fields = [field for field, _, _, _ in bounds]
+    numeric = {field: columns[field].tolist() for field in fields}
+    owners = np.where(valid, farmer_ids, 0).astype(np.int64).tolist()
+    records = []
+    for index in np.flatnonzero(valid).tolist():
+        record = {field: numeric[field][index] for field in fields}
+        for field in text_fields:
+            record[field] = columns[field][index]
+        record['farmer_id'] = owners[index]
+        record['date'] = dates[index]
+        records.append(record)
+
+    rejects = [{'row': index, 'errors': messages} for index, messages in sorted(errors.items())]
+    return records, rejects
+
+def insert_readings(kind, records):
+    """Insert validated readings in CHUNK_SIZE transactions"""
+    model = SENSOR_KINDS[kind][0]
+    for start in range(0, len(records), CHUNK_SIZE):
+        chunk = records[start:start + CHUNK_SIZE]
+        db.session.execute(insert(model), chunk)
+        # Core inserts skip the session hooks, so mark the farmers' views stale and roll up here
+        bump_data_version({record['farmer_id'] for record in chunk})
+        add_readings(kind, chunk)
+        if kind == 'weather':
+            update_stats(chunk)
+        db.session.commit()
+
+def new_summary():
+    return {'received': 0, 'inserted': 0, 'queued': 0, 'rejected': 0, 'rejects': [], 'seconds': 0.0, 'rows_per_second': 0.0}
+
+def ingest(kind, rows, farmer_id=None, summary=None, offset=0, buffer=None):
+    """
+    Validate and insert a batch, adding the outcome to `summary`.
+
+    With a write-behind `buffer` the valid rows are queued for its next
+    group commit instead of being inserted here. Batches larger than one
+    group commit already amortize their commits and are inserted directly.
+    """
+    summary = summary or new_summary()
+    start = time.perf_counter()
+    records, rejects = validate(kind, rows, farmer_id)
+    if buffer is not None and len(records) <= buffer.max_rows:
+        buffer.submit(kind, records)
+        summary['queued'] += len(records)
+    else:
+        insert_readings(kind, records)
+        summary['inserted'] += len(records)
+
+    summary['received'] += len(rows)
+    summary['rejected'] += len(rejects)
+    room = MAX_REPORTED_REJECTS - len(summary['rejects'])
+    for item in rejects[:max(room, 0)]:
+        item['row'] += offset
+        summary['rejects'].append(item)
+    summary['seconds'] += time.perf_counter() - start
+    summary['rows_per_second'] = summary['received'] / summary['seconds'] if summary['seconds'] else 0.0
+    return summary
+
+def parse_payload(body, content_type):
+    """Rows from a request body in JSON (a list or {'readings': [...]}), NDJSON or CSV"""
+    text = body.decode('utf-8-sig')
+    if 'csv' in content_type:
+        return list(csv.DictReader(text.splitlines()))
+    if 'ndjson' in content_type:
+        payload = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        payload = json.loads(text)
+    if isinstance(payload, dict):
+        payload = payload.get('readings', [])
+    if not isinstance(payload, list) or not all(isinstance(row, dict) for row in payload):
+        raise ValueError('Expected a list of readings')
+    return payload
+
+def read_file(path, chunk_size=CHUNK_SIZE):
+    """Yield lists of rows from a .csv, .ndjson or .json file, `chunk_size` at a time"""
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8-sig') as f:
+            rows = parse_payload(f.read().encode(), 'application/json')
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+        return
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if path.endswith('.csv'):
+            reader = csv.DictReader(f)
+        else:
+            reader = (json.loads(line) for line in f if line.strip())
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+def ingest_file(kind, path, farmer_id=None):
+    """Ingest a whole file chunk by chunk and return the summary"""
+    summary = new_summary()
+    offset = 0
+    for rows in read_file(path):
+        ingest(kind, rows, farmer_id, summary, offset)
+        offset += len(rows)
+    return summary
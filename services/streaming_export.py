@@ -0,0 +1,74 @@
+"""
+Streaming CSV and NDJSON downloads of per-farmer history.
+
+Rows are read with yield_per so the driver hands them over in fixed-size
+batches, and each batch is encoded and sent before the next one is read.
+Memory stays flat however long the history is, and the download starts as
+soon as the first batch is ready.
+"""
+
+import csv
+import io
+import json
+from datetime import datetime
+from flask import Response, stream_with_context
+from sqlalchemy import select
+from models import db
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows fetched and encoded per batch
+BATCH_SIZE = 1000
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _csv_batches(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for batch in rows.partitions():
+        for row in batch:
+            writer.writerow([_value(value) for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def _ndjson_batches(rows, fields):
+    for batch in rows.partitions():
+        yield ''.join(
+            json.dumps(dict(zip(fields, (_value(value) for value in row)))) + '\n'
+            for row in batch
+        )
+
+def history_export_query(model, fields, farmer_id):
+    """Select `fields` of a farmer's rows of `model`, newest first"""
+    return (select(*[getattr(model, field) for field in fields])
+            .where(model.farmer_id == farmer_id)
+            .order_by(model.date.desc(), model.id.desc()))
+
+def stream_export(statement, fields, export_format, filename):
+    """
+    Streaming download of a Core select in CSV or NDJSON.
+
+    `statement` selects the columns named by `fields`, in that order.
+    """
+    def generate():
+        rows = db.session.execute(statement.execution_options(yield_per=BATCH_SIZE))
+        try:
+            encode = _csv_batches if export_format == 'csv' else _ndjson_batches
+            yield from encode(rows, fields)
+        finally:
+            rows.close()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}.{export_format}'}
+    )
@@ -0,0 +1,139 @@
+"""
+Translation catalogs, loaded once per process.
+
+Flask-Babel reads a language's messages.mo on the first request in that
+language, and every _() in a template goes through three context lookups
+to find the request's catalog. init_translations() loads and merges the
+catalogs of every configured language when the app is created, so under
+`gunicorn --preload` the workers share them copy-on-write and the first
+Hindi or Marathi request is no slower than an English one. Templates then
+translate from a flat per-locale string table, found once per request.
+
+check_catalogs() compares each messages.po with its compiled messages.mo by
+content (checkouts do not preserve modification times). A stale catalog is
+logged at startup; `flask translations check` fails on one and
+`flask translations compile` rebuilds them.
+"""
+
+import os
+import click
+from babel.messages.mofile import read_mo, write_mo
+from babel.messages.pofile import read_po
+from flask import current_app, g
+from flask.cli import AppGroup
+from flask_babel import force_locale, get_locale, get_translations
+
+DOMAIN = 'messages'
+
+translations_cli = AppGroup('translations', help='Check and compile translation catalogs.')
+
+def catalog_files(directories, domain=DOMAIN):
+    """(locale, po_path, mo_path) for every language with a .po file"""
+    files = []
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for locale in sorted(os.listdir(directory)):
+            base = os.path.join(directory, locale, 'LC_MESSAGES', domain)
+            if os.path.isfile(base + '.po'):
+                files.append((locale, base + '.po', base + '.mo'))
+    return files
+
+def _messages(catalog):
+    # What write_mo keeps: translated, non-fuzzy messages (the header is not compared)
+    return {message.id: message.string for message in catalog
+            if message.id and message.string and not message.fuzzy}
+
+def check_catalogs(directories, domain=DOMAIN):
+    """[(locale, po_path, problem)] for .mo files that are missing or differ from their .po"""
+    stale = []
+    for locale, po_path, mo_path in catalog_files(directories, domain):
+        if not os.path.isfile(mo_path):
+            stale.append((locale, po_path, 'not compiled'))
+            continue
+        with open(po_path, 'rb') as po_file, open(mo_path, 'rb') as mo_file:
+            if _messages(read_po(po_file, locale=locale)) != _messages(read_mo(mo_file)):
+                stale.append((locale, po_path, 'out of date'))
+    return stale
+
+def compile_catalogs(directories, domain=DOMAIN, force=False):
+    """Compile stale (or, with force, all) .po files; returns the compiled .po paths"""
+    stale = {po_path for _, po_path, _ in check_catalogs(directories, domain)}
+    compiled = []
+    for locale, po_path, mo_path in catalog_files(directories, domain):
+        if force or po_path in stale:
+            with open(po_path, 'rb') as po_file:
+                catalog = read_po(po_file, locale=locale)
+            with open(mo_path, 'wb') as mo_file:
+                write_mo(mo_file, catalog)
+            compiled.append(po_path)
+    return compiled
+
+def preload_translations(app):
+    """Load every configured language into Flask-Babel's catalog cache; {locale: {msgid: translation}}"""
+    tables = {}
+    with app.test_request_context():
+        for locale in app.config.get('LANGUAGES', [app.config.get('BABEL_DEFAULT_LOCALE', 'en')]):
+            with force_locale(locale):
+                tables[str(get_locale())] = _table(get_translations())
+    return tables
+
+def _table(translations):
+    return {msgid: string for msgid, string in getattr(translations, '_catalog', {}).items()
+            if isinstance(msgid, str) and msgid}
+
+def _request_strings():
+    """The request locale's string table, remembered on Flask-Babel's per-request context"""
+    context = g.get('_flask_babel')
+    remembered = getattr(context, 'translated_strings', None)
+    if remembered is not None and remembered[0] is getattr(context, 'babel_locale', None):
+        return remembered[1]
+
+    locale = get_locale()
+    if locale is None:
+        return {}
+    tables = current_app.extensions['translations']
+    table = tables.get(str(locale))
+    if table is None:
+        # A locale outside LANGUAGES (e.g. from force_locale): load it once
+        table = tables[str(locale)] = _table(get_translations())
+    g._flask_babel.translated_strings = (locale, table)
+    return table
+
+def _gettext(string):
+    return _request_strings().get(string, string)
+
+def init_translations(app):
+    """Preload catalogs, warn about stale ones and translate templates from the preloaded tables"""
+    directories = app.extensions['babel'].translation_directories
+    for locale, po_path, problem in check_catalogs(directories):
+        app.logger.warning('Translation catalog %s (%s) is %s; run `flask translations compile`',
+                           po_path, locale, problem)
+    app.extensions['translations'] = preload_translations(app)
+    app.jinja_env.install_gettext_callables(
+        gettext=_gettext,
+        ngettext=lambda singular, plural, n: get_translations().ungettext(singular, plural, n),
+        pgettext=lambda context, string: get_translations().upgettext(context, string),
+        npgettext=lambda context, singular, plural, n: get_translations().unpgettext(context, singular, plural, n),
+        newstyle=True
+    )
+    app.cli.add_command(translations_cli)
+
+@translations_cli.command('check')
+def check_command():
+    """Fail when a compiled catalog is missing or older than its .po file"""
+    stale = check_catalogs(current_app.extensions['babel'].translation_directories)
+    for locale, po_path, problem in stale:
+        click.echo(f'{po_path} ({locale}): {problem}')
+    if stale:
+        raise SystemExit(1)
+    click.echo('Translation catalogs are up to date')
+
+@translations_cli.command('compile')
+@click.option('--force', is_flag=True, help='Recompile every catalog, not only stale ones')
+def compile_command(force):
+    """Compile stale .po files to .mo"""
+    compiled = compile_catalogs(current_app.extensions['babel'].translation_directories, force=force)
+    for po_path in compiled:
+        click.echo(f'Compiled {po_path}')
+    click.echo(f'{len(compiled)} catalog(s) compiled')
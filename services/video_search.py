@@ -0,0 +1,128 @@
+"""
+Full-text search over educational videos.
+
+On SQLite the videos table has an FTS5 index, videos_fts, kept in sync by
+triggers on insert, update and delete. Searches match every query word as
+a prefix and rank results with BM25, weighting title matches above
+category and description matches. The unicode61 tokenizer folds case and
+Latin diacritics but treats Indic vowel signs and viramas as separators,
+so the Devanagari combining marks are declared token characters; Hindi
+and Marathi words are then indexed whole.
+
+Other databases fall back to the LIKE scan the search used before.
+
+Results are served a page at a time with the keyset cursors of
+services/pagination.py: by (rank, id) on FTS5 and by (created_at, id)
+on the LIKE fallback.
+"""
+
+import re
+import unicodedata
+import weakref
+from sqlalchemy import DDL, Float, column, event, inspect, select, text
+from models import db, Video
+from services.pagination import DEFAULT_PER_PAGE, MAX_PER_PAGE, KeysetPage, decode_cursor, encode_cursor, paginate
+
+FTS_TABLE = 'videos_fts'
+# Combining marks of the Devanagari block (matras, virama, anusvara, nukta...)
+DEVANAGARI_MARKS = ''.join(chr(code) for code in range(0x0900, 0x0980)
+                           if unicodedata.category(chr(code)) in ('Mn', 'Mc'))
+# BM25 column weights for title, description and category
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+CATEGORY_WEIGHT = 3.0
+MAX_TERMS = 8
+
+TERM = re.compile(r'[\w\u0900-\u097F]+')
+
+FTS_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"title, description, category, content='videos', content_rowid='id', "
+    f"tokenize=\"unicode61 remove_diacritics 2 tokenchars '{DEVANAGARI_MARKS}'\")",
+    f"CREATE TRIGGER IF NOT EXISTS videos_fts_insert AFTER INSERT ON videos BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, description, category) "
+    f"VALUES (new.id, new.title, new.description, new.category); END",
+    f"CREATE TRIGGER IF NOT EXISTS videos_fts_delete AFTER DELETE ON videos BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, category) "
+    f"VALUES ('delete', old.id, old.title, old.description, old.category); END",
+    f"CREATE TRIGGER IF NOT EXISTS videos_fts_update AFTER UPDATE OF title, description, category ON videos BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description, category) "
+    f"VALUES ('delete', old.id, old.title, old.description, old.category); "
+    f"INSERT INTO {FTS_TABLE}(rowid, title, description, category) "
+    f"VALUES (new.id, new.title, new.description, new.category); END",
+]
+
+# Best matches first (bm25 is lower for better matches), then by id; rows after the (:rank, :id) cursor
+SEARCH_SQL = text(
+    f'SELECT * FROM (SELECT videos.*, bm25({FTS_TABLE}, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}, {CATEGORY_WEIGHT}) AS rank '
+    f'FROM {FTS_TABLE} JOIN videos ON videos.id = {FTS_TABLE}.rowid WHERE {FTS_TABLE} MATCH :expression) '
+    f'WHERE :rank IS NULL OR (rank, id) > (:rank, :id) ORDER BY rank, id LIMIT :limit'
+)
+COUNT_SQL = text(f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :expression')
+
+# New SQLite databases get the index and triggers along with the videos table
+for statement in FTS_DDL:
+    event.listen(Video.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+# Whether each engine has the FTS table, checked once per engine
+_fts_engines = weakref.WeakKeyDictionary()
+
+def fts_available(engine=None):
+    engine = engine or db.engine
+    if engine not in _fts_engines:
+        _fts_engines[engine] = engine.dialect.name == 'sqlite' and inspect(engine).has_table(FTS_TABLE)
+    return _fts_engines[engine]
+
+def ensure_video_search():
+    """Create and fill the FTS index on SQLite databases made before it existed"""
+    if db.engine.dialect.name != 'sqlite' or fts_available():
+        return
+    for statement in FTS_DDL:
+        db.session.execute(text(statement))
+    rebuild_video_search()
+    _fts_engines.pop(db.engine, None)
+
+def rebuild_video_search():
+    """Reindex every video from the videos table"""
+    db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    db.session.commit()
+
+def match_expression(query):
+    """FTS5 expression matching every word of `query` as a prefix, or '' when it has no words"""
+    terms = TERM.findall(unicodedata.normalize('NFC', query))[:MAX_TERMS]
+    # Quoting keeps words like AND, OR and NEAR from being read as operators
+    return ' '.join(f'"{term}"*' for term in terms)
+
+def _like_query(query):
+    return Video.query.filter(Video.title.contains(query) | Video.description.contains(query))
+
+def search_videos(query, cursor=None, per_page=DEFAULT_PER_PAGE):
+    """KeysetPage of the videos matching `query` that follows `cursor`, best matches first"""
+    expression = match_expression(query)
+    if not expression:
+        return KeysetPage([], None, None)
+    if not fts_available():
+        return paginate(_like_query(query), Video.created_at, Video.id, cursor, per_page)
+
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+    key = decode_cursor(cursor)
+    if key is not None and not isinstance(key[0], float):
+        key = None
+    statement = select(Video, column('rank', Float)).from_statement(SEARCH_SQL.bindparams(
+        expression=expression, rank=key[0] if key else None, id=key[1] if key else None, limit=per_page + 1
+    ))
+    rows = db.session.execute(statement).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].rank, rows[-1].Video.id)
+    return KeysetPage([row.Video for row in rows], cursor if key is not None else None, next_cursor)
+
+def count_videos(query):
+    """Number of videos matching `query`"""
+    expression = match_expression(query)
+    if not expression:
+        return 0
+    if fts_available():
+        return db.session.execute(COUNT_SQL.bindparams(expression=expression)).scalar()
+    return _like_query(query).count()
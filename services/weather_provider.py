@@ -0,0 +1,246 @@
+"""
+Client for the external weather provider.
+
+Current conditions are looked up by pincode, which many farmers share, so
+results are kept in a TTL cache keyed by pincode. Concurrent lookups of a
+pincode that is not cached share one provider call (single-flight) instead
+of each going to the network. Calls go through one pooled requests.Session
+with connect/read timeouts and retries with backoff on connection errors
+and 429/5xx responses, so a slow provider cannot tie up request threads
+for long.
+
+WEATHER_PROVIDER picks the provider: 'openweather' (the default when
+OPENWEATHER_API_KEY is set) or 'fake', a local provider with deterministic
+per-pincode readings for development and tests.
+"""
+
+import hashlib
+import threading
+import time
+import requests
+from flask import current_app
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_CACHE_TTL = 600          # seconds
+DEFAULT_CACHE_MAX_ENTRIES = 10000
+DEFAULT_CONNECT_TIMEOUT = 3.05   # seconds
+DEFAULT_READ_TIMEOUT = 5.0
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF = 0.3              # seconds, doubled per retry
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POOL_SIZE = 10
+
+class WeatherProviderError(Exception):
+    """The provider could not be reached or returned an unusable response"""
+
+class OpenWeatherProvider:
+    """Current weather from OpenWeather's by-postcode endpoint"""
+
+    url = 'https://api.openweathermap.org/data/2.5/weather'
+
+    def __init__(self, api_key, country='IN'):
+        self.api_key = api_key
+        self.country = country
+
+    def fetch(self, http, pincode, timeout):
+        response = http.get(self.url, timeout=timeout, params={
+            'zip': f'{pincode},{self.country}', 'appid': self.api_key, 'units': 'metric'
+        })
+        response.raise_for_status()
+        payload = response.json()
+        try:
+            return {
+                'temperature': float(payload['main']['temp']),
+                'humidity': float(payload['main']['humidity']),
+                'rainfall': float(payload.get('rain', {}).get('1h', 0.0)),
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            raise WeatherProviderError(f'Unexpected weather response: {e}')
+
+class FakeProvider:
+    """
+    Deterministic readings per pincode without network access.
+
+    `delay` (seconds) simulates provider latency and `error`, when set, is
+    raised by every call; `calls` counts fetches.
+    """
+
+    def __init__(self, delay=0.0, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, http, pincode, timeout):
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        seed = int(hashlib.sha256(str(pincode).encode()).hexdigest()[:8], 16)
+        return {
+            'temperature': round(18 + seed % 170 / 10, 1),
+            'humidity': float(40 + seed % 51),
+            'rainfall': float(seed % 7),
+        }
+
+def describe_request_error(error):
+    """Message for a requests exception without the request URL, which carries the API key"""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        return f'Weather provider returned HTTP {response.status_code}'
+    if isinstance(error, requests.Timeout):
+        return 'Weather provider timed out'
+    if isinstance(error, requests.ConnectionError):
+        return 'Could not connect to the weather provider'
+    return f'Weather provider request failed ({type(error).__name__})'
+
+class _Call:
+    """One in-flight provider call that later callers for the same pincode wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+def make_session(retries=DEFAULT_RETRIES, pool_size=POOL_SIZE):
+    """requests.Session with a connection pool and retries with backoff"""
+    retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                  backoff_factor=RETRY_BACKOFF, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(['GET']), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    http = requests.Session()
+    http.mount('https://', adapter)
+    http.mount('http://', adapter)
+    return http
+
+class WeatherClient:
+    """Cached, single-flight access to a weather provider"""
+
+    def __init__(self, provider, ttl=DEFAULT_CACHE_TTL, max_entries=DEFAULT_CACHE_MAX_ENTRIES,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 retries=DEFAULT_RETRIES):
+        self.provider = provider
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = (connect_timeout, read_timeout)
+        # Longest a provider call can take, retries and backoff included
+        self.call_budget = (connect_timeout + read_timeout) * (retries + 1) + RETRY_BACKOFF * 2 ** retries
+        self.http = make_session(retries)
+
+        self._cache = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._metrics = {
+            'lookups': 0, 'hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0,
+            'latency_ms_last': 0.0, 'latency_ms_max': 0.0, 'latency_ms_total': 0.0
+        }
+
+    def current(self, pincode):
+        """Current conditions for a pincode: {'temperature', 'humidity', 'rainfall'}"""
+        pincode = str(pincode).strip()
+        with self._lock:
+            self._metrics['lookups'] += 1
+            entry = self._cache.get(pincode)
+            if entry is not None and entry[0] > time.monotonic():
+                self._metrics['hits'] += 1
+                return dict(entry[1])
+
+            call = self._in_flight.get(pincode)
+            leader = call is None
+            if leader:
+                call = self._in_flight[pincode] = _Call()
+                self._metrics['misses'] += 1
+            else:
+                self._metrics['coalesced'] += 1
+
+        if leader:
+            self._fetch(pincode, call)
+        elif not call.done.wait(self.call_budget):
+            raise WeatherProviderError('Timed out waiting for the weather provider')
+
+        if call.error is not None:
+            raise call.error
+        return dict(call.result)
+
+    def _fetch(self, pincode, call):
+        start = time.perf_counter()
+        try:
+            call.result = self.provider.fetch(self.http, pincode, self.timeout)
+        except WeatherProviderError as e:
+            call.error = e
+        except requests.RequestException as e:
+            call.error = WeatherProviderError(describe_request_error(e))
+        except Exception as e:
+            current_app.logger.exception('Weather provider failed for pincode %s', pincode)
+            call.error = WeatherProviderError(f'Weather provider failed ({type(e).__name__})')
+        finally:
+            # Always release the pincode, or later lookups would wait on a call that never finishes
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if call.error is None and call.result is None:
+                call.error = WeatherProviderError('Weather provider call was interrupted')
+            with self._lock:
+                if call.error is None:
+                    self._store(pincode, call.result)
+                else:
+                    self._metrics['errors'] += 1
+                self._metrics['latency_ms_last'] = elapsed_ms
+                self._metrics['latency_ms_max'] = max(self._metrics['latency_ms_max'], elapsed_ms)
+                self._metrics['latency_ms_total'] += elapsed_ms
+                del self._in_flight[pincode]
+            call.done.set()
+
+    def _store(self, pincode, result):
+        now = time.monotonic()
+        if len(self._cache) >= self.max_entries:
+            self._cache = {key: entry for key, entry in self._cache.items() if entry[0] > now}
+            if len(self._cache) >= self.max_entries:
+                # Still full of live entries: drop the ones closest to expiry
+                for key, _ in sorted(self._cache.items(), key=lambda item: item[1][0])[:self.max_entries // 10 or 1]:
+                    del self._cache[key]
+        self._cache[pincode] = (now + self.ttl, result)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def metrics(self):
+        """Lookup, hit/miss and provider latency counters"""
+        with self._lock:
+            result = dict(self._metrics)
+            result['cache_entries'] = len(self._cache)
+            result['in_flight'] = len(self._in_flight)
+        total = result.pop('latency_ms_total')
+        calls = result['misses']
+        result['latency_ms_avg'] = total / calls if calls else 0.0
+        result['hit_ratio'] = result['hits'] / result['lookups'] if result['lookups'] else 0.0
+        return result
+
+def init_weather_client(app):
+    """Create the app's weather client from WEATHER_* settings, or None when no provider is configured"""
+    name = app.config.get('WEATHER_PROVIDER')
+    api_key = app.config.get('OPENWEATHER_API_KEY')
+    if name is None:
+        name = 'openweather' if api_key else None
+    if name == 'fake':
+        provider = FakeProvider(delay=app.config.get('WEATHER_FAKE_DELAY_MS', 0) / 1000)
+    elif name == 'openweather' and api_key:
+        provider = OpenWeatherProvider(api_key)
+    else:
+        return None
+
+    client = WeatherClient(
+        provider,
+        ttl=app.config.get('WEATHER_CACHE_TTL', DEFAULT_CACHE_TTL),
+        connect_timeout=app.config.get('WEATHER_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+        read_timeout=app.config.get('WEATHER_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+        retries=app.config.get('WEATHER_RETRIES', DEFAULT_RETRIES)
+    )
+    app.extensions['weather_client'] = client
+    return client
+
+def get_client():
+    """The app's weather client, or None when no provider is configured"""
+    return current_app.extensions.get('weather_client')
@@ -0,0 +1,209 @@
+"""
+Rolling weather statistics per farmer.
+
+For every farmer, weather metric and window the weather_stats table keeps
+exponentially time-decayed sums: weight, Σy, Σy², Σt, Σt² and Σty, with t
+in days relative to the latest reading. A new reading decays the sums by
+exp(-Δt / window), moves their time origin to itself and adds itself, so
+each insert costs the same however long the history is. The result does
+not depend on arrival order, so a batch is merged in one vectorized step
+and late readings simply enter with their decayed weight. The sums give the
+moving average, standard deviation and weighted least-squares slope that
+weather.forecast uses for its averages and rising/falling trend.
+
+A window of N days is the decay's time constant: the weights of readings
+spread evenly over time add up to those of the last N days.
+"""
+
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, delete, event, insert, select, update
+from sqlalchemy.orm import Session
+from models import db, WeatherData, WeatherStats
+
+METRICS = ['temperature', 'humidity', 'rainfall']
+DEFAULT_WINDOWS = (1, 7, 30)
+DEFAULT_TREND_WINDOW = 7
+# Temperature change (°C per day) beyond which the trend is rising or falling
+DEFAULT_TREND_THRESHOLD = 0.25
+# Effective readings (decayed weight) in the window before a trend is reported
+MIN_TREND_READINGS = 3
+
+STATE_FIELDS = ['readings', 'weight', 'sum_y', 'sum_yy', 'sum_t', 'sum_tt', 'sum_ty', 'updated_at']
+
+def windows():
+    """Configured windows in days, always including the forecast's trend window"""
+    if not has_app_context():
+        return sorted(set(DEFAULT_WINDOWS) | {DEFAULT_TREND_WINDOW})
+    config = current_app.config
+    return sorted(set(config.get('WEATHER_STATS_WINDOWS') or DEFAULT_WINDOWS)
+                  | {config.get('WEATHER_TREND_WINDOW', DEFAULT_TREND_WINDOW)})
+
+def _new_state(moment):
+    return {'readings': 0, 'weight': 0.0, 'sum_y': 0.0, 'sum_yy': 0.0,
+            'sum_t': 0.0, 'sum_tt': 0.0, 'sum_ty': 0.0, 'updated_at': moment}
+
+def _days(delta):
+    return delta.total_seconds() / 86400
+
+def merge(state, window_days, latest, offsets, values):
+    """
+    Fold readings into a state dict in place.
+
+    `offsets` are the readings' times in days relative to `latest`, the
+    newest of them (so all <= 0), and `values` their values.
+    """
+    anchor = max(latest, state['updated_at'])
+    dt = _days(anchor - state['updated_at'])
+    decay = np.exp(-dt / window_days)
+    # Move the old sums' origin to the new anchor (t -> t - dt) and decay them; order matters
+    state['sum_tt'] = decay * (state['sum_tt'] - 2 * dt * state['sum_t'] + dt * dt * state['weight'])
+    state['sum_ty'] = decay * (state['sum_ty'] - dt * state['sum_y'])
+    state['sum_t'] = decay * (state['sum_t'] - dt * state['weight'])
+    state['weight'] *= decay
+    state['sum_y'] *= decay
+    state['sum_yy'] *= decay
+    state['updated_at'] = anchor
+
+    # Readings older than the anchor enter with the weight they have already decayed to
+    t = offsets - _days(anchor - latest)
+    weights = np.exp(t / window_days)
+    weighted = weights * values
+    state['readings'] += len(values)
+    state['weight'] += float(weights.sum())
+    state['sum_y'] += float(weighted.sum())
+    state['sum_yy'] += float((weighted * values).sum())
+    state['sum_t'] += float((weights * t).sum())
+    state['sum_tt'] += float((weights * t * t).sum())
+    state['sum_ty'] += float((weighted * t).sum())
+    for name in ('weight', 'sum_y', 'sum_yy', 'sum_t', 'sum_tt', 'sum_ty'):
+        state[name] = float(state[name])
+
+def _fold(states, readings, window_list):
+    """Fold readings into {(farmer_id, metric, window_days): state}, creating states as needed"""
+    by_farmer = {}
+    for reading in readings:
+        by_farmer.setdefault(reading['farmer_id'], []).append(reading)
+
+    for farmer_id, group in by_farmer.items():
+        latest = max(reading['date'] for reading in group)
+        offsets = np.array([_days(reading['date'] - latest) for reading in group])
+        for metric in METRICS:
+            values = np.array([reading[metric] for reading in group], dtype=float)
+            for window_days in window_list:
+                key = (farmer_id, metric, window_days)
+                state = states.get(key)
+                if state is None:
+                    state = states[key] = _new_state(latest)
+                merge(state, window_days, latest, offsets, values)
+
+def _values(reading):
+    if isinstance(reading, WeatherData):
+        return {name: getattr(reading, name) for name in ('farmer_id', 'date', *METRICS)}
+    return reading
+
+def _save(connection, states, existing_ids):
+    table = WeatherStats.__table__
+    updates, inserts = [], []
+    for (farmer_id, metric, window_days), state in states.items():
+        stats_id = existing_ids.get((farmer_id, metric, window_days))
+        if stats_id is None:
+            inserts.append(dict(state, farmer_id=farmer_id, metric=metric, window_days=window_days))
+        else:
+            updates.append(dict({f'new_{name}': state[name] for name in STATE_FIELDS}, stats_id=stats_id))
+    if inserts:
+        connection.execute(insert(table), inserts)
+    if updates:
+        connection.execute(
+            update(table).where(table.c.id == bindparam('stats_id'))
+            .values({name: bindparam(f'new_{name}') for name in STATE_FIELDS}),
+            updates
+        )
+
+def state_query(farmer_ids):
+    """Lock and select the stored stats state of some farmers"""
+    table = WeatherStats.__table__
+    return (select(table.c.id, table.c.farmer_id, table.c.metric, table.c.window_days, *[table.c[name] for name in STATE_FIELDS])
+            .where(table.c.farmer_id.in_(farmer_ids)).with_for_update())
+
+def update_stats(readings, connection=None):
+    """Fold newly inserted weather readings (dicts or WeatherData) into their farmers' stats"""
+    readings = [_values(reading) for reading in readings]
+    if not readings:
+        return
+    connection = connection or db.session.connection()
+    farmer_ids = {reading['farmer_id'] for reading in readings}
+
+    states, existing_ids = {}, {}
+    rows = connection.execute(state_query(farmer_ids)).mappings()
+    for row in rows:
+        key = (row['farmer_id'], row['metric'], row['window_days'])
+        existing_ids[key] = row['id']
+        states[key] = {name: row[name] for name in STATE_FIELDS}
+
+    _fold(states, readings, windows())
+    _save(connection, states, existing_ids)
+
+def history_query(farmer_ids=None):
+    """Select the weather readings stats are rebuilt from, per farmer and oldest first"""
+    statement = (select(WeatherData.farmer_id, WeatherData.date, *[getattr(WeatherData, metric) for metric in METRICS])
+                 .order_by(WeatherData.farmer_id, WeatherData.date))
+    if farmer_ids is not None:
+        statement = statement.where(WeatherData.farmer_id.in_(farmer_ids))
+    return statement
+
+def rebuild_stats(farmer_ids=None, connection=None):
+    """Recompute stats from the full reading history (all farmers when farmer_ids is None)"""
+    connection = connection or db.session.connection()
+    clear = delete(WeatherStats)
+    if farmer_ids is not None:
+        clear = clear.where(WeatherStats.farmer_id.in_(farmer_ids))
+    connection.execute(clear)
+    statement = history_query(farmer_ids)
+
+    states = {}
+    window_list = windows()
+    for rows in connection.execute(statement.execution_options(yield_per=10000)).mappings().partitions():
+        _fold(states, rows, window_list)
+    _save(connection, states, {})
+
+def backfill_stats():
+    """Build stats for databases that had weather readings before stats existed"""
+    has_stats = db.session.execute(select(WeatherStats.id).limit(1)).first()
+    if not has_stats and db.session.execute(select(WeatherData.id).limit(1)).first():
+        rebuild_stats()
+        db.session.commit()
+
+@event.listens_for(Session, 'after_flush')
+def _update_flushed_weather(session, flush_context):
+    added = [obj for obj in session.new if isinstance(obj, WeatherData)]
+    if added:
+        update_stats(added, session.connection())
+
+    # Decayed sums cannot forget a reading, so edits and deletes replay the farmer's history
+    changed = {obj.farmer_id for obj in session.deleted if isinstance(obj, WeatherData)}
+    changed.update(obj.farmer_id for obj in session.dirty
+                   if isinstance(obj, WeatherData) and session.is_modified(obj))
+    if changed:
+        rebuild_stats(changed, session.connection())
+
+def stats_query(farmer_id, window_days):
+    """One farmer's stats rows for a window, one per metric"""
+    return WeatherStats.query.filter_by(farmer_id=farmer_id, window_days=window_days)
+
+def farmer_stats(farmer_id, window_days=None):
+    """{metric: WeatherStats} for one farmer and window (the trend window by default)"""
+    if window_days is None:
+        window_days = current_app.config.get('WEATHER_TREND_WINDOW', DEFAULT_TREND_WINDOW)
+    return {stats.metric: stats for stats in stats_query(farmer_id, window_days)}
+
+def trend(stats):
+    """'rising', 'falling' or 'stable' from a temperature WeatherStats"""
+    threshold = current_app.config.get('WEATHER_TREND_THRESHOLD', DEFAULT_TREND_THRESHOLD)
+    if stats is None or stats.weight < MIN_TREND_READINGS or stats.slope is None:
+        return 'stable'
+    if stats.slope > threshold:
+        return 'rising'
+    if stats.slope < -threshold:
+        return 'falling'
+    return 'stable'
@@ -0,0 +1,287 @@
+"""
+Write-behind buffer for soil and weather readings.
+
+Request threads hand validated readings to the buffer and return at once.
+A single writer thread group-commits them, either every
+WRITE_BEHIND_INTERVAL_MS or as soon as WRITE_BEHIND_MAX_ROWS are waiting,
+so many small posts share one transaction and one fsync instead of each
+taking SQLite's write lock. Callers that must read their own write (the
+add forms) pass wait=True and return once their group commit is done, or
+get WriteFailed when their readings were not written (or not within
+WRITE_BEHIND_WAIT_TIMEOUT seconds). When a group commit fails its readings
+are retried one per transaction, so a bad reading only rejects itself.
+When WRITE_BEHIND_CAPACITY rows are waiting, producers block for up to
+WRITE_BEHIND_PUT_TIMEOUT seconds and then get BufferFull. Pending rows are
+flushed on interpreter shutdown.
+
+The writer thread starts on the first submit in each process, so workers
+forked after the app is imported (gunicorn --preload) get their own.
+"""
+
+import atexit
+import os
+import threading
+import time
+from flask import current_app
+from sqlalchemy import insert
+from models import db, bump_data_version
+from services.rollups import add_readings
+from services.weather_stats import update_stats
+from services.sensor_ingest import SENSOR_KINDS
+
+DEFAULT_MAX_ROWS = 500
+DEFAULT_INTERVAL_MS = 50
+DEFAULT_CAPACITY = 10000
+DEFAULT_PUT_TIMEOUT = 1.0
+DEFAULT_WAIT_TIMEOUT = 10.0
+
+class BufferFull(Exception):
+    """The buffer stayed full for the whole put timeout"""
+
+class BufferClosed(Exception):
+    """The buffer is shutting down and takes no more readings"""
+
+class WriteFailed(Exception):
+    """Readings submitted with wait=True were not written, or not confirmed in time"""
+
+class _Ticket:
+    """Outcome of one waiting submit, filled in by the writer"""
+
+    def __init__(self):
+        self.errors = []
+
+class WriteBehindBuffer:
+    """Bounded queue of readings drained by one group-committing writer thread"""
+
+    def __init__(self, app, max_rows=DEFAULT_MAX_ROWS, interval_ms=DEFAULT_INTERVAL_MS,
+                 capacity=DEFAULT_CAPACITY, put_timeout=DEFAULT_PUT_TIMEOUT,
+                 wait_timeout=DEFAULT_WAIT_TIMEOUT):
+        self.app = app
+        self.max_rows = max_rows
+        self.interval = interval_ms / 1000
+        self.capacity = capacity
+        self.put_timeout = put_timeout
+        self.wait_timeout = wait_timeout
+        self._metrics = {
+            'enqueued': 0, 'committed': 0, 'rejected': 0, 'failed': 0, 'batches': 0, 'retried_batches': 0,
+            'commit_ms_last': 0.0, 'commit_ms_max': 0.0, 'commit_ms_total': 0.0
+        }
+        self._reset()
+        # A forked child inherits the queue but not the writer thread
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # (kind, record, ticket or None) entries waiting for the writer
+        self._pending = []
+        self._in_flight = 0
+        # Readings ever queued / ever written (or failed), in queue order
+        self._enqueued_seq = 0
+        self._done_seq = 0
+        self._waiters = 0
+        self._flush_requested = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def _ensure_writer(self):
+        # Called with the lock held; also replaces a writer that died
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def submit(self, kind, records, timeout=None, wait=False):
+        """
+        Queue readings of one kind ('soil' or 'weather') for the next group commit.
+
+        With wait=True, block until that commit has finished and raise
+        WriteFailed if any of the readings was not written.
+        """
+        timeout = self.put_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._closed and len(self._pending) + len(records) > self.capacity:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or len(records) > self.capacity:
+                    self._metrics['rejected'] += len(records)
+                    raise BufferFull(f'{len(self._pending)} readings already waiting to be written')
+                self._cond.wait(remaining)
+            if self._closed:
+                raise BufferClosed('Write-behind buffer is closed')
+            self._ensure_writer()
+
+            ticket = _Ticket() if wait else None
+            self._pending.extend((kind, record, ticket) for record in records)
+            self._metrics['enqueued'] += len(records)
+            self._enqueued_seq += len(records)
+            last_seq = self._enqueued_seq
+            # Wake the writer to start (or, when full, cut short) its batch interval
+            self._cond.notify_all()
+
+            if wait:
+                self._wait_for(last_seq, ticket, len(records))
+
+    def _wait_for(self, last_seq, ticket, count):
+        # Called with the lock held
+        deadline = time.monotonic() + self.wait_timeout
+        self._waiters += 1
+        try:
+            while self._done_seq < last_seq:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise WriteFailed(f'Readings not written within {self.wait_timeout:g}s')
+                if not self._thread.is_alive():
+                    raise WriteFailed('Write-behind writer thread is not running')
+                # Wake up now and then to notice a writer that died
+                self._cond.wait(min(remaining, 1.0))
+        finally:
+            self._waiters -= 1
+        if ticket.errors:
+            raise WriteFailed(f'{len(ticket.errors)} of {count} readings could not be written: {ticket.errors[0]}')
+
+    def flush(self, timeout=None):
+        """Commit everything queued so far; returns False if `timeout` ran out first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._pending:
+                self._ensure_writer()
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """Stop accepting readings, write the rest and stop the writer thread"""
+        with self._cond:
+            self._closed = True
+            if self._pending:
+                self._ensure_writer()
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def metrics(self):
+        """Queue depth, throughput counters and commit latency"""
+        with self._cond:
+            result = dict(self._metrics)
+            result['queue_depth'] = len(self._pending)
+        total = result.pop('commit_ms_total')
+        result['commit_ms_avg'] = total / result['batches'] if result['batches'] else 0.0
+        return result
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+
+            # Give the batch up to one interval to fill. Waiting callers are not
+            # held back: their batch is whatever queued during the last commit
+            deadline = time.monotonic() + self.interval
+            while (len(self._pending) < self.max_rows and not self._closed
+                   and not self._flush_requested and not self._waiters):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = self._pending[:self.max_rows]
+            del self._pending[:self.max_rows]
+            self._in_flight = len(batch)
+            if not self._pending:
+                self._flush_requested = False
+            # Wake producers waiting for room
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    return
+                self._commit(batch)
+
+    def _write(self, batch):
+        by_kind = {}
+        for kind, record, _ in batch:
+            by_kind.setdefault(kind, []).append(record)
+        for kind, records in by_kind.items():
+            db.session.execute(insert(SENSOR_KINDS[kind][0]), records)
+            add_readings(kind, records)
+            if kind == 'weather':
+                update_stats(records)
+        bump_data_version({record['farmer_id'] for _, record, _ in batch})
+        db.session.commit()
+
+    def _write_each(self, batch):
+        """Write readings one per transaction; returns the (entry, error) pairs that failed"""
+        failures = []
+        for entry in batch:
+            try:
+                self._write([entry])
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.error('Write-behind dropped a %s reading for farmer %s: %s',
+                                      entry[0], entry[1].get('farmer_id'), e)
+                failures.append((entry, e))
+        return failures
+
+    def _commit(self, batch):
+        start = time.perf_counter()
+        retried = False
+        try:
+            try:
+                self._write(batch)
+                failures = []
+            except Exception:
+                db.session.rollback()
+                self.app.logger.warning('Write-behind commit of %d readings failed; retrying them one by one',
+                                        len(batch), exc_info=True)
+                retried = True
+                failures = self._write_each(batch)
+        except Exception as e:
+            # Even the retry could not run (e.g. the database is gone)
+            self.app.logger.exception('Write-behind retry of %d readings failed', len(batch))
+            failures = [(entry, e) for entry in batch]
+        finally:
+            db.session.remove()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self._cond:
+            for (_, _, ticket), error in failures:
+                if ticket is not None:
+                    ticket.errors.append(error)
+            self._metrics['committed'] += len(batch) - len(failures)
+            self._metrics['failed'] += len(failures)
+            self._metrics['retried_batches'] += retried
+            self._metrics['batches'] += 1
+            self._metrics['commit_ms_last'] = elapsed_ms
+            self._metrics['commit_ms_max'] = max(self._metrics['commit_ms_max'], elapsed_ms)
+            self._metrics['commit_ms_total'] += elapsed_ms
+            self._in_flight = 0
+            self._done_seq += len(batch)
+            self._cond.notify_all()
+
+def init_write_behind(app):
+    """Start the buffer when WRITE_BEHIND is enabled and flush it at exit"""
+    if not app.config.get('WRITE_BEHIND'):
+        return None
+    buffer = WriteBehindBuffer(
+        app,
+        max_rows=app.config.get('WRITE_BEHIND_MAX_ROWS', DEFAULT_MAX_ROWS),
+        interval_ms=app.config.get('WRITE_BEHIND_INTERVAL_MS', DEFAULT_INTERVAL_MS),
+        capacity=app.config.get('WRITE_BEHIND_CAPACITY', DEFAULT_CAPACITY),
+        put_timeout=app.config.get('WRITE_BEHIND_PUT_TIMEOUT', DEFAULT_PUT_TIMEOUT),
+        wait_timeout=app.config.get('WRITE_BEHIND_WAIT_TIMEOUT', DEFAULT_WAIT_TIMEOUT)
+    )
+    app.extensions['write_behind'] = buffer
+    atexit.register(buffer.close)
+    return buffer
+
+def get_buffer():
+    """The app's write-behind buffer, or None when readings are written inline"""
+    return current_app.extensions.get('write_behind')
@@ -237,68 +237,49 @@ function refreshWeatherData() {
 }
 
 // Chart initialization
+const CHART_COLORS = ['rgb(40, 167, 69)', 'rgb(23, 162, 184)', 'rgb(255, 193, 7)', 'rgb(220, 53, 69)', 'rgb(111, 66, 193)', 'rgb(253, 126, 20)'];
+
 function initializeCharts() {
-    // Soil data chart
-    const soilCtx = document.getElementById('soilChart');
-    if (soilCtx) {
-        new Chart(soilCtx, {
-            type: 'radar',
-            data: {
-                labels: ['pH', 'Moisture', 'Nitrogen', 'Phosphorus', 'Potassium'],
-                datasets: [{
-                    label: 'Current Values',
-                    data: [7.0, 60, 25, 18, 22],
-                    borderColor: 'rgb(40, 167, 69)',
-                    backgroundColor: 'rgba(40, 167, 69, 0.2)',
-                    pointBackgroundColor: 'rgb(40, 167, 69)',
-                    pointBorderColor: '#fff',
-                    pointHoverBackgroundColor: '#fff',
-                    pointHoverBorderColor: 'rgb(40, 167, 69)'
-                }]
-            },
-            options: {
-                responsive: true,
-                scales: {
-                    r: {
-                        beginAtZero: true,
-                        max: 100
-                    }
-                }
-            }
-        });
-    }
+    // Soil and weather history charts, drawn from /soil/series and /weather/series
+    document.querySelectorAll('canvas[data-series-url]').forEach(function(canvas) {
+        fetch(canvas.dataset.seriesUrl)
+            .then(response => response.json())
+            .then(data => renderSeriesChart(canvas, data))
+            .catch(error => console.log('Chart data failed:', error));
+    });
+}
 
-    // Weather data chart
-    const weatherCtx = document.getElementById('weatherChart');
-    if (weatherCtx) {
-        new Chart(weatherCtx, {
-            type: 'line',
-            data: {
-                labels: ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
-                datasets: [{
-                    label: 'Temperature (°C)',
-                    data: [28, 30, 32, 29, 31, 33, 30],
-                    borderColor: 'rgb(255, 193, 7)',
-                    backgroundColor: 'rgba(255, 193, 7, 0.2)',
-                    tension: 0.4
-                }, {
-                    label: 'Humidity (%)',
-                    data: [65, 60, 55, 70, 68, 62, 58],
-                    borderColor: 'rgb(23, 162, 184)',
-                    backgroundColor: 'rgba(23, 162, 184, 0.2)',
-                    tension: 0.4
-                }]
-            },
-            options: {
-                responsive: true,
-                scales: {
-                    y: {
-                        beginAtZero: true
-                    }
+function renderSeriesChart(canvas, data) {
+    if (!data.points || data.points.length === 0) {
+        canvas.closest('.card').classList.add('d-none');
+        return;
+    }
+    const labels = JSON.parse(canvas.dataset.labels || '{}');
+    const metrics = Object.keys(labels);
+    const withTime = data.resolution === 'raw';
+    new Chart(canvas, {
+        type: 'line',
+        data: {
+            labels: data.points.map(point => withTime ? formatDateTime(point.period_start) : formatDate(point.period_start)),
+            datasets: metrics.map((metric, index) => ({
+                label: labels[metric],
+                // Daily and weekly points are rollups; plot their mean
+                data: data.points.map(point => point[metric] ? point[metric].mean : null),
+                borderColor: CHART_COLORS[index % CHART_COLORS.length],
+                backgroundColor: CHART_COLORS[index % CHART_COLORS.length].replace('rgb', 'rgba').replace(')', ', 0.2)'),
+                spanGaps: true,
+                tension: 0.4
+            }))
+        },
+        options: {
+            responsive: true,
+            scales: {
+                y: {
+                    beginAtZero: true
                 }
             }
-        });
-    }
+        }
+    });
 }
 
 // Export functions for use in other scripts